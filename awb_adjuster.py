@@ -8,6 +8,8 @@ Zweck:
   'awb_gain_r' und 'awb_gain_b' in config_tl.json an.
 - Tagsüber (awb_enable:true) wird nichts verändert.
 - Nacht wird über Lux-Gate erkannt (Durchschnitt <= night_max_lux).
+- Neue Messungen kommen über den Sensor-Bus (sensor_bus.py), sonst aus den CSV-Dateien.
+- AwbRegulator: ein Durchlauf je step(), auch im gemeinsamen controller_host.py.
 
 Abhängigkeiten:
     pip install loguru
@@ -15,30 +17,14 @@ Abhängigkeiten:
 
 from __future__ import annotations
 import argparse
-import csv
 import json
 import signal
-import sys
-import time
 from pathlib import Path
 from typing import Optional, Dict, Any
 from loguru import logger
-import fcntl, os
-from contextlib import contextmanager
+from sensor_bus import SensorFeed, SOCKET_PATH as BUS_SOCKET
+from tl_config import ConfigView
 
-# Gemeinsamer Config-Write-Lock
-LOCK_PATH = "/tmp/tlcfg.lock"
-
-@contextmanager
-def cfg_lock():
-    fd = os.open(LOCK_PATH, os.O_CREAT | os.O_RDWR, 0o666)
-    try:
-        fcntl.flock(fd, fcntl.LOCK_EX)
-        yield
-    finally:
-        fcntl.flock(fd, fcntl.LOCK_UN)
-        os.close(fd)
-        
 SCRIPT_DIR = Path(__file__).resolve().parent
 CONFIG_JSON = SCRIPT_DIR / "awb_adjuster.json"
 
@@ -47,7 +33,7 @@ CONFIG_JSON = SCRIPT_DIR / "awb_adjuster.json"
 DEFAULTS = {
     "config_path": str(SCRIPT_DIR / "config_tl.json"),
     "color_csv": str(SCRIPT_DIR / "color_log.csv"),
-    "lux_csv": str(SCRIPT_DIR / "sensor_log.csv"),
+    "lux_csv": str(SCRIPT_DIR / "sensor_log"),      # Tagesdateien oder eine CSV
     "log_path": str(SCRIPT_DIR / "logs" / "awb_adjuster.log"),
 
     "color_red_col": "tcs_red",
@@ -57,6 +43,9 @@ DEFAULTS = {
 
     "interval_s": 5,
     "lux_window_samples": 10,
+    "lux_window_s": 20.0,          # Zeitfenster (s) statt Stichprobenzahl (adaptives Sensorintervall)
+    "use_bus": True,
+    "bus_socket": BUS_SOCKET,
     "require_awb_disabled": True,
     "use_lux_gate": True,
     "night_max_lux": 1.0,
@@ -85,51 +74,25 @@ def load_json_optional(path: Path) -> Dict[str, Any]:
         logger.warning(f"Konnte {path} nicht lesen: {e}")
         return {}
 
-def save_json_atomic(path: Path, data: Dict[str, Any]) -> bool:
-    tmp = Path(str(path) + ".tmp")
-    with tmp.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    tmp.replace(path)
-    return True
-
 def ensure_parent(path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
 
-def read_last_rgb(csv_path: Path, r_col: str, g_col: str, b_col: str) -> Optional[tuple[float,float,float]]:
+def read_last_rgb(feed: SensorFeed, r_col: str, g_col: str, b_col: str) -> Optional[tuple[float,float,float]]:
     try:
-        with csv_path.open("r", encoding="utf-8") as f:
-            rdr = csv.DictReader(f)
-            rows = list(rdr)
-            if not rows:
-                return None
-            last = rows[-1]
-            r = float(last[r_col]); g = float(last[g_col]); b = float(last[b_col])
-            if g <= 0 or r <= 0 or b <= 0:
-                return None
-            return (r,g,b)
+        rgb = feed.latest((r_col, g_col, b_col))
+        if not rgb:
+            return None
+        r, g, b = rgb
+        if not (g > 0 and r > 0 and b > 0):  # auch NaN
+            return None
+        return (r,g,b)
     except Exception:
         return None
 
-def get_last_lux_avg(csv_path: Path, column: str, num_samples: int) -> Optional[float]:
+def get_last_lux_avg(feed: SensorFeed, column: str, num_samples: int,
+                     window_s: Optional[float] = None) -> Optional[float]:
     try:
-        with Path(csv_path).open("r", encoding="utf-8") as f:
-            rdr = csv.reader(f)
-            header = next(rdr)
-            try:
-                idx = header.index(column)
-            except ValueError:
-                return None
-            rows = list(rdr)
-            if not rows:
-                return None
-            chunk = rows[-num_samples:] if len(rows) >= num_samples else rows
-            vals = []
-            for r in chunk:
-                try:
-                    vals.append(float(r[idx]))
-                except Exception:
-                    pass
-            return sum(vals)/len(vals) if vals else None
+        return feed.mean(column, n=num_samples, seconds=window_s)
     except Exception:
         return None
 
@@ -151,26 +114,28 @@ def compute_target_gain(current_gain: float, ratio: float,
     target = (1.0 - alpha) * current_gain + alpha * proposed
     return clamp(target, gmin, gmax)
 
-def adjust_once(cfg: Dict[str,Any]) -> bool:
+def adjust_once(cfg: Dict[str,Any], lux_feed: SensorFeed, color_feed: SensorFeed,
+                view: Optional[ConfigView] = None) -> bool:
+    view = view or ConfigView(cfg["config_path"])
     # Lux-Gate
     if cfg["use_lux_gate"]:
-        avg = get_last_lux_avg(Path(cfg["lux_csv"]), cfg["lux_col"], cfg["lux_window_samples"])
+        avg = get_last_lux_avg(lux_feed, cfg["lux_col"], cfg["lux_window_samples"], cfg["lux_window_s"])
         if avg is None or avg > cfg["night_max_lux"]:
             return False
 
     # AWB-Gate
     if cfg["require_awb_disabled"]:
-        live_cfg = load_json(Path(cfg["config_path"]))
+        live_cfg = view.get()
         if live_cfg.get("awb_enable", True):
             return False
         current_r = float(live_cfg.get("awb_gain_r", 1.0))
         current_b = float(live_cfg.get("awb_gain_b", 1.0))
     else:
-        live_cfg = load_json(Path(cfg["config_path"]))
+        live_cfg = view.get()
         current_r = float(live_cfg.get("awb_gain_r", 1.0))
         current_b = float(live_cfg.get("awb_gain_b", 1.0))
 
-    rgb = read_last_rgb(Path(cfg["color_csv"]),
+    rgb = read_last_rgb(color_feed,
                         cfg["color_red_col"], cfg["color_green_col"], cfg["color_blue_col"])
     if not rgb:
         return False
@@ -191,15 +156,39 @@ def adjust_once(cfg: Dict[str,Any]) -> bool:
     if abs(new_r - current_r) < 1e-3 and abs(new_b - current_b) < 1e-3:
         return False
 
-# ...
-    with cfg_lock():
-        latest = load_json(Path(cfg["config_path"]))
-        latest["awb_gain_r"] = round(new_r, 3)
-        latest["awb_gain_b"] = round(new_b, 3)
-        save_json_atomic(Path(cfg["config_path"]), latest)
+    if not view.update({"awb_gain_r": round(new_r, 3), "awb_gain_b": round(new_b, 3)}):
+        return False
     logger.info(f"→ AWB-Gains angepasst: R {current_r:.3f}->{new_r:.3f}, B {current_b:.3f}->{new_b:.3f}")
     return True
 
+class AwbRegulator:
+    """adjust_once() mit festen Datenquellen; ein Durchlauf je step()."""
+    name = "awb"
+
+    def __init__(self, cfg: Dict[str, Any], view: ConfigView, feeds=SensorFeed):
+        self.cfg = cfg
+        self.view = view
+        self.feed = feeds(Path(cfg["lux_csv"]), cfg["bus_socket"], bool(cfg["use_bus"]))
+        # Farbwerte kommen nur dann über den Bus, wenn sie aus derselben Quelle wie Lux stammen
+        self.color_feed = self.feed if cfg["color_csv"] == cfg["lux_csv"] else feeds(Path(cfg["color_csv"]), None, False)
+
+    @property
+    def interval(self) -> float:
+        return float(self.cfg["interval_s"])
+
+    def step(self):
+        try:
+            adjust_once(self.cfg, self.feed, self.color_feed, self.view)
+        except Exception as e:
+            logger.error(f"Fehler im adjust_once: {e}")
+
+def load_awb_config(config_path=None) -> Dict[str, Any]:
+    cfg = DEFAULTS.copy()
+    cfg.update(load_json_optional(CONFIG_JSON))
+    if config_path:
+        cfg["config_path"] = str(config_path)
+    return cfg
+
 # ------------------------------- Main ------------------------------------
 
 def main():
@@ -207,10 +196,7 @@ def main():
     ap.add_argument("--config", default=DEFAULTS["config_path"], help="Pfad zu config_tl.json")
     args = ap.parse_args()
 
-    overrides = load_json_optional(CONFIG_JSON)
-    cfg = DEFAULTS.copy()
-    cfg.update(overrides)
-    cfg["config_path"] = args.config
+    cfg = load_awb_config(args.config)
 
     log_path = Path(cfg["log_path"])
     ensure_parent(log_path)
@@ -221,14 +207,13 @@ def main():
     signal.signal(signal.SIGINT, _stop)
     signal.signal(signal.SIGTERM, _stop)
 
+    reg = AwbRegulator(cfg, ConfigView(cfg["config_path"]))
+
     logger.info("awb_adjuster gestartet.")
     try:
         while not stop_flag["stop"]:
-            try:
-                adjust_once(cfg)
-            except Exception as e:
-                logger.error(f"Fehler im adjust_once: {e}")
-            time.sleep(cfg["interval_s"])
+            reg.step()
+            reg.feed.wait(reg.interval, stop=lambda: stop_flag["stop"])
     finally:
         logger.info("awb_adjuster beendet.")
 
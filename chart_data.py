@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+chart_data.py — Spaltencache und Diagramm-Daten für make_charts.py und die Weboberfläche
+- Sensor-CSVs (Einzeldatei oder Tagesdateien) werden einmal geparst und als NPZ je Quelldatei
+  abgelegt (Zeit als float64, Messwerte als float32)
+- Wächst eine CSV, werden nur die neuen Zeilen ab dem gemerkten Byte-Offset gelesen;
+  komprimierte Tage (.csv.gz) ändern sich nicht mehr und werden nur einmal gelesen
+- Ein gemeinsames JSON-Payload (Zeit in ms + Werte je Linie, auf ein Punktebudget reduziert,
+  downsample.py) plus Diagrammbeschreibung FIGURES statt eingebetteter Kopien je Diagramm
+"""
+from __future__ import annotations
+import csv
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+from downsample import GAP_S, downsample
+from sensor_partitions import PARTITION_DIR, partitions_for
+from sensor_reader import parse_ts
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+CACHE_DIR = Path(os.environ.get("CHART_CACHE_DIR") or SCRIPT_DIR / "cache" / "charts")
+CACHE_VERSION = 1
+DEFAULT_POINTS = 2000
+
+# Zeitstempel als Unix-Zeit, Messwerte je Spalte
+Columns = Tuple[np.ndarray, Dict[str, np.ndarray]]
+
+FIGURES = [
+    {"title": "VEML7700 – Lux (fix) vs. Autolux", "yaxis": "Lux",
+     "series": ["veml_lux", "veml_autolux"]},
+    {"title": "VEML7700 – White & ALS (raw)", "yaxis": None,
+     "series": ["veml_white", "veml_light"], "names": {"veml_light": "veml_light (ALS)"}},
+    {"title": "TCS34725 – Lux", "yaxis": "Lux", "series": ["tcs_lux"]},
+    {"title": "TCS34725 – RGBC (raw 16-bit)", "yaxis": None,
+     "series": ["tcs_r", "tcs_g", "tcs_b", "tcs_clear"]},
+    {"title": "TCS34725 – Farbtemperatur (K)", "yaxis": "Kelvin", "series": ["tcs_ctK"]},
+    {"title": "AWB-Gains aus TCS34725 (G=1.0)", "yaxis": "Gain", "series": ["awb_r", "awb_b"]},
+    {"title": "Sensor-Einstellungen über die Zeit", "yaxis": None,
+     "series": ["veml_gain", "veml_integration_ms", "tcs_gain", "tcs_integration_ms"]},
+]
+
+
+# ------------------------------ Parsen ------------------------------
+
+def _parse(data: bytes, header: List[str]) -> Columns:
+    """CSV-Zeilen (ohne Kopfzeile) → Spalten; defekte Zeilen werden übersprungen."""
+    width = len(header)
+    ts: List[float] = []
+    rows: List[List[float]] = []
+    for parts in csv.reader(io.StringIO(data.decode("utf-8", "replace"))):
+        if len(parts) != width:
+            continue
+        t = parse_ts(parts[0])
+        if math.isnan(t):
+            continue
+        row = []
+        for v in parts[1:]:
+            try:
+                row.append(float(v))
+            except ValueError:
+                row.append(math.nan)
+        ts.append(t)
+        rows.append(row)
+    arr = np.array(rows, dtype=np.float32).reshape(len(rows), width - 1)
+    return np.array(ts, dtype=np.float64), {c: np.ascontiguousarray(arr[:, i]) for i, c in enumerate(header[1:])}
+
+
+# ------------------------------ Cache ------------------------------
+
+def _cache_path(path: Path, cache_dir: Path) -> Path:
+    key = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:12]
+    return cache_dir / f"{path.name}.{key}.npz"
+
+
+def _read_cache(cpath: Path) -> Optional[Tuple[dict, Columns]]:
+    try:
+        with np.load(cpath, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("version") != CACHE_VERSION:
+                return None
+            return meta, (z["ts"], {c: z["c_" + c] for c in meta["header"][1:]})
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cache(cpath: Path, meta: dict, cols: Columns):
+    ts, values = cols
+    try:
+        cpath.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cpath.with_suffix(".tmp.npz")
+        np.savez(tmp, meta=np.array(json.dumps(meta)), ts=ts, **{"c_" + c: v for c, v in values.items()})
+        os.replace(tmp, cpath)
+    except OSError as e:
+        logger.warning(f"Diagramm-Cache nicht geschrieben ({cpath}): {e}")
+
+
+def load_csv(path, cache_dir: Optional[Path] = CACHE_DIR) -> Columns:
+    """Alle Zeilen einer Sensor-CSV (auch .csv.gz) als Spalten; liest nur, was der Cache noch nicht hat."""
+    path = Path(path)
+    st = path.stat()
+    gz = path.name.endswith(".gz")
+    cpath = _cache_path(path, cache_dir) if cache_dir is not None else None
+    cached = _read_cache(cpath) if cpath is not None and cpath.exists() else None
+    if cached:
+        meta, cols = cached
+        same_file = meta["inode"] == st.st_ino
+        if gz and same_file and meta["size"] == st.st_size and meta["mtime"] == st.st_mtime:
+            return cols
+        if not gz and same_file and meta["offset"] <= st.st_size:
+            if meta["offset"] == st.st_size:
+                return cols
+            with open(path, "rb") as f:
+                f.seek(meta["offset"])
+                data = f.read()
+            data = data[:data.rfind(b"\n") + 1]     # halbe Zeile des Loggers erst beim nächsten Mal
+            new = _parse(data, meta["header"])
+            ts = np.concatenate([cols[0], new[0]])
+            values = {c: np.concatenate([cols[1][c], new[1][c]]) for c in meta["header"][1:]}
+            meta.update(offset=meta["offset"] + len(data), size=st.st_size, mtime=st.st_mtime)
+            if len(data):
+                _write_cache(cpath, meta, (ts, values))
+            return ts, values
+
+    opener = gzip.open if gz else open
+    with opener(path, "rb") as f:
+        data = f.read()
+    end = len(data) if gz else data.rfind(b"\n") + 1
+    first = data.find(b"\n")
+    if first < 0:
+        return np.empty(0), {}
+    header = [h.strip() for h in data[:first].decode("utf-8", "replace").split(",")]
+    cols = _parse(data[first + 1:end], header)
+    if cpath is not None:
+        meta = {"version": CACHE_VERSION, "path": str(path.resolve()), "header": header,
+                "inode": st.st_ino, "size": st.st_size, "mtime": st.st_mtime, "offset": end}
+        _write_cache(cpath, meta, cols)
+    return cols
+
+
+def load_files(paths: Iterable, t_from: Optional[float] = None, t_to: Optional[float] = None,
+               cache_dir: Optional[Path] = CACHE_DIR) -> Columns:
+    """Mehrere CSVs zusammenführen, auf [t_from, t_to) begrenzen und zeitlich sortieren."""
+    parts = [load_csv(p, cache_dir) for p in paths]
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return np.empty(0), {}
+    names: List[str] = []
+    for _, values in parts:
+        names += [c for c in values if c not in names]
+    ts = np.concatenate([p[0] for p in parts])
+    values = {c: np.concatenate([p[1].get(c, np.full(len(p[0]), np.nan, np.float32)) for p in parts])
+              for c in names}
+    keep = np.ones(len(ts), dtype=bool)
+    if t_from is not None:
+        keep &= ts >= t_from
+    if t_to is not None:
+        keep &= ts < t_to
+    order = np.flatnonzero(keep)
+    if len(order) > 1 and np.any(np.diff(ts[order]) < 0):
+        order = order[np.argsort(ts[order], kind="stable")]
+    return ts[order], {c: v[order] for c, v in values.items()}
+
+
+def prune_cache(cache_dir: Path = CACHE_DIR) -> int:
+    """Cache-Dateien entfernen, deren Quelldatei nicht mehr existiert (z. B. durch retention.py)."""
+    removed = 0
+    for cpath in Path(cache_dir).glob("*.npz"):
+        cached = _read_cache(cpath)
+        if cached is None or not os.path.exists(cached[0]["path"]):
+            try:
+                cpath.unlink()
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+# ------------------------------ Payload ------------------------------
+
+def _rolling_median(values: np.ndarray, k: int) -> np.ndarray:
+    """Gleitender Median über die letzten k Werte (am Anfang entsprechend weniger)."""
+    if not len(values):
+        return values
+    padded = np.concatenate([np.full(k - 1, np.nan), values])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # Fenster nur aus NaN
+        return np.nanmedian(np.lib.stride_tricks.sliding_window_view(padded, k), axis=1)
+
+
+def add_derived(cols: Columns) -> Columns:
+    """AWB-Gains aus TCS RGBC (G=1.0, R/B relativ zu G), robust mit gleitendem Median über 5 Werte."""
+    ts, values = cols
+    if all(c in values for c in ("tcs_r", "tcs_g", "tcs_b")):
+        eps = 1e-9
+        g = values["tcs_g"].astype(np.float64)
+        for name, src in (("awb_r", "tcs_r"), ("awb_b", "tcs_b")):
+            gain = np.clip(g / (values[src] + eps), 0.2, 8.0)
+            values[name] = _rolling_median(gain, 5).astype(np.float32)
+    return ts, values
+
+
+def _round(values: np.ndarray) -> List[Optional[float]]:
+    return [None if v != v else float("%.6g" % v) for v in values.tolist()]
+
+
+def build_payload(cols: Columns, source: str, max_points: int = DEFAULT_POINTS, method: str = "lttb",
+                  series: Optional[Sequence[str]] = None, gap_s: float = GAP_S) -> dict:
+    """Ein JSON-fähiges Payload für alle Diagramme: je Linie höchstens etwa max_points Punkte."""
+    ts, values = cols
+    wanted = series or [s for fig in FIGURES for s in fig["series"]]
+    out = {}
+    for name in wanted:
+        if name not in values:
+            continue
+        x, y = downsample(ts, values[name], max_points, method, gap_s)
+        if not len(x):
+            continue
+        out[name] = {"t": np.round(x * 1000).astype(np.int64).tolist(), "y": _round(y)}
+    return {
+        "source": source,
+        "generated": time.time(),
+        "rows": int(len(ts)),
+        "t_from": float(ts[0]) if len(ts) else None,
+        "t_to": float(ts[-1]) if len(ts) else None,
+        "method": method,
+        "max_points": max_points,
+        "figures": FIGURES,
+        "series": out,
+    }
+
+
+DERIVED = {"awb_r": ("tcs_r", "tcs_g", "tcs_b"), "awb_b": ("tcs_r", "tcs_g", "tcs_b")}
+
+
+def store_columns(res: dict, method: str) -> Columns:
+    """Ergebnis von SensorStore.query() als Spalten. Für minmax liefert jeder Rollup-Bucket
+    sein Minimum und Maximum (am Anfang und in der Mitte des Buckets) statt des Mittelwerts,
+    damit Spitzen und Sättigung auch in groben Stufen sichtbar bleiben."""
+    def arr(v):
+        return np.array([math.nan if x is None else x for x in v], dtype=np.float32)
+    ts = np.array(res["ts"], dtype=np.float64)
+    ts, values = add_derived((ts, {c: arr(s["mean"]) for c, s in res["series"].items()}))
+    if method != "minmax" or not res["step"]:
+        return ts, values
+    # abgeleitete Reihen (AWB-Gains) bleiben beim Mittelwert, nur verdoppelt
+    return (np.column_stack([ts, ts + res["step"] / 2]).ravel(),
+            {c: np.column_stack([arr(res["series"][c]["min"]), arr(res["series"][c]["max"])]).ravel()
+             if c in res["series"] else np.repeat(y, 2) for c, y in values.items()})
+
+
+def window_payload(t_from: float, t_to: float, series: Optional[Sequence[str]] = None,
+                   max_points: int = DEFAULT_POINTS, method: str = "lttb", store=None,
+                   log_dir=None, cache_dir: Optional[Path] = CACHE_DIR) -> dict:
+    """Payload für [t_from, t_to): bevorzugt aus den Rollups des Zeitreihen-Speichers
+    (sensor_store.py wählt die Stufe passend zu max_points), sonst aus den Tagesdateien."""
+    wanted = list(series or [s for fig in FIGURES for s in fig["series"]])
+    columns: List[str] = []
+    for name in wanted:
+        columns += [c for c in DERIVED.get(name, (name,)) if c not in columns]
+    tier = None
+    gap_s = GAP_S
+    cols: Columns = (np.empty(0), {})
+    if store is not None:
+        res = store.query(columns, t_from, t_to, max_points=max_points)
+        # Rohdaten/1-min-Stufe schon abgelaufen → Tagesdateien sind für einen Zoom feiner
+        coarse = res["step"] and (t_to - t_from) / res["step"] < max_points / 4
+        if res["ts"] and not (coarse and partitions_for(log_dir or PARTITION_DIR, t_from, t_to)):
+            tier = res["tier"]
+            gap_s = max(GAP_S, 2 * (res["step"] or 0))   # ein fehlender Rollup-Bucket ist noch keine Lücke
+            cols = store_columns(res, method)
+            source = f"{getattr(store, 'db_path', 'store')} ({tier})"
+    if tier is None:
+        log_dir = log_dir or PARTITION_DIR
+        paths = partitions_for(log_dir, t_from, t_to)
+        cols = add_derived(load_files(paths, t_from, t_to, cache_dir))
+        source = f"{log_dir} ({len(paths)} Tage)"
+    payload = build_payload(cols, source, max_points, method, wanted, gap_s)
+    payload.update(tier=tier or "csv", t_from=t_from, t_to=t_to)
+    return payload
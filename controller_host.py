@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+controller_host.py — Preset-, Belichtungs- und AWB-Regler in einem Prozess (asyncio)
+- Führt lux_controller.py, lux_exposured.py und awb_adjuster.py als asyncio-Tasks aus
+  statt als drei Daemons mit je eigenem Interpreter, Loguru, CSV-Ende und Bus-Abonnement
+- Ein Sensorfenster im Speicher für alle: je Quelle (CSV/Sensor-Bus) genau eine SensorFeed;
+  der Bus-Socket wird im Event-Loop gelesen, Regler wachen nur zu ihrem Takt auf
+- Eine gemeinsame Sicht auf config_tl.json (tl_config.ConfigView): gelesen nur nach
+  Änderungen, geschrieben an einer Stelle unter /tmp/tlcfg.lock
+- Blockierende Aktionen (tlctl-Status/Neustart) laufen in einem Worker-Thread
+- --only wählt einzelne Regler; die Einzelskripte laufen weiterhin auch allein
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+from sensor_bus import RECONNECT_S, SensorFeed, SOCKET_PATH as BUS_SOCKET
+from tl_config import ConfigView
+import awb_adjuster
+import lux_controller
+import lux_exposured
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+CONFIG_FILE = SCRIPT_DIR / "config_tl.json"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "controller_host.log"
+REGULATORS = ("preset", "exposure", "awb")
+REPORT_EVERY_S = 3600
+
+
+def setup_logger(quiet: bool = False):
+    """Konfiguriert den Loguru-Logger; [reg] zeigt, welcher Regler die Meldung schreibt."""
+    fmt = "<green>{time}</green> <level>{level}</level> [{extra[reg]}]: <level>{message}</level>"
+    logger.remove()
+    logger.configure(extra={"reg": "host"})
+    if not quiet:
+        logger.add(sys.stderr, format=fmt)
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, format=fmt, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class FeedPool:
+    """Eine SensorFeed je (CSV, Bus-Socket) – normalerweise genau eine für alle Regler.
+
+    Wird den Reglern statt des SensorFeed-Konstruktors übergeben. Der Bus wird nicht von
+    SensorFeed.wait() abgefragt, sondern von pump() über den Event-Loop.
+    """
+
+    def __init__(self):
+        self.feeds: Dict[Tuple[str, Optional[str]], SensorFeed] = {}
+        self.events: Dict[int, asyncio.Event] = {}
+        self.pumps: Dict[int, asyncio.Task] = {}
+
+    def __call__(self, csv_path, socket_path: Optional[str] = BUS_SOCKET, use_bus: bool = True) -> SensorFeed:
+        key = (os.path.abspath(csv_path), socket_path if use_bus and socket_path else None)
+        feed = self.feeds.get(key)
+        if feed is None:
+            feed = self.feeds[key] = SensorFeed(csv_path, socket_path, use_bus)
+            self.events[id(feed)] = asyncio.Event()
+            if feed.sub is not None:
+                self.pumps[id(feed)] = asyncio.get_running_loop().create_task(self.pump(feed))
+            logger.info(f"Sensorquelle: {key[0]}" + (f" + Bus {key[1]}" if key[1] else ""))
+        return feed
+
+    async def pump(self, feed: SensorFeed):
+        """Bus-Nachrichten einsammeln, sobald der Socket lesbar ist, und wartende Regler wecken."""
+        loop = asyncio.get_running_loop()
+        sub = feed.sub
+        event = self.events[id(feed)]
+        while True:
+            if not sub.connect():
+                await asyncio.sleep(RECONNECT_S)
+                continue
+            readable = asyncio.Event()
+            fd = sub.sock.fileno()
+            loop.add_reader(fd, readable.set)
+            try:
+                await readable.wait()
+            finally:
+                loop.remove_reader(fd)
+            if sub.poll(0):
+                event.set()
+                event.clear()
+
+    async def wait(self, feed: SensorFeed, interval: float, last_return: float):
+        """Wie SensorFeed.wait(): frühestens interval nach dem letzten Durchlauf, mit Bus genau
+        bei der nächsten Messung danach (höchstens ein weiteres Intervall)."""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, last_return + interval - loop.time()))
+        if feed.sub is None or not feed.sub.connected:
+            return
+        try:
+            await asyncio.wait_for(self.events[id(feed)].wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+    def close(self):
+        for task in self.pumps.values():
+            task.cancel()
+        for feed in self.feeds.values():
+            if feed.sub is not None and feed.sub.sock is not None:
+                feed.sub.sock.close()
+
+
+class ControllerHost:
+    def __init__(self, args):
+        self.args = args
+        self.view = ConfigView(args.config)
+        self.feeds = FeedPool()
+        self.regulators = []
+        self.steps: Dict[str, int] = {}
+        self.started = time.monotonic()
+
+    def build(self, only: List[str]):
+        if "preset" in only:
+            self.regulators.append(lux_controller.PresetRegulator(self.view, self.feeds))
+        if "exposure" in only:
+            ctl_path = Path(self.args.exposure_ctl)
+            if ctl_path.exists():
+                self.regulators.append(lux_exposured.ExposureRegulator(
+                    lux_exposured.load_json(ctl_path), self.view, self.feeds, self.args.dry_run))
+            else:
+                logger.warning(f"Belichtungsregler aus: {ctl_path} fehlt")
+        if "awb" in only:
+            cfg = awb_adjuster.load_awb_config(self.args.config)
+            self.regulators.append(awb_adjuster.AwbRegulator(cfg, self.view, self.feeds))
+
+    async def run_regulator(self, reg):
+        loop = asyncio.get_running_loop()
+        with logger.contextualize(reg=reg.name):
+            logger.info("Regler gestartet")
+            while True:
+                last = loop.time()
+                try:
+                    action = reg.step()
+                    if action:
+                        await asyncio.to_thread(action)
+                except Exception:
+                    logger.exception("Fehler im Regeldurchlauf")
+                self.steps[reg.name] = self.steps.get(reg.name, 0) + 1
+                await self.feeds.wait(reg.feed, reg.interval, last)
+
+    def report(self):
+        hours = max(1e-9, (time.monotonic() - self.started) / 3600)
+        steps = ", ".join(f"{k} {v}" for k, v in self.steps.items())
+        logger.info(f"Durchläufe: {steps} ({sum(self.steps.values()) / hours:.0f}/h); "
+                    f"config_tl.json gelesen {self.view.reads}×, geschrieben {self.view.writes}×; "
+                    f"RSS {rss_mb()} MB")
+
+    async def run(self, only: List[str]):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        self.build(only)
+        if not self.regulators:
+            logger.error("Keine Regler aktiv.")
+            return
+        tasks = [asyncio.create_task(self.run_regulator(r), name=r.name) for r in self.regulators]
+        logger.info(f"Controller-Host gestartet: {', '.join(r.name for r in self.regulators)} "
+                    f"(Config={self.view.path}, RSS {rss_mb()} MB)")
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=REPORT_EVERY_S)
+                except asyncio.TimeoutError:
+                    self.report()
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.feeds.close()
+            self.report()
+            logger.info("Controller-Host beendet.")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lux-, Belichtungs- und AWB-Regler in einem Prozess")
+    ap.add_argument("--config", default=str(CONFIG_FILE), help="Pfad zu config_tl.json")
+    ap.add_argument("--exposure-ctl", default=str(lux_exposured.DEFAULT_CTL_PATH), help="Pfad zu lux_exposured.json")
+    ap.add_argument("--only", action="append", choices=REGULATORS, help="nur diese Regler (mehrfach möglich)")
+    ap.add_argument("--dry-run", action="store_true", help="Belichtungsregler schreibt nichts")
+    ap.add_argument("--quiet", action="store_true", help="Kein Logging auf Stdout")
+    args = ap.parse_args()
+    setup_logger(args.quiet)
+    asyncio.run(ControllerHost(args).run(args.only or list(REGULATORS)))
+
+
+if __name__ == "__main__":
+    main()
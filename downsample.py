@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+downsample.py — Zeitreihen für Diagramme auf ein Punktebudget reduzieren
+- LTTB (Largest-Triangle-Three-Buckets): erhält die Form der Kurve mit wenigen Punkten
+- Min/Max je Bucket: erhält Spitzen exakt (z. B. Sättigung, Ausreißer)
+- NaN-Werte werden übersprungen; Datenlücken bleiben als Unterbrechung erhalten
+- Gemeinsam genutzt von make_charts.py und der Weboberfläche (chart_data.py)
+"""
+from __future__ import annotations
+from typing import Optional, Tuple
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+GAP_S = 300.0   # größerer Abstand zwischen zwei Messungen = Lücke in der Linie
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indizes der n nach LTTB ausgewählten Punkte (erster und letzter immer dabei)."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size) if n >= size else np.array([0, size - 1][:max(n, 0)], dtype=np.int64)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # n-2 Buckets zwischen erstem und letztem Punkt
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    # Mittelpunkte aller Buckets vorab (der jeweils nächste Bucket ist das dritte Dreieckseck)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:size - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:size - 1], edges[:-1]) / counts
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.append(avg_y[1:], y[-1])
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (avg_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indizes von Minimum und Maximum je Bucket (n/2 Buckets gleicher Zeitbreite), zeitlich sortiert."""
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    buckets = max(1, n // 2)
+    span = float(x[-1] - x[0]) or 1.0
+    b = np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+    order = np.lexsort((y, b))              # je Bucket aufsteigend nach Wert
+    bs = b[order]
+    first = np.flatnonzero(np.r_[True, bs[1:] != bs[:-1]])
+    last = np.r_[first[1:] - 1, len(bs) - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n: int, method: str = "lttb",
+               gap_s: Optional[float] = GAP_S) -> Tuple[np.ndarray, np.ndarray]:
+    """(x, y) mit höchstens etwa n Punkten; Lücken > gap_s werden als NaN-Punkt eingefügt."""
+    if method not in METHODS:
+        raise ValueError(f"Unbekannte Methode: {method} (verfügbar: {', '.join(METHODS)})")
+    valid = np.flatnonzero(~np.isnan(y))
+    if not len(valid):
+        return x[:0], y[:0]
+    xv, yv = x[valid], y[valid]
+    idx = (lttb if method == "lttb" else minmax)(xv, yv, n)
+    xs, ys = xv[idx], yv[idx].astype(np.float64)
+    if gap_s is None or len(idx) < 2:
+        return xs, ys
+    # Lücke zwischen zwei ausgewählten Punkten, wenn dazwischen irgendwo ein großer Abstand lag
+    gaps = np.concatenate([[0], np.cumsum(np.diff(xv) > gap_s)])
+    breaks = np.flatnonzero(np.diff(gaps[idx]) > 0)
+    if not len(breaks):
+        return xs, ys
+    xs = np.insert(xs.astype(np.float64), breaks + 1, (xs[breaks] + xs[breaks + 1]) / 2)
+    ys = np.insert(ys, breaks + 1, np.nan)
+    return xs, ys
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+export_stream.py — Session-/Zeitraum-Export als gestreamtes Archiv
+- TAR: deterministisches Layout (Header + Daten + Padding) wird vorab berechnet,
+  dadurch feste Länge, ETag und HTTP-Range (Fortsetzen abgebrochener Downloads)
+- ZIP: unkomprimiert (stored) über zipfile in einen Puffer, der laufend geleert wird
+- Kein temporäres Archiv auf der Platte, Speicherbedarf unabhängig von der Größe
+"""
+from __future__ import annotations
+import hashlib
+import os
+import tarfile
+import time
+import zipfile
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+CHUNK = 256 * 1024
+BLOCK = tarfile.BLOCKSIZE
+ZIP64_LIMIT = zipfile.ZIP64_LIMIT
+
+
+class Entry(NamedTuple):
+    arcname: str
+    path: str
+    size: int
+    mtime: float
+
+
+def _stat_entry(arcname: str, path: str) -> Optional[Entry]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return Entry(arcname, path, st.st_size, st.st_mtime)
+
+
+def collect(rows: Iterable[tuple], image_root: str, raw_root: Optional[str] = None,
+            include_raw: bool = False, include_meta: bool = False) -> List[Entry]:
+    """Archivinhalt aus Index-Zeilen (path, session, ts, size).
+
+    Bilder und Sidecar-JSON behalten ihren relativen Pfad, RAW-Dateien liegen unter raw/.
+    """
+    entries: List[Entry] = []
+    for rel, *_ in rows:
+        e = _stat_entry(rel, os.path.join(image_root, rel))
+        if e is None:
+            continue
+        entries.append(e)
+        stem = os.path.splitext(rel)[0]
+        if include_meta:
+            m = _stat_entry(stem + ".json", os.path.join(image_root, stem + ".json"))
+            if m:
+                entries.append(m)
+        if include_raw and raw_root:
+            # Alle RAW-Varianten (main.py schreibt .raw und das zugehörige .npy mit Form/Typ);
+            # bereits komprimierte (raw_tier.py) werden als .rawz-Container übernommen
+            for ext in (".raw", ".npy", ".dng"):
+                for name in (stem + ext, stem + ext + ".rawz"):
+                    r = _stat_entry("raw/" + name, os.path.join(raw_root, name))
+                    if r:
+                        entries.append(r)
+                        break
+    return entries
+
+
+def _read_exact(path: str, offset: int, length: int) -> Iterator[bytes]:
+    """length Bytes ab offset; wurde die Datei inzwischen gekürzt, wird mit Nullen aufgefüllt."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while length > 0:
+                data = f.read(min(CHUNK, length))
+                if not data:
+                    break
+                length -= len(data)
+                yield data
+    except OSError:
+        pass
+    while length > 0:
+        n = min(CHUNK, length)
+        length -= n
+        yield b"\0" * n
+
+
+class TarExport:
+    """TAR mit vorab bekannter Länge; jeder Byte-Bereich kann direkt erzeugt werden."""
+
+    def __init__(self, entries: List[Entry]):
+        self.entries = entries
+        self.size = 0
+        for e in entries:
+            self.size += len(self._header(e)) + e.size + (-e.size % BLOCK)
+        self.size += 2 * BLOCK  # Archiv-Ende
+
+    @staticmethod
+    def _header(e: Entry) -> bytes:
+        ti = tarfile.TarInfo(e.arcname)
+        ti.size = e.size
+        ti.mtime = int(e.mtime)
+        ti.mode = 0o644
+        ti.uname = ti.gname = ""
+        return ti.tobuf(tarfile.GNU_FORMAT, "utf-8", "surrogateescape")
+
+    @property
+    def etag(self) -> str:
+        h = hashlib.sha1()
+        for e in self.entries:
+            h.update(f"{e.arcname}\0{e.size}\0{e.mtime}\n".encode("utf-8", "surrogateescape"))
+        return h.hexdigest()
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Bytes [start, stop) des Archivs."""
+        stop = self.size if stop is None else min(stop, self.size)
+        pos = 0
+
+        def parts():
+            for e in self.entries:
+                header = self._header(e)
+                yield len(header), header, None
+                yield e.size, None, e.path
+                pad = -e.size % BLOCK
+                if pad:
+                    yield pad, b"\0" * pad, None
+            yield 2 * BLOCK, b"\0" * (2 * BLOCK), None
+
+        for length, data, path in parts():
+            if pos >= stop:
+                break
+            end = pos + length
+            if end > start:
+                lo, hi = max(start, pos) - pos, min(stop, end) - pos
+                if data is not None:
+                    yield data[lo:hi]
+                else:
+                    yield from _read_exact(path, lo, hi - lo)
+            pos = end
+
+
+class _Sink:
+    """Schreibziel für zipfile ohne seek(): sammelt Bytes, bis der Generator sie abholt."""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.pos = 0
+
+    def write(self, data) -> int:
+        self.buf += data
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self.buf)
+        self.buf.clear()
+        return data
+
+
+def iter_zip(entries: List[Entry]) -> Iterator[bytes]:
+    """Unkomprimiertes ZIP (stored) streamen; Länge steht erst am Ende fest."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+        for e in entries:
+            zi = zipfile.ZipInfo(e.arcname, time.localtime(max(e.mtime, 315532800))[:6])
+            zi.compress_type = zipfile.ZIP_STORED
+            zi.file_size = e.size
+            with zf.open(zi, "w", force_zip64=e.size >= ZIP64_LIMIT) as dst:
+                for data in _read_exact(e.path, 0, e.size):
+                    dst.write(data)
+                    if len(sink.buf) >= CHUNK:
+                        yield sink.take()
+            yield sink.take()
+    yield sink.take()
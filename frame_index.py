@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+frame_index.py — SQLite-Index aller Timelapse-Bilder
+- Ein Eintrag pro JPEG (relativer Pfad, Session-Ordner, Aufnahmezeit, Größe)
+- Inkrementeller Abgleich: nur Ordner mit geänderter mtime werden neu gelesen; die
+  bekannten Dateinamen je Ordner bleiben im Speicher (kein Neuladen der ganzen Session)
+- Keyset-Paginierung über (ts, path) → konstante Kosten pro Seite, egal wie tief
+- Opaker Cursor (base64url) für die Web-API
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import base64
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from loguru import logger
+
+# --- Pfade & Defaults ---
+IMAGE_ROOT = "/mnt/hdd/timelapse/Bilder"
+DB_PATH = "/mnt/hdd/timelapse/frame_index.sqlite"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "frame_index.log"
+
+# main.py: timelapse_20250816_142652_0001.jpg, main2.py: 20250816_142652_833.jpg
+TS_RE = re.compile(r"(\d{8})_(\d{6})(?:_(\d{3}))?(?!\d)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    path    TEXT PRIMARY KEY,
+    session TEXT NOT NULL,
+    ts      REAL NOT NULL,
+    size    INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frames_session_ts ON frames(session, ts, path);
+CREATE INDEX IF NOT EXISTS frames_ts ON frames(ts, path);
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    parent   TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE TABLE IF NOT EXISTS sessions (
+    session  TEXT PRIMARY KEY,
+    frames   INTEGER NOT NULL,
+    first_ts REAL,
+    last_ts  REAL
+);
+"""
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def frame_time(name: str, fallback: float) -> float:
+    """Aufnahmezeit aus dem Dateinamen, sonst mtime."""
+    m = TS_RE.search(name)
+    if not m:
+        return fallback
+    try:
+        dt = datetime.strptime(m.group(1) + m.group(2), "%Y%m%d%H%M%S")
+        return dt.timestamp() + (int(m.group(3)) / 1000.0 if m.group(3) else 0.0)
+    except ValueError:
+        return fallback
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Akzeptiert Unix-Sekunden oder ISO-8601 (lokale Zeit, wenn ohne Zone)."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def encode_cursor(ts: float, path: str, order: str) -> str:
+    raw = json.dumps([ts, path, order], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str, str]:
+    pad = "=" * (-len(cursor) % 4)
+    ts, path, order = json.loads(base64.urlsafe_b64decode(cursor + pad))
+    return float(ts), str(path), str(order)
+
+
+class FrameIndex:
+    def __init__(self, db_path: str = DB_PATH, root: str = IMAGE_ROOT):
+        self.db_path = db_path
+        self.root = root
+        self._known: Dict[str, Set[str]] = {}   # Ordner → indizierte Dateinamen (seit dem ersten Scan)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.connect() as con:
+            con.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=10)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    # ------------------------------ Abgleich ------------------------------
+
+    def sync(self) -> dict:
+        """Gleicht den Index mit dem Dateisystem ab (nur geänderte Ordner)."""
+        t0 = time.monotonic()
+        stats = {"dirs": 0, "rescanned": 0, "added": 0, "removed": 0}
+        con = self.connect()
+        try:
+            seen = set()
+            stack = [""]
+            while stack:
+                rel = stack.pop()
+                seen.add(rel)
+                stats["dirs"] += 1
+                full = os.path.join(self.root, rel) if rel else self.root
+                try:
+                    mtime_ns = os.stat(full).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                row = con.execute("SELECT mtime_ns FROM dirs WHERE path=?", (rel,)).fetchone()
+                if row and row[0] == mtime_ns:
+                    stack.extend(r[0] for r in con.execute("SELECT path FROM dirs WHERE parent=?", (rel,)))
+                    continue
+                stats["rescanned"] += 1
+                subdirs, added, removed = self._rescan_dir(con, rel, full)
+                stats["added"] += added
+                stats["removed"] += removed
+                con.execute("INSERT OR REPLACE INTO dirs(path, parent, mtime_ns) VALUES (?,?,?)",
+                            (rel, os.path.dirname(rel) if rel else None, mtime_ns))
+                stack.extend(subdirs)
+            # Verschwundene Ordner samt Bildern entfernen
+            for (rel,) in con.execute("SELECT path FROM dirs").fetchall():
+                if rel not in seen:
+                    cur = con.execute("DELETE FROM frames WHERE session=?", (rel,))
+                    stats["removed"] += cur.rowcount
+                    con.execute("DELETE FROM dirs WHERE path=?", (rel,))
+                    con.execute("DELETE FROM sessions WHERE session=?", (rel,))
+                    self._known.pop(rel, None)
+            con.commit()
+        except Exception:
+            self._known.clear()   # Transaktion verworfen → Stand im Speicher nicht mehr verlässlich
+            raise
+        finally:
+            con.close()
+        stats["seconds"] = round(time.monotonic() - t0, 3)
+        return stats
+
+    def _rescan_dir(self, con: sqlite3.Connection, rel: str, full: str) -> Tuple[List[str], int, int]:
+        subdirs: List[str] = []
+        present = {}
+        try:
+            with os.scandir(full) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(os.path.join(rel, e.name) if rel else e.name)
+                    elif e.name.lower().endswith(".jpg"):
+                        present[e.name] = e
+        except FileNotFoundError:
+            return [], 0, 0
+        known = self._known.get(rel)
+        loaded = known is None
+        if loaded:
+            known = self._known[rel] = {
+                os.path.basename(p) for (p,) in con.execute("SELECT path FROM frames WHERE session=?", (rel,))}
+        rows = []
+        for name in present.keys() - known:
+            st = present[name].stat()
+            rows.append((os.path.join(rel, name) if rel else name, rel, frame_time(name, st.st_mtime), st.st_size))
+        # andere Prozesse (add_frame) können schon eingetragen haben → rowcount statt len(rows)
+        added = con.executemany("INSERT OR IGNORE INTO frames(path, session, ts, size) VALUES (?,?,?,?)",
+                                rows).rowcount if rows else 0
+        gone_names = known - present.keys()
+        gone = [(os.path.join(rel, n) if rel else n,) for n in gone_names]
+        removed = con.executemany("DELETE FROM frames WHERE path=?", gone).rowcount if gone else 0
+        known |= present.keys()
+        known -= gone_names
+        if gone or (loaded and present):
+            self._refresh_session(con, rel)
+        elif added > 0:
+            # nur neue Bilder: Sessionzeile fortschreiben statt über alle Bilder zu zählen
+            ts = [r[2] for r in rows]
+            con.execute("INSERT INTO sessions(session, frames, first_ts, last_ts) VALUES (?,?,?,?) "
+                        "ON CONFLICT(session) DO UPDATE SET frames = frames + excluded.frames, "
+                        "first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)",
+                        (rel, added, min(ts), max(ts)))
+        return subdirs, max(0, added), max(0, removed)
+
+    def _refresh_session(self, con: sqlite3.Connection, session: str):
+        n, first, last = con.execute(
+            "SELECT COUNT(*), MIN(ts), MAX(ts) FROM frames WHERE session=?", (session,)).fetchone()
+        if n:
+            con.execute("INSERT OR REPLACE INTO sessions(session, frames, first_ts, last_ts) VALUES (?,?,?,?)",
+                        (session, n, first, last))
+        else:
+            con.execute("DELETE FROM sessions WHERE session=?", (session,))
+
+    def add_frame(self, path: str):
+        """Einzelnes, gerade gespeichertes Bild eintragen (ohne Ordner-Scan)."""
+        rel = os.path.relpath(path, self.root)
+        st = os.stat(path)
+        session = os.path.dirname(rel)
+        con = self.connect()
+        try:
+            con.execute("INSERT OR IGNORE INTO frames(path, session, ts, size) VALUES (?,?,?,?)",
+                        (rel, session, frame_time(os.path.basename(rel), st.st_mtime), st.st_size))
+            self._refresh_session(con, session)
+            con.commit()
+            if session in self._known:
+                self._known[session].add(os.path.basename(rel))
+        finally:
+            con.close()
+
+    def remove_frames(self, paths: List[str]):
+        """Gelöschte Bilder (relative Pfade) austragen und Session-Statistik nachführen."""
+        if not paths:
+            return
+        con = self.connect()
+        try:
+            con.executemany("DELETE FROM frames WHERE path=?", [(p,) for p in paths])
+            for session in {os.path.dirname(p) for p in paths}:
+                self._refresh_session(con, session)
+            con.commit()
+        finally:
+            con.close()
+
+    # ------------------------------ Abfragen ------------------------------
+
+    def sessions(self) -> List[dict]:
+        con = self.connect()
+        try:
+            return [
+                {"session": s, "frames": n, "first_ts": a, "last_ts": b}
+                for s, n, a, b in con.execute("SELECT session, frames, first_ts, last_ts FROM sessions ORDER BY first_ts")
+            ]
+        finally:
+            con.close()
+
+    def iter_frames(self, session: Optional[str] = None, t_from: Optional[float] = None,
+                    t_to: Optional[float] = None, limit: int = 100, cursor: Optional[str] = None,
+                    order: str = "desc") -> Iterator[Tuple[str, str, float, int]]:
+        """Liefert (path, session, ts, size) seitenweise; die Zeilen werden gestreamt."""
+        order = "asc" if order == "asc" else "desc"
+        where, params = [], []
+        if session is not None:
+            where.append("session = ?")
+            params.append(session)
+        if t_from is not None:
+            where.append("ts >= ?")
+            params.append(t_from)
+        if t_to is not None:
+            where.append("ts < ?")
+            params.append(t_to)
+        if cursor:
+            c_ts, c_path, c_order = decode_cursor(cursor)
+            if c_order != order:
+                raise ValueError("Cursor passt nicht zur Sortierung")
+            where.append("(ts, path) > (?, ?)" if order == "asc" else "(ts, path) < (?, ?)")
+            params.extend([c_ts, c_path])
+        direction = "ASC" if order == "asc" else "DESC"
+        sql = "SELECT path, session, ts, size FROM frames"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY ts {direction}, path {direction} LIMIT ?"
+        params.append(int(limit))
+        con = self.connect()
+        try:
+            yield from con.execute(sql, params)
+        finally:
+            con.close()
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Bild-Index für Timelapse-Sessions")
+    ap.add_argument("command", choices=["sync", "sessions"])
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--root", default=IMAGE_ROOT)
+    args = ap.parse_args()
+    idx = FrameIndex(args.db, args.root)
+    if args.command == "sync":
+        stats = idx.sync()
+        logger.info(f"Index abgeglichen: {stats}")
+    elif args.command == "sessions":
+        for s in idx.sessions():
+            print(f"{s['session']}\t{s['frames']}")
+
+
+if __name__ == "__main__":
+    main()
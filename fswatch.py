@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+fswatch.py — Dateiänderungs-Benachrichtigungen ohne Zusatzpakete
+- Linux: inotify direkt über ctypes (blockiert im Kernel, kostet im Leerlauf nichts)
+- Andere Systeme / Fehler: Fallback auf mtime-Polling mit gleicher API
+- Rekursive Überwachung: neue Unterordner werden automatisch mit aufgenommen
+"""
+from __future__ import annotations
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+DEFAULT_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct("iIII")
+
+# Ein Ereignis: (vollständiger Pfad, Maske)
+Event = Tuple[str, int]
+
+
+class InotifyWatcher:
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm = libc.inotify_rm_watch
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fehlgeschlagen")
+        self.wds: Dict[int, Tuple[str, int, bool]] = {}
+
+    def add(self, path: str, mask: int = DEFAULT_MASK, recursive: bool = False):
+        if not os.path.isdir(path):
+            return
+        wd = self._add(self.fd, os.fsencode(path), mask | (IN_CREATE if recursive else 0))
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.EACCES):
+                return
+            raise OSError(err, f"inotify_add_watch fehlgeschlagen: {path}")
+        self.wds[wd] = (path, mask, recursive)
+        if recursive:
+            try:
+                with os.scandir(path) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            self.add(e.path, mask, True)
+            except OSError:
+                pass
+
+    def read(self, timeout: Optional[float] = None) -> List[Event]:
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events: List[Event] = []
+        pos = 0
+        while pos + _EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, pos)
+            pos += _EVENT.size
+            name = buf[pos:pos + length].rstrip(b"\0").decode("utf-8", "replace")
+            pos += length
+            if mask & IN_IGNORED:
+                self.wds.pop(wd, None)
+                continue
+            base, wmask, recursive = self.wds.get(wd, (None, 0, False))
+            if base is None:
+                continue
+            full = os.path.join(base, name) if name else base
+            if recursive and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add(full, wmask, True)
+            events.append((full, mask))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class PollingWatcher:
+    """Fallback ohne inotify: vergleicht mtime/Größe der überwachten Ordner."""
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self.roots: List[Tuple[str, bool]] = []
+        self.state: Dict[str, Tuple[int, int]] = {}
+
+    def add(self, path: str, mask: int = DEFAULT_MASK, recursive: bool = False):
+        self.roots.append((path, recursive))
+        self.state.update(self._snapshot(path, recursive))
+
+    def _snapshot(self, root: str, recursive: bool) -> Dict[str, Tuple[int, int]]:
+        snap: Dict[str, Tuple[int, int]] = {}
+        stack = [root]
+        while stack:
+            d = stack.pop()
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(e.path)
+                            continue
+                        st = e.stat()
+                        snap[e.path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+        return snap
+
+    def read(self, timeout: Optional[float] = None) -> List[Event]:
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        new: Dict[str, Tuple[int, int]] = {}
+        for root, recursive in self.roots:
+            new.update(self._snapshot(root, recursive))
+        events: List[Event] = []
+        for path, sig in new.items():
+            old = self.state.get(path)
+            if old is None:
+                events.append((path, IN_CREATE | IN_CLOSE_WRITE))
+            elif old != sig:
+                events.append((path, IN_MODIFY))
+        for path in self.state.keys() - new.keys():
+            events.append((path, IN_DELETE))
+        self.state = new
+        return events
+
+    def close(self):
+        pass
+
+
+def make_watcher():
+    """inotify, wenn verfügbar – sonst Polling."""
+    try:
+        return InotifyWatcher()
+    except Exception:
+        return PollingWatcher()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+logtail.py — Effizientes Lesen großer Logdateien
+- tail_lines(): liest blockweise vom Dateiende rückwärts, bis n Zeilen gefunden sind
+- read_after(): liefert nur die Bytes ab einem bekannten Offset (inkrementelles Nachladen)
+- Erkennt Rotation/Kürzung (Offset > Dateigröße) und beginnt dann von vorn
+"""
+from __future__ import annotations
+import os
+from typing import List, Tuple
+
+BLOCK_SIZE = 8192
+MAX_CHUNK = 256 * 1024
+
+
+def tail_lines(path: str, n: int = 20, block_size: int = BLOCK_SIZE) -> Tuple[List[str], int]:
+    """Letzte n Zeilen und die aktuelle Dateigröße (= Offset für read_after)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        data = b""
+        # n+1 Zeilenumbrüche reichen, um n vollständige Zeilen zu haben
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.splitlines(keepends=True)[-n:] if n > 0 else []
+    return [l.decode("utf-8", "replace") for l in lines], end
+
+
+def read_after(path: str, offset: int, max_bytes: int = MAX_CHUNK) -> Tuple[str, int, bool]:
+    """Neue Daten ab offset: (Text, neuer Offset, reset).
+
+    Es werden nur vollständige Zeilen geliefert; reset=True bedeutet, dass die
+    Datei rotiert/gekürzt wurde und von vorn gelesen wurde.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        reset = offset < 0 or offset > size
+        if reset:
+            offset = 0
+        f.seek(offset)
+        data = f.read(min(max_bytes, size - offset))
+    cut = data.rfind(b"\n") + 1
+    if cut == 0 and len(data) < max_bytes:
+        return "", offset, reset
+    if cut == 0:
+        cut = len(data)
+    return data[:cut].decode("utf-8", "replace"), offset + cut, reset
@@ -7,11 +7,12 @@ Lux-basierter Preset-Controller für Timelapse
 - Bestimmt anhand von Luxwerten das passende Preset und wendet es an
 - Startet/Stoppt (bzw. Stop->Start) main2.py über tlctl.py, wenn kritische
   Konfigurationsänderungen vorliegen (z. B. Auflösung, HDR, Kamerawechsel …)
+- Neue Lux-Werte kommen über den Sensor-Bus (sensor_bus.py), sonst aus den CSV-Dateien
+- PresetRegulator: ein Durchlauf je step(), auch im gemeinsamen controller_host.py
 - Nutzt Loguru für robustes Logging
 """
 from __future__ import annotations
 import argparse
-import csv
 import json
 import os
 import signal
@@ -20,15 +21,17 @@ import sys
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from loguru import logger
+from sensor_bus import SensorFeed, SOCKET_PATH as BUS_SOCKET
+from tl_config import ConfigView
 
 # ------------------------- Pfade & Defaults -------------------------
 SCRIPT_DIR = Path(__file__).resolve().parent
 CONFIG_FILE = SCRIPT_DIR / "config_tl.json"
 LUX_CONTROL_FILE = SCRIPT_DIR / "lux_control.json"
 DEFAULT_PRESETS_DIR = Path("/mnt/hdd/timelapse/presets")
-DEFAULT_SENSOR_LOG = SCRIPT_DIR / "sensor_log.csv"
+DEFAULT_SENSOR_LOG = SCRIPT_DIR / "sensor_log"  # Tagesdateien (sensor_partitions.py) oder eine CSV
 LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
 LOG_PATH = LOG_ROOT / "lux_controller.log"
 
@@ -55,17 +58,6 @@ def load_json(path: Path) -> Optional[Dict[str, Any]]:
         logger.error(f"JSON-Fehler in {path}: {e}")
         return None
 
-def save_json(path: Path, data: Dict[str, Any]) -> bool:
-    try:
-        tmp = path.with_suffix(path.suffix + ".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        tmp.replace(path)
-        return True
-    except Exception as e:
-        logger.exception(f"Konnte {path} nicht speichern: {e}")
-        return False
-
 @dataclass
 class LuxCtlConfig:
     enabled: bool = True
@@ -74,6 +66,9 @@ class LuxCtlConfig:
     cooldown_s: int = 900
     sensor_log_csv: Path = DEFAULT_SENSOR_LOG
     sensor_lux_column: str = "veml_autolux"
+    avg_window_s: Optional[float] = None  # Zeitfenster statt Stichprobenzahl
+    use_bus: bool = True
+    bus_socket: str = BUS_SOCKET
     presets_dir: Path = DEFAULT_PRESETS_DIR
     tlctl_cmd: List[str] = None
     force_preset: Optional[str] = None
@@ -91,6 +86,10 @@ class LuxCtlConfig:
         cfg.cooldown_s = int(max(1, d.get("cooldown_s", cfg.cooldown_s)))
         cfg.sensor_log_csv = Path(d.get("sensor_log_csv", str(cfg.sensor_log_csv)))
         cfg.sensor_lux_column = str(d.get("sensor_lux_column", cfg.sensor_lux_column))
+        if d.get("avg_window_s") is not None:
+            cfg.avg_window_s = float(d["avg_window_s"])
+        cfg.use_bus = bool(d.get("use_bus", cfg.use_bus))
+        cfg.bus_socket = str(d.get("bus_socket") or cfg.bus_socket)
         cfg.presets_dir = Path(d.get("presets_dir", str(cfg.presets_dir)))
         tcmd = d.get("tlctl") or d.get("tlctl_cmd")
         if isinstance(tcmd, list) and tcmd:
@@ -141,34 +140,21 @@ def tl_restart(tlctl_cmd: List[str], *, config_path: Path, sleep_s: float = 1.0)
     return ok
 
 # ---------------------- Lux-Auswertung ----------------------
-def get_last_lux_avg(csv_path: Path, column: str, num_samples: int) -> Optional[float]:
+def get_last_lux_avg(feed: SensorFeed, column: str, num_samples: int,
+                     window_s: Optional[float] = None) -> Optional[float]:
+    """Mittelwert der letzten num_samples Messungen bzw. der letzten window_s Sekunden."""
     try:
-        with csv_path.open("r", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            header = next(reader)
-            try:
-                idx = header.index(column)
-            except ValueError:
-                logger.error(f"Lux-Spalte '{column}' nicht gefunden in {csv_path} (Header: {header})")
-                return None
-            rows = list(reader)
-            if not rows: return None
-            last = rows[-num_samples:] if len(rows) >= num_samples else rows
-            vals: List[float] = []
-            for r in last:
-                try: vals.append(float(r[idx]))
-                except (ValueError, IndexError): continue
-            if not vals: return None
-            return sum(vals) / len(vals)
-    except FileNotFoundError:
-        logger.warning(f"Sensor-CSV fehlt: {csv_path}")
-        return None
+        if not feed.has_column(column):
+            logger.error(f"Lux-Spalte '{column}' nicht verfügbar ({feed.csv_path} / Sensor-Bus)")
+            return None
+        return feed.mean(column, n=num_samples, seconds=window_s)
     except Exception:
-        logger.exception(f"Fehler beim Lesen von {csv_path}")
+        logger.exception(f"Fehler beim Lesen der Sensorwerte ({feed.csv_path})")
         return None
 
 # --------------------- Preset-Anwendung ----------------------
-def apply_preset_to_config(preset: str, presets_dir: Path, config_path: Path) -> bool:
+def apply_preset(preset: str, presets_dir: Path, view: ConfigView) -> bool:
+    """Preset übernehmen; Laufzeitwerte der anderen Regler (RUNTIME_KEYS) bleiben, Schreiben unter cfg_lock."""
     ppath = Path(preset) if os.path.isabs(preset) else (presets_dir / f"{preset}.json")
     if not ppath.exists():
         logger.error(f"Preset nicht gefunden: {ppath}")
@@ -177,15 +163,21 @@ def apply_preset_to_config(preset: str, presets_dir: Path, config_path: Path) ->
     if pdata is None:
         logger.error(f"Preset JSON ungültig: {ppath}")
         return False
-    cur_cfg = load_json(config_path) or {}
-    for k in RUNTIME_KEYS:
-        if k in cur_cfg: pdata[k] = cur_cfg[k]
-        else: pdata.pop(k, None)
-    ok = save_json(config_path, pdata)
+
+    def merge(cur_cfg: Dict[str, Any]) -> Dict[str, Any]:
+        for k in RUNTIME_KEYS:
+            if k in cur_cfg: pdata[k] = cur_cfg[k]
+            else: pdata.pop(k, None)
+        return pdata
+
+    ok = view.replace(merge)
     if ok:
-        logger.info(f"Preset angewendet: {ppath} → {config_path}")
+        logger.info(f"Preset angewendet: {ppath} → {view.path}")
     return ok
 
+def apply_preset_to_config(preset: str, presets_dir: Path, config_path: Path) -> bool:
+    return apply_preset(preset, presets_dir, ConfigView(config_path))
+
 def needs_restart(old_cfg: Dict[str, Any], new_cfg: Dict[str, Any]) -> bool:
     for k in CRITICAL_KEYS:
         if old_cfg.get(k) != new_cfg.get(k):
@@ -205,53 +197,83 @@ def choose_preset(avg_lux: float, mappings: List[Dict[str, Any]]) -> Optional[st
         except Exception: continue
     return None
 
-def controller_loop(args):
-    current_preset: Optional[str] = None
-    last_switch: float = time.time() - 99999
+class PresetRegulator:
+    """Ein Durchlauf je step(); lux_control.json wird bei jedem Durchlauf (nur bei Änderung) gelesen.
 
-    while True:
-        cfg = load_lux_ctl_config()
+    step() schreibt das Preset sofort und liefert das Prüfen/Neustarten über tlctl als
+    Aktion zurück, da es blockiert (controller_host.py führt sie in einem Thread aus).
+    """
+    name = "preset"
+
+    def __init__(self, view: ConfigView, feeds=SensorFeed, ctl_view: Optional[ConfigView] = None):
+        self.view = view
+        self.feeds = feeds
+        self.ctl_view = ctl_view or ConfigView(LUX_CONTROL_FILE)
+        self.cfg = LuxCtlConfig.from_json(None)
+        self.feed: Optional[SensorFeed] = None
+        self.feed_key = None
+        self.current_preset: Optional[str] = None
+        self.last_switch: float = time.time() - 99999
+
+    @property
+    def interval(self) -> float:
+        return float(self.cfg.check_interval_s) if self.cfg.enabled else 60.0
+
+    def _switch(self, preset: str, quiet: bool = False) -> Optional[Callable[[], None]]:
+        cfg = self.cfg
+        old_cfg = self.view.get()
+        if not apply_preset(preset, cfg.presets_dir, self.view):
+            return None
+        new_cfg = self.view.get()
+        self.current_preset = preset
+        config_path = self.view.path
+
+        def restart_if_needed():
+            if needs_restart(old_cfg, new_cfg) or not tl_status(cfg.tlctl_cmd, config_path=config_path):
+                tl_restart(cfg.tlctl_cmd, config_path=config_path)
+            elif not quiet:
+                logger.info("Keine kritischen Änderungen – kein Neustart nötig.")
+        return restart_if_needed
+
+    def step(self) -> Optional[Callable[[], None]]:
+        self.cfg = cfg = LuxCtlConfig.from_json(self.ctl_view.get())
+        key = (cfg.sensor_log_csv, cfg.bus_socket if cfg.use_bus else None)
+        if self.feed is None or key != self.feed_key:
+            self.feed, self.feed_key = self.feeds(cfg.sensor_log_csv, cfg.bus_socket, cfg.use_bus), key
         if not cfg.enabled:
             logger.info("Lux-Kontrolle deaktiviert. Warte 60s…")
-            time.sleep(60)
-            continue
+            return None
         if cfg.force_preset:
             logger.info(f"Force-Preset aktiv: {cfg.force_preset}")
-            old = load_json(CONFIG_FILE) or {}
-            if apply_preset_to_config(cfg.force_preset, cfg.presets_dir, CONFIG_FILE):
-                new = load_json(CONFIG_FILE) or {}
-                if needs_restart(old, new) or not tl_status(cfg.tlctl_cmd, config_path=CONFIG_FILE):
-                    tl_restart(cfg.tlctl_cmd, config_path=CONFIG_FILE)
-                current_preset = cfg.force_preset
-            time.sleep(cfg.check_interval_s)
-            continue
+            return self._switch(cfg.force_preset, quiet=True)
         samples = max(1, round(cfg.switch_delay_s / cfg.check_interval_s))
-        avg = get_last_lux_avg(cfg.sensor_log_csv, cfg.sensor_lux_column, samples)
+        avg = get_last_lux_avg(self.feed, cfg.sensor_lux_column, samples, cfg.avg_window_s)
         if avg is None:
-            time.sleep(cfg.check_interval_s)
-            continue
-        logger.info(f"Durchschnittlicher Lux-Wert (n={samples}): {avg:.2f}")
-        lux_json = load_json(LUX_CONTROL_FILE) or {}
-        mappings: List[Dict[str, Any]] = lux_json.get("mappings", [])
+            return None
+        window = f"{cfg.avg_window_s:.0f}s" if cfg.avg_window_s else f"n={samples}"
+        logger.info(f"Durchschnittlicher Lux-Wert ({window}): {avg:.2f}")
+        mappings: List[Dict[str, Any]] = self.ctl_view.get().get("mappings", [])
         preset = choose_preset(avg, mappings)
         logger.info(f"Ermitteltes Preset: {preset or '—'}")
         now = time.time()
-        if preset and preset != current_preset:
-            if now - last_switch >= cfg.cooldown_s:
-                old_cfg = load_json(CONFIG_FILE) or {}
-                if apply_preset_to_config(preset, cfg.presets_dir, CONFIG_FILE):
-                    new_cfg = load_json(CONFIG_FILE) or {}
-                    if needs_restart(old_cfg, new_cfg) or not tl_status(cfg.tlctl_cmd, config_path=CONFIG_FILE):
-                        tl_restart(cfg.tlctl_cmd, config_path=CONFIG_FILE)
-                    else:
-                        logger.info("Keine kritischen Änderungen – kein Neustart nötig.")
-                    current_preset = preset
-                    last_switch = now
-            else:
-                left = int(cfg.cooldown_s - (now - last_switch))
-                logger.info(f"Neues Preset erkannt, aber Cooldown aktiv ({left}s).")
+        if preset and preset != self.current_preset:
+            if now - self.last_switch >= cfg.cooldown_s:
+                action = self._switch(preset)
+                if action:
+                    self.last_switch = now
+                return action
+            left = int(cfg.cooldown_s - (now - self.last_switch))
+            logger.info(f"Neues Preset erkannt, aber Cooldown aktiv ({left}s).")
+        return None
+
+def controller_loop(args, stop_flag):
+    reg = PresetRegulator(ConfigView(CONFIG_FILE))
+    while not stop_flag["stop"]:
+        action = reg.step()
+        if action:
+            action()
         if args.once: break
-        time.sleep(cfg.check_interval_s)
+        reg.feed.wait(reg.interval, stop=lambda: stop_flag["stop"])
 
 # ------------------------------ CLI ------------------------------
 def main():
@@ -286,9 +308,7 @@ def main():
 
     try:
         logger.info("Lux-Controller gestartet.")
-        while not stop_flag["stop"]:
-            controller_loop(args)
-            if args.once: break
+        controller_loop(args, stop_flag)
     finally:
         logger.info("lux_controller beendet.")
 
@@ -5,30 +5,23 @@ lux_exposured.py – Regler-Daemon für Shutter & Gain nach Lux (v2.3.0)
 - EMA, Step-Limiter, optionale 50 Hz-Quantisierung
 - Schreibt NUR 'shutter' & 'gain' in config_tl.json (atomar)
 - NEUE FUNKTIONALITÄT: Robuster Astro-Modus mit Hysterese und Haltezeiten.
+- Reagiert über den Sensor-Bus sofort auf neue Messungen (Fallback: CSV-Ende)
+- ExposureRegulator: ein Durchlauf je step(), auch im gemeinsamen controller_host.py
 - Nutzt Loguru für robustes Logging
 """
-import argparse, csv, json, time, math
+import argparse, json, time, math
 from pathlib import Path
 from loguru import logger
+from sensor_bus import SensorFeed, SOCKET_PATH as BUS_SOCKET
+from tl_config import ConfigView
 import sys
-import fcntl, os
-from contextlib import contextmanager
+import os
 
-LOCK_PATH = "/tmp/tlcfg.lock"
-@contextmanager
-def cfg_lock():
-    fd = os.open(LOCK_PATH, os.O_CREAT | os.O_RDWR, 0o666)
-    try:
-        fcntl.flock(fd, fcntl.LOCK_EX)
-        yield
-    finally:
-        fcntl.flock(fd, fcntl.LOCK_UN)
-        os.close(fd)
 # --- Defaults / Pfade ---
 SCRIPT_DIR = Path(__file__).resolve().parent
 DEFAULT_CFG_PATH = SCRIPT_DIR / "config_tl.json"
 DEFAULT_CTL_PATH = SCRIPT_DIR / "lux_exposured.json"
-DEFAULT_CSV_PATH = SCRIPT_DIR / "sensor_log.csv"
+DEFAULT_CSV_PATH = SCRIPT_DIR / "sensor_log"  # Tagesdateien (sensor_partitions.py) oder eine CSV
 DEFAULT_LUX_COLUMN = "veml_autolux"
 LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
 LOG_PATH = LOG_ROOT / "lux_exposured.log"
@@ -40,40 +33,15 @@ def load_json(path: Path):
     except Exception:
         return {}
 
-def save_json_atomic(path: Path, data: dict) -> bool:
-    try:
-        tmp = path.with_suffix(path.suffix + ".tmp")
-        tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-        tmp.replace(path)
-        return True
-    except Exception:
-        logger.exception(f"Save failed for {path}")
-        return False
-
-def read_lux_avg(csv_path: Path, column: str, samples: int):
+def read_lux_avg(feed: SensorFeed, column: str, samples: int, window_s=None):
+    """Mittelwert der letzten `samples` Messungen bzw. der letzten window_s Sekunden."""
     try:
-        with csv_path.open("r", encoding="utf-8") as f:
-            rows = list(csv.reader(f))
-        if not rows or len(rows) < 2:
+        if not feed.has_column(column):
+            logger.warning(f"Lux column '{column}' not available from {feed.csv_path} / sensor bus")
             return None
-        header = rows[0]
-        idx = header.index(column) if column in header else None
-        if idx is None:
-            logger.error(f"Lux column '{column}' not in CSV header {header}")
-            return None
-        data = rows[1:]
-        take = data[-samples:] if len(data) >= samples else data
-        vals = []
-        for r in take:
-            try: vals.append(float(r[idx]))
-            except: pass
-        if not vals: return None
-        return sum(vals)/len(vals)
-    except FileNotFoundError:
-        logger.warning(f"Sensor CSV missing: {csv_path}")
-        return None
+        return feed.mean(column, n=samples, seconds=window_s)
     except Exception:
-        logger.exception("CSV read error")
+        logger.exception("Sensor read error")
         return None
 
 def clamp(x, lo, hi):
@@ -129,107 +97,95 @@ def compute_targets(lux_avg, camera_id, ctl, live_cfg, ema_et_prev):
     if qstep > 0 and tgt_s >= qmin: tgt_s = quantize(tgt_s, qstep)
     return int(tgt_s), float(tgt_g), float(ema_et), float(et)
 
-def main():
-    ap = argparse.ArgumentParser(description="Lux-Regler für Shutter & Gain (v2.3.0)")
-    ap.add_argument("--config", default=str(DEFAULT_CFG_PATH), help="Path to config_tl.json")
-    ap.add_argument("--ctl", default=str(DEFAULT_CTL_PATH), help="Path to lux_exposured.json")
-    ap.add_argument("--dry-run", action="store_true")
-    ap.add_argument("--quiet", action="store_true")
-    args = ap.parse_args()
-    
-    # Loguru-Konfiguration
-    LOG_ROOT.mkdir(parents=True, exist_ok=True)
-    logger.remove()
-    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
-    if not args.quiet:
-        logger.add(sys.stderr)
-
-    cfg_path = Path(args.config)
-    ctl_path = Path(args.ctl)
-    ctl = load_json(ctl_path)
-    
-    astro_enter_lux = float(ctl.get("astro_enter_lux", 0.05))
-    astro_exit_lux = float(ctl.get("astro_exit_lux", astro_enter_lux * 2.0))
-    hold_on_s = float(ctl.get("astro_enter_hold_s", 60.0))
-    hold_off_s = float(ctl.get("astro_exit_hold_s", 60.0))
-    astro_shutter_us = int(ctl.get("astro_shutter_us", 8000000))
-    astro_gain = float(ctl.get("astro_gain", 8.0))
-    astro_min_interval_s = float(ctl.get("astro_min_interval_s", 60.0))
-
-    live_cfg = load_json(cfg_path)
-    camera_id = str(live_cfg.get("camera_id", "imx708")).lower()
-    shutter = int(live_cfg.get("shutter", 4000))
-    gain = float(live_cfg.get("gain", 1.0))
-    ema_et = max(1.0, shutter * max(gain, 1.0))
-    last_cam = camera_id
-    hold_until = 0.0
-    astro_active = False
-    astro_written = False
-    below_threshold_since = None
-    above_threshold_since = None
-    
-    logger.info(f"Regler gestartet. Config={cfg_path}, Ctl={ctl_path}")
-
-    while True:
-        lux = read_lux_avg(Path(ctl["sensor_csv"]), str(ctl["sensor_column"]), int(ctl["avg_samples"]))
+class ExposureRegulator:
+    """Ein Regeldurchlauf je step(); EMA, Astro-Hysterese und Kamerawechsel bleiben im Objekt."""
+    name = "exposure"
+
+    def __init__(self, ctl: dict, view: ConfigView, feeds=SensorFeed, dry_run: bool = False):
+        self.ctl = ctl
+        self.view = view
+        self.dry_run = dry_run
+        self.feed = feeds(Path(ctl["sensor_csv"]), ctl.get("bus_socket") or BUS_SOCKET, bool(ctl.get("use_bus", True)))
+
+        self.astro_enter_lux = float(ctl.get("astro_enter_lux", 0.05))
+        self.astro_exit_lux = float(ctl.get("astro_exit_lux", self.astro_enter_lux * 2.0))
+        self.hold_on_s = float(ctl.get("astro_enter_hold_s", 60.0))
+        self.hold_off_s = float(ctl.get("astro_exit_hold_s", 60.0))
+        self.astro_shutter_us = int(ctl.get("astro_shutter_us", 8000000))
+        self.astro_gain = float(ctl.get("astro_gain", 8.0))
+
+        live_cfg = view.get()
+        self.camera_id = str(live_cfg.get("camera_id", "imx708")).lower()
+        self.shutter = int(live_cfg.get("shutter", 4000))
+        self.gain = float(live_cfg.get("gain", 1.0))
+        self.ema_et = max(1.0, self.shutter * max(self.gain, 1.0))
+        self.last_cam = self.camera_id
+        self.hold_until = 0.0
+        self.astro_active = False
+        self.astro_written = False
+        self.below_threshold_since = None
+        self.above_threshold_since = None
+
+    @property
+    def interval(self) -> float:
+        return float(self.ctl["interval_s"])
+
+    def step(self):
+        ctl = self.ctl
+        lux = read_lux_avg(self.feed, str(ctl["sensor_column"]), int(ctl["avg_samples"]), ctl.get("avg_window_s"))
         if lux is None:
-            time.sleep(float(ctl["interval_s"]))
-            continue
+            return
 
-        live_cfg = load_json(cfg_path)
-        shutter = int(live_cfg.get("shutter", shutter))
-        gain = float(live_cfg.get("gain", gain))
+        live_cfg = self.view.get()
+        self.shutter = shutter = int(live_cfg.get("shutter", self.shutter))
+        self.gain = gain = float(live_cfg.get("gain", self.gain))
         camera_id = str(live_cfg.get("camera_id", "imx708")).lower()
         ae_on = bool(live_cfg.get("ae_enable", True))
         now = time.monotonic()
 
-        if lux <= astro_enter_lux:
-            if below_threshold_since is None: below_threshold_since = now
+        if lux <= self.astro_enter_lux:
+            if self.below_threshold_since is None: self.below_threshold_since = now
         else:
-            below_threshold_since = None
-        if lux >= astro_exit_lux:
-            if above_threshold_since is None: above_threshold_since = now
+            self.below_threshold_since = None
+        if lux >= self.astro_exit_lux:
+            if self.above_threshold_since is None: self.above_threshold_since = now
         else:
-            above_threshold_since = None
+            self.above_threshold_since = None
 
-        if not astro_active and below_threshold_since and (now - below_threshold_since) >= hold_on_s:
-            astro_active = True
+        if not self.astro_active and self.below_threshold_since and (now - self.below_threshold_since) >= self.hold_on_s:
+            self.astro_active = True
             logger.info(f"ASTRO-Modus AKTIV (Lux={lux:.3f}).")
-        
-        if astro_active and above_threshold_since and (now - above_threshold_since) >= hold_off_s:
-            astro_active = False
-            astro_written = False
+
+        if self.astro_active and self.above_threshold_since and (now - self.above_threshold_since) >= self.hold_off_s:
+            self.astro_active = False
+            self.astro_written = False
             logger.info(f"ASTRO-Modus DEAKTIVIERT (Lux={lux:.3f}).")
 
-        if astro_active:
-            if not astro_written and not args.dry_run:
-                with cfg_lock():
-                    new_cfg = load_json(cfg_path)  # frisch laden!
-                    new_cfg["shutter"] = int(astro_shutter_us)
-                    new_cfg["gain"] = float(round(astro_gain, 3))
-                    # ggf. min_interval …
-                    if save_json_atomic(cfg_path, new_cfg):
-                        astro_written = True
-                        logger.info(f"Astro-Werte geschrieben: shutter={astro_shutter_us}us, gain={astro_gain:.2f}.")
+        if self.astro_active:
+            if not self.astro_written and not self.dry_run:
+                # ggf. min_interval …
+                if self.view.update({"shutter": int(self.astro_shutter_us), "gain": float(round(self.astro_gain, 3))}):
+                    self.astro_written = True
+                    logger.info(f"Astro-Werte geschrieben: shutter={self.astro_shutter_us}us, gain={self.astro_gain:.2f}.")
             logger.info(f"Lux={lux:.3f}  [Astro-Modus aktiv] – Werte sind fest")
-            time.sleep(float(ctl["interval_s"]))
-            continue
+            return
 
-        if camera_id != last_cam:
+        if camera_id != self.last_cam:
             hold_s = float(ctl.get("hold_after_cam_switch_s", 0.0))
             if hold_s > 0:
-                hold_until = now + hold_s
-                logger.info(f"Kamerawechsel erkannt ({last_cam} -> {camera_id}). Pausiere {hold_s}s.")
-            last_cam = camera_id
-        if hold_until and now < hold_until:
-            time.sleep(float(ctl["interval_s"])); continue
-        
-        tgt_s, tgt_g, ema_et, et_raw = compute_targets(lux, camera_id, ctl, live_cfg, ema_et)
+                self.hold_until = now + hold_s
+                logger.info(f"Kamerawechsel erkannt ({self.last_cam} -> {camera_id}). Pausiere {hold_s}s.")
+            self.last_cam = camera_id
+        if self.hold_until and now < self.hold_until:
+            return
+
+        tgt_s, tgt_g, self.ema_et, et_raw = compute_targets(lux, camera_id, ctl, live_cfg, self.ema_et)
+        ema_et = self.ema_et
 
         if bool(ctl.get("write_only_if_ae_off", True)) and ae_on:
             logger.info(
                 f"Lux={lux:.3f}  et≈{int(ema_et)}us (raw≈{int(et_raw)}us)  [AE ON] → skip  (target_shutter≈{int(tgt_s)}us, target_gain≈{float(tgt_g):.2f})")
-            time.sleep(float(ctl["interval_s"])); continue
+            return
 
         max_up_s = shutter * (1.0 + float(ctl["max_step_shutter_pct"]))
         max_dn_s = shutter * (1.0 - float(ctl["max_step_shutter_pct"]))
@@ -252,20 +208,41 @@ def main():
         g_thr = float(ctl["min_write_delta_gain"])
         write_s = abs(prop_s - int(live_cfg.get("shutter", prop_s))) >= s_thr
         write_g = abs(prop_g - float(live_cfg.get("gain", prop_g))) >= g_thr
-        
+
         wrote = False
-        if (write_s or write_g) and not args.dry_run:
-            with cfg_lock():
-                new_cfg = load_json(cfg_path)  # frisch laden!
-                if write_s:
-                    new_cfg["shutter"] = int(prop_s)
-                if write_g:
-                    new_cfg["gain"] = float(round(prop_g, 3))
-                wrote = save_json_atomic(cfg_path, new_cfg)
+        if (write_s or write_g) and not self.dry_run:
+            changes = {}
+            if write_s:
+                changes["shutter"] = int(prop_s)
+            if write_g:
+                changes["gain"] = float(round(prop_g, 3))
+            wrote = self.view.update(changes)
 
-        
         logger.info(f"Lux={lux:.3f}  et≈{int(ema_et)}us (raw≈{int(et_raw)}us)  shutter→{prop_s}us{' *' if write_s and wrote else ''}  gain→{prop_g:.2f}{' *' if write_g and wrote else ''}")
-        time.sleep(float(ctl["interval_s"]))
+
+def main():
+    ap = argparse.ArgumentParser(description="Lux-Regler für Shutter & Gain (v2.3.0)")
+    ap.add_argument("--config", default=str(DEFAULT_CFG_PATH), help="Path to config_tl.json")
+    ap.add_argument("--ctl", default=str(DEFAULT_CTL_PATH), help="Path to lux_exposured.json")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args()
+    
+    # Loguru-Konfiguration
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.remove()
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+    if not args.quiet:
+        logger.add(sys.stderr)
+
+    cfg_path = Path(args.config)
+    ctl_path = Path(args.ctl)
+    reg = ExposureRegulator(load_json(ctl_path), ConfigView(cfg_path), dry_run=args.dry_run)
+    logger.info(f"Regler gestartet. Config={cfg_path}, Ctl={ctl_path}")
+
+    while True:
+        reg.step()
+        reg.feed.wait(reg.interval)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
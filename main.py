@@ -8,11 +8,13 @@ import numpy as np
 from picamera2 import Picamera2
 from datetime import datetime
 from loguru import logger
+from status_block import StatusBlock
+from products import SessionProducts, LORES_SIZE
 
 # --- Konfiguration & Pfade ---
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.json')
 PID_PATH = os.path.join(os.path.dirname(__file__), 'web/timelapse.pid')
-STATUS_PATH = os.path.join(os.path.dirname(__file__), 'web/status.json')
+STATUS = StatusBlock()  # Shared-Memory-Status für die Web-App (statt web/status.json)
 TEMP_PATH = os.path.join(os.path.dirname(__file__), 'temp.jpg')
 LOG_ROOT = "/mnt/hdd/timelapse/logs" # Dies muss mit app.py übereinstimmen
 
@@ -185,7 +187,8 @@ def run_timelapse(config):
 
         still_config = picam.create_still_configuration(
             main={"size": tuple(config["resolution"]), "format": "BGR888"},
-            raw={"size": (2304, 1296), "format": "SBGGR10"}
+            raw={"size": (2304, 1296), "format": "SBGGR10"},
+            lores={"size": LORES_SIZE}  # kleiner YUV420-Puffer für Keogramm/Kontaktbogen
         )
         picam.configure(still_config)
         picam.start()
@@ -216,6 +219,7 @@ def run_timelapse(config):
         session_raw_folder  = os.path.join(raw_root, session_subfolder)
         os.makedirs(session_jpeg_folder, exist_ok=True)
         os.makedirs(session_raw_folder, exist_ok=True)
+        products = SessionProducts(os.path.relpath(session_jpeg_folder, config["timelapse_folder"]))
 
         logger.info(f"📁 Session-Ordner (JPEG): {session_jpeg_folder}")
         logger.info(f"📁 Session-Ordner (RAW):  {session_raw_folder}")
@@ -258,9 +262,18 @@ def run_timelapse(config):
 
             t0 = time.time()
             try:
-                picam.capture_file(filename_jpeg)
+                request = picam.capture_request()
+                try:
+                    request.save("main", filename_jpeg)
+                    lores = request.make_array("lores")
+                finally:
+                    request.release()
                 last_jpeg = filename_jpeg
                 logger.success(f"📸 JPEG gespeichert: {filename_jpeg}")
+                try:
+                    products.add_yuv420(lores)
+                except Exception as pe:
+                    logger.warning(f"⚠️ Keogramm/Kontaktbogen nicht aktualisiert: {pe}")
                 if config.get("save_raw", False):
                     raw_array = picam.capture_array("raw")
                     raw_array.tofile(filename_raw)
@@ -302,11 +315,11 @@ def run_timelapse(config):
                 "last_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "error": str(e) if 'e' in locals() else ""
             }
-            with open(STATUS_PATH, "w") as f:
-                json.dump(status, f, indent=2)
+            STATUS.update(**status)
             time.sleep(actual_interval)
 
         picam.close()
+        products.close()
         print("DEBUG: Timelapse-Loop Ende erreicht.")
         logger.info(f"✅ Timelapse beendet: {shot-1} Bilder gespeichert.")
         logger.info(f"✅ Timelapse beendet: {shot-1} Bilder gespeichert.")
@@ -324,8 +337,7 @@ def run_timelapse(config):
             "last_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "error": str(e) if 'e' in locals() else ""
         }
-        with open(STATUS_PATH, "w") as f:
-            json.dump(status, f, indent=2)
+        STATUS.update(**status)
         if os.path.exists(PID_PATH):
             os.remove(PID_PATH)
 
@@ -18,6 +18,7 @@ import time
 from datetime import datetime
 from pathlib import Path
 from loguru import logger
+from products import SessionProducts
 
 # Picamera2/libcamera
 try:
@@ -241,6 +242,7 @@ def main():
         end_mono = start_mono + duration if duration > 0 else None
         shot = 0
         next_due = start_mono
+        products = None  # Keogramm/Kontaktbogen des aktuellen Tagesordners
         while not stop_flag and (end_mono is None or time.monotonic() < end_mono):
             now = time.monotonic()
             if now < next_due:
@@ -287,6 +289,16 @@ def main():
                     if raw_delay > 0: time.sleep(raw_delay)
             except Exception as e:
                 logger.error("Fehler beim Aufnehmen: %s", e)
+            if jpg_path.exists():
+                try:
+                    session = str(jpg_dir.relative_to(tl_folder))
+                    if products is None or products.session != session:
+                        if products is not None:
+                            products.close()
+                        products = SessionProducts(session)
+                    products.add_jpeg(str(jpg_path))
+                except Exception as e:
+                    logger.warning(f"Keogramm/Kontaktbogen nicht aktualisiert: {e}")
             next_due += max(min_interval, 0.0)
         logger.info("Timelapse wird beendet…")
     finally:
@@ -2,17 +2,27 @@
 # -*- coding: utf-8 -*-
 """
 make_charts.py - Erzeugt Zeitreihen-Diagramme aus CSV-Daten
-- Nutzt Pandas, Plotly und Loguru
-- Erzeugt eine HTML-Datei mit interaktiven Graphen
+- Nutzt NumPy, Plotly und Loguru
+- Erzeugt eine HTML-Datei mit interaktiven Graphen: plotly.js und ein gemeinsames
+  Daten-Payload (chart_data.py) je einmal eingebettet, Diagramme entstehen im Browser
+- Je Linie höchstens --max-points Punkte (LTTB oder Min/Max, downsample.py)
+- Geparste CSVs liegen als NPZ im Spaltencache; neue Zeilen werden nur angehängt
+- Über die Weboberfläche geöffnet, lädt ein Zoom den Ausschnitt über /api/sensors nach
+- Optional (--store): Daten aus dem Zeitreihen-Speicher (sensor_store.py); für lange
+  Zeiträume werden automatisch die 1-min-/1-h-Rollups statt der Rohdaten gelesen
+- Optional (--dir): nur die Tagesdateien (sensor_partitions.py) des Zeitraums lesen
 """
-import pandas as pd
-import numpy as np
+import argparse
+import html
+import json
+import time
 from pathlib import Path
-from plotly.offline import plot
-import plotly.graph_objs as go
+from plotly.offline import get_plotlyjs
 import os
 import sys
 from loguru import logger
+from chart_data import CACHE_DIR, DEFAULT_POINTS, add_derived, build_payload, load_files, prune_cache, store_columns
+from downsample import GAP_S, METHODS
 
 # --- Pfade ---
 CSV_PATH = "sensor_log.csv"
@@ -27,105 +37,153 @@ def setup_logger():
     LOG_ROOT.mkdir(parents=True, exist_ok=True)
     logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
 
-def mk_ts(name, x, y):
-    return go.Scatter(x=x, y=y, mode="lines", name=name)
+COLUMNS = [
+    "veml_lux", "veml_autolux", "veml_white", "veml_light", "veml_gain", "veml_integration_ms",
+    "tcs_lux", "tcs_ctK", "tcs_r", "tcs_g", "tcs_b", "tcs_clear", "tcs_gain", "tcs_integration_ms",
+]
+
+def load_from_store(db_path, days, max_points, method="lttb"):
+    """Spalten der passenden Stufe wie aus der CSV (minmax: Rollup-Minimum/-Maximum) und die
+    Lückenschwelle dazu – ein fehlender Rollup-Bucket ist noch keine Lücke."""
+    from sensor_store import SensorStore
+    store = SensorStore(db_path)
+    try:
+        now = time.time()
+        res = store.query(COLUMNS, now - days * 86400, now, max_points=max_points)
+    finally:
+        store.close()
+    logger.info(f"Zeitreihen-Speicher: Stufe {res['tier']}, {len(res['ts'])} Punkte")
+    gap_s = max(GAP_S, 2 * (res["step"] or 0))
+    return store_columns(res, method), f"{db_path} ({res['tier']}, {days:g} Tage)", gap_s
+
+def render_html(payload):
+    """Eine Seite: plotly.js und die Daten je einmal eingebettet, Diagramme im Browser aufgebaut."""
+    data = json.dumps(payload, separators=(",", ":"), allow_nan=False).replace("</", "<\\/")
+    return HTML_TEMPLATE.format(source=html.escape(payload["source"]), plotlyjs=get_plotlyjs(),
+                                data=data, script=CHART_JS)
+
+HTML_TEMPLATE = """<!doctype html><html><head><meta charset="utf-8"><title>Sensor Charts</title>
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<style>
+body{{font-family:system-ui,Segoe UI,Roboto,Arial,sans-serif;margin:20px}}
+.chart{{margin-bottom:40px;height:450px}}
+</style>
+<script>{plotlyjs}</script>
+</head><body>
+<h1>VEML7700 & TCS34725 – Zeitreihen</h1>
+<p>Datenquelle: <code>{source}</code> <span id="info"></span></p>
+<div id="charts"></div>
+<script id="sensor-data" type="application/json">{data}</script>
+<script>{script}</script>
+</body></html>"""
+
+# Baut alle Diagramme aus dem gemeinsamen Payload. Von der Weboberfläche ausgeliefert, lädt
+# ein Zoom den sichtbaren Ausschnitt in voller Auflösung über /api/sensors nach.
+CHART_JS = """
+// Zeit in ms (UTC) → lokale Wandzeit, damit Plotly die Achse in Ortszeit beschriftet, und zurück
+const local = ms => ms === null ? null : ms - new Date(ms).getTimezoneOffset() * 60000;
+const unlocal = s => { const w = Date.parse(String(s).replace(" ", "T") + "Z"); return w + new Date(w).getTimezoneOffset() * 60000; };
+
+function setSeries(div, fig, payload, shown) {
+  const s = shown.filter(k => payload.series[k]);
+  if (!s.length) return;
+  Plotly.restyle(div, {x: s.map(k => payload.series[k].t.map(local)), y: s.map(k => payload.series[k].y)},
+                 s.map(k => shown.indexOf(k)));
+}
+
+function renderSensorCharts(payload, container) {
+  container.innerHTML = "";
+  const live = location.protocol.startsWith("http");
+  for (const fig of payload.figures) {
+    const shown = fig.series.filter(s => payload.series[s]);
+    const traces = shown.map(s => ({
+      type: "scattergl", mode: "lines", name: (fig.names || {})[s] || s,
+      x: payload.series[s].t.map(local), y: payload.series[s].y,
+    }));
+    if (!traces.length) continue;
+    const div = document.createElement("div");
+    div.className = "chart";
+    container.appendChild(div);
+    Plotly.newPlot(div, traces, {
+      title: fig.title, xaxis: {title: "Zeit", type: "date"}, yaxis: {title: fig.yaxis || ""},
+    }, {responsive: true});
+    if (!live) continue;
+    let seq = 0;
+    div.on("plotly_relayout", ev => {
+      if (ev["xaxis.autorange"]) { seq++; setSeries(div, fig, payload, shown); return; }
+      if (ev["xaxis.range[0]"] === undefined) return;
+      const from = unlocal(ev["xaxis.range[0]"]) / 1000, to = unlocal(ev["xaxis.range[1]"]) / 1000;
+      const mine = ++seq;
+      const q = new URLSearchParams({from, to, cols: shown.join(","), points: payload.max_points, method: payload.method});
+      fetch("/api/sensors?" + q).then(r => r.ok ? r.json() : null).then(p => {
+        if (p && mine === seq) setSeries(div, fig, p, shown);
+      }).catch(() => {});
+    });
+  }
+}
+const payload = JSON.parse(document.getElementById("sensor-data").textContent);
+document.getElementById("info").textContent =
+  `(${payload.rows} Messungen, je Linie ≤ ${payload.max_points} Punkte, ${payload.method})`;
+renderSensorCharts(payload, document.getElementById("charts"));
+"""
 
 def main():
     setup_logger()
-
+    ap = argparse.ArgumentParser(description="Sensor-Diagramme als HTML")
+    ap.add_argument("--csv", default=CSV_PATH)
+    ap.add_argument("--dir", default=None, help="Verzeichnis mit Tagesdateien statt einer CSV")
+    ap.add_argument("--store", action="store_true", help="aus dem Zeitreihen-Speicher statt der CSV lesen")
+    ap.add_argument("--db", default=None, help="Datenbank des Zeitreihen-Speichers")
+    ap.add_argument("--days", type=float, default=7.0, help="Zeitraum bei --store/--dir")
+    ap.add_argument("--max-points", type=int, default=DEFAULT_POINTS, help="Punkte je Linie (Pixelbudget)")
+    ap.add_argument("--method", choices=METHODS, default="lttb", help="Reduktion: LTTB oder Min/Max je Bucket")
+    ap.add_argument("--cache", default=str(CACHE_DIR), help="Spaltencache der geparsten CSVs")
+    ap.add_argument("--no-cache", action="store_true", help="CSV jedes Mal komplett lesen")
+    ap.add_argument("--out", default=OUT_HTML)
+    args = ap.parse_args()
+    source = args.csv
+    cache_dir = None if args.no_cache else Path(args.cache)
+
+    gap_s = GAP_S
+    t0 = time.monotonic()
     try:
-        logger.info(f"Lese Daten aus {CSV_PATH}")
-        df = pd.read_csv(CSV_PATH, parse_dates=["timestamp"])
-        df.sort_values("timestamp", inplace=True)
+        if args.store:
+            from sensor_store import DB_PATH
+            cols, source, gap_s = load_from_store(args.db or DB_PATH, args.days, args.max_points, args.method)
+        elif args.dir:
+            from sensor_partitions import partitions_for
+            t_from = time.time() - args.days * 86400
+            paths = partitions_for(args.dir, t_from)
+            if not paths:
+                raise FileNotFoundError(args.dir)
+            logger.info(f"Lese {len(paths)} Tagesdateien aus {args.dir}")
+            cols = add_derived(load_files(paths, t_from=t_from, cache_dir=cache_dir))
+            source = f"{args.dir} ({len(paths)} Tage)"
+        else:
+            logger.info(f"Lese Daten aus {args.csv}")
+            cols = add_derived(load_files([args.csv], cache_dir=cache_dir))
     except FileNotFoundError:
-        logger.error(f"Fehler: Die Datei '{CSV_PATH}' wurde nicht gefunden.")
+        logger.error(f"Fehler: Die Datei '{args.dir or args.csv}' wurde nicht gefunden.")
         sys.exit(1)
     except Exception as e:
         logger.exception(f"Fehler beim Lesen der CSV-Datei: {e}")
         sys.exit(1)
+    t_load = time.monotonic() - t0
 
     try:
-        # AWB-Gains aus TCS RGBC (G=1.0, R/B relativ zu G)
-        eps = 1e-9
-        df["awb_r"] = (df["tcs_g"] / (df["tcs_r"] + eps)).clip(0.2, 8.0)
-        df["awb_b"] = (df["tcs_g"] / (df["tcs_b"] + eps)).clip(0.2, 8.0)
-
-        # Optionale Robustheitsglättung
-        df["awb_r"] = df["awb_r"].rolling(5, min_periods=1).median()
-        df["awb_b"] = df["awb_b"].rolling(5, min_periods=1).median()
-        figs = []
-
-        # 1) VEML Lux
-        fig1 = go.Figure()
-        fig1.add_trace(mk_ts("veml_lux", df["timestamp"], df["veml_lux"]))
-        fig1.add_trace(mk_ts("veml_autolux", df["timestamp"], df["veml_autolux"]))
-        fig1.update_layout(title="VEML7700 – Lux (fix) vs. Autolux", xaxis_title="Zeit", yaxis_title="Lux")
-        figs.append(fig1)
-
-        # 2) VEML White & ALS (raw)
-        fig2 = go.Figure()
-        fig2.add_trace(mk_ts("veml_white", df["timestamp"], df["veml_white"]))
-        fig2.add_trace(mk_ts("veml_light (ALS)", df["timestamp"], df["veml_light"]))
-        fig2.update_layout(title="VEML7700 – White & ALS (raw)", xaxis_title="Zeit")
-        figs.append(fig2)
-
-        # 3) TCS Lux
-        fig3 = go.Figure()
-        fig3.add_trace(mk_ts("tcs_lux", df["timestamp"], df["tcs_lux"]))
-        fig3.update_layout(title="TCS34725 – Lux", xaxis_title="Zeit", yaxis_title="Lux")
-        figs.append(fig3)
-
-        # 4) TCS RGBC
-        fig4 = go.Figure()
-        for col in ["tcs_r", "tcs_g", "tcs_b", "tcs_clear"]:
-            fig4.add_trace(mk_ts(col, df["timestamp"], df[col]))
-        fig4.update_layout(title="TCS34725 – RGBC (raw 16-bit)", xaxis_title="Zeit")
-        figs.append(fig4)
-
-        # 5) TCS Farbtemperatur
-        fig5 = go.Figure()
-        fig5.add_trace(mk_ts("tcs_ctK", df["timestamp"], df["tcs_ctK"]))
-        fig5.update_layout(title="TCS34725 – Farbtemperatur (K)", xaxis_title="Zeit", yaxis_title="Kelvin")
-        figs.append(fig5)
-
-        # 6) AWB-Gains (r/b, G=1.0)
-        fig6 = go.Figure()
-        fig6.add_trace(mk_ts("awb_r", df["timestamp"], df["awb_r"]))
-        fig6.add_trace(mk_ts("awb_b", df["timestamp"], df["awb_b"]))
-        fig6.update_layout(title="AWB-Gains aus TCS34725 (G=1.0)", xaxis_title="Zeit", yaxis_title="Gain")
-        figs.append(fig6)
-
-        # 7) Optional: aktuelle Sensor-Einstellungen (als Linien)
-        fig7 = go.Figure()
-        fig7.add_trace(mk_ts("veml_gain", df["timestamp"], df["veml_gain"]))
-        fig7.add_trace(mk_ts("veml_integration_ms", df["timestamp"], df["veml_integration_ms"]))
-        fig7.add_trace(mk_ts("tcs_gain", df["timestamp"], df["tcs_gain"]))
-        fig7.add_trace(mk_ts("tcs_integration_ms", df["timestamp"], df["tcs_integration_ms"]))
-        fig7.update_layout(title="Sensor-Einstellungen über die Zeit", xaxis_title="Zeit")
-        figs.append(fig7)
-
-        # Alle Diagramme in eine HTML-Seite schreiben
-        html_parts = []
-        for i, fig in enumerate(figs, start=1):
-            html_parts.append(plot(fig, include_plotlyjs=(i==1), output_type="div"))
-        tpl = """<!doctype html><html><head><meta charset="utf-8"><title>Sensor Charts</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <style>
-        body{{font-family:system-ui,Segoe UI,Roboto,Arial,sans-serif;margin:20px}}
-        .chart{{margin-bottom:40px}}
-        </style>
-        </head><body>
-        <h1>VEML7700 & TCS34725 – Zeitreihen</h1>
-        <p>Datenquelle: <code>{csv}</code></p>
-        {divs}
-        </body></html>"""
-        html = tpl.format(csv=CSV_PATH, divs="\n".join(f'<div class="chart">{d}</div>' for d in html_parts))
-        Path(OUT_HTML).write_text(html, encoding="utf-8")
-        logger.info(f"Fertig: {OUT_HTML}")
+        payload = build_payload(cols, source, args.max_points, args.method, gap_s=gap_s)
+        page = render_html(payload)
+        Path(args.out).write_text(page, encoding="utf-8")
+        if cache_dir is not None:
+            prune_cache(cache_dir)
+        points = sum(len(s["t"]) for s in payload["series"].values())
+        logger.info(f"Fertig: {args.out} ({payload['rows']} Messungen → {points} Punkte in "
+                    f"{len(payload['series'])} Linien, {len(page) / 1e6:.1f} MB, Laden {t_load:.2f} s, "
+                    f"gesamt {time.monotonic() - t0:.2f} s)")
 
     except Exception as e:
         logger.exception(f"Fehler beim Erzeugen der Diagramme: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
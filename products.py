@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+products.py — Keogramm und Tages-Kontaktbogen, während der Aufnahme fortgeschrieben
+- Keogramm: pro Bild die mittlere Spalte (auf KEO_HEIGHT skaliert) wird an eine
+  Rohdatei angehängt → O(1) pro Bild, kein erneutes Lesen alter JPEGs
+- Kontaktbogen: ein Raster pro Tag (ein Feld je SHEET_SLOT_MIN Minuten) als
+  np.memmap; jedes neue Bild überschreibt nur sein eigenes Feld und hängt seine Feldnummer
+  an contact_<tag>.slots an (Stand für ETags – mtime einer memmap ist dafür unzuverlässig)
+- Eingabe: lores-Puffer der Kamera (main.py) oder per Draft-Modus verkleinertes JPEG (main2.py)
+- JPEG-Kodierung erst beim Abruf durch die Web-App
+- Nachträglich für vorhandene Sessions: python3 products.py rebuild <session>
+"""
+from __future__ import annotations
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from PIL import Image
+
+# --- Pfade & Defaults ---
+IMAGE_ROOT = "/mnt/hdd/timelapse/Bilder"
+PRODUCT_ROOT = "/mnt/hdd/timelapse/products"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "products.log"
+
+LORES_SIZE = (320, 180)   # lores-Stream der Kamera (main.py)
+KEO_HEIGHT = 360
+TILE_SIZE = (160, 90)
+SHEET_SLOT_MIN = 10       # 144 Felder pro Tag
+SHEET_COLS = 12
+JPEG_QUALITY = 85
+
+KEO_FILE = "keogram.rgb"
+KEO_TS_FILE = "keogram.ts"
+SHEET_SLOTS_SUFFIX = ".slots"
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def sheet_shape() -> Tuple[int, int, int]:
+    slots = 24 * 60 // SHEET_SLOT_MIN
+    rows = (slots + SHEET_COLS - 1) // SHEET_COLS
+    return rows * TILE_SIZE[1], SHEET_COLS * TILE_SIZE[0], 3
+
+
+def yuv420_to_rgb(yuv: np.ndarray) -> np.ndarray:
+    """lores-Puffer (YUV420, Form (h*3/2, w)) nach RGB, BT.601 – bei 320x180 vernachlässigbar."""
+    h = yuv.shape[0] * 2 // 3
+    w = yuv.shape[1]
+    y = yuv[:h].astype(np.float32)
+    u = yuv[h:h + h // 4].reshape(h // 2, w // 2).astype(np.float32) - 128.0
+    v = yuv[h + h // 4:h + h // 2].reshape(h // 2, w // 2).astype(np.float32) - 128.0
+    u = u.repeat(2, axis=0).repeat(2, axis=1)
+    v = v.repeat(2, axis=0).repeat(2, axis=1)
+    rgb = np.stack([y + 1.402 * v, y - 0.344136 * u - 0.714136 * v, y + 1.772 * u], axis=-1)
+    return np.clip(rgb, 0, 255).astype(np.uint8)
+
+
+def load_small_rgb(path: str, size: Tuple[int, int] = LORES_SIZE) -> np.ndarray:
+    """JPEG im Draft-Modus (DCT-Skalierung) auf ungefähr size dekodieren."""
+    with Image.open(path) as img:
+        img.draft("RGB", size)
+        return np.asarray(img.convert("RGB"))
+
+
+class SessionProducts:
+    """Fortschreibung von Keogramm und Kontaktbögen einer Session (ein Schreiber: der Aufnahmeprozess)."""
+
+    def __init__(self, session: str, root: str = PRODUCT_ROOT):
+        self.session = session
+        self.dir = os.path.join(root, session)
+        os.makedirs(self.dir, exist_ok=True)
+        self._sheet_day: Optional[str] = None
+        self._sheet: Optional[np.memmap] = None
+
+    def add_frame(self, rgb: np.ndarray, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        self._append_keogram(rgb, ts)
+        self._put_tile(rgb, ts)
+
+    def add_yuv420(self, yuv: np.ndarray, ts: Optional[float] = None):
+        self.add_frame(yuv420_to_rgb(yuv), ts)
+
+    def add_jpeg(self, path: str, ts: Optional[float] = None):
+        self.add_frame(load_small_rgb(path), ts)
+
+    def _append_keogram(self, rgb: np.ndarray, ts: float):
+        col = rgb[:, rgb.shape[1] // 2]
+        col = col[np.linspace(0, col.shape[0] - 1, KEO_HEIGHT).astype(np.intp)]
+        # Reihenfolge: erst Zeitstempel, dann Spalte – Leser zählen nur vollständige Spalten
+        with open(os.path.join(self.dir, KEO_TS_FILE), "ab") as f:
+            f.write(np.float64(ts).tobytes())
+        with open(os.path.join(self.dir, KEO_FILE), "ab") as f:
+            f.write(np.ascontiguousarray(col, dtype=np.uint8).tobytes())
+
+    def _put_tile(self, rgb: np.ndarray, ts: float):
+        dt = datetime.fromtimestamp(ts)
+        day = dt.strftime("%Y-%m-%d")
+        if day != self._sheet_day:
+            if self._sheet is not None:
+                self._sheet.flush()
+            self._sheet = open_sheet(self.dir, day, create=True)
+            self._sheet_day = day
+        slot = (dt.hour * 60 + dt.minute) // SHEET_SLOT_MIN
+        r, c = divmod(slot, SHEET_COLS)
+        tw, th = TILE_SIZE
+        tile = np.asarray(Image.fromarray(rgb).resize(TILE_SIZE, Image.Resampling.BILINEAR))
+        self._sheet[r * th:(r + 1) * th, c * tw:(c + 1) * tw] = tile
+        # erst das Feld, dann der Zähler – wer den neuen Stand sieht, sieht auch das Feld
+        with open(sheet_path(self.dir, day) + SHEET_SLOTS_SUFFIX, "ab") as f:
+            f.write(np.uint16(slot).tobytes())
+
+    def close(self):
+        if self._sheet is not None:
+            self._sheet.flush()
+            self._sheet = None
+
+
+def sheet_path(product_dir: str, day: str) -> str:
+    return os.path.join(product_dir, f"contact_{day}.rgb")
+
+
+def open_sheet(product_dir: str, day: str, create: bool = False) -> Optional[np.memmap]:
+    path = sheet_path(product_dir, day)
+    if not os.path.exists(path):
+        if not create:
+            return None
+        return np.memmap(path, dtype=np.uint8, mode="w+", shape=sheet_shape())
+    return np.memmap(path, dtype=np.uint8, mode="r+" if create else "r", shape=sheet_shape())
+
+
+# ------------------------------ Lesen (Web-App) ------------------------------
+
+def product_dir(session: str, root: str = PRODUCT_ROOT) -> str:
+    return os.path.join(root, session)
+
+
+def keogram_info(session: str, root: str = PRODUCT_ROOT) -> dict:
+    d = product_dir(session, root)
+    try:
+        n_cols = os.path.getsize(os.path.join(d, KEO_FILE)) // (KEO_HEIGHT * 3)
+        n_ts = os.path.getsize(os.path.join(d, KEO_TS_FILE)) // 8
+    except OSError:
+        return {"frames": 0, "first_ts": None, "last_ts": None}
+    n = min(n_cols, n_ts)
+    if not n:
+        return {"frames": 0, "first_ts": None, "last_ts": None}
+    ts = np.memmap(os.path.join(d, KEO_TS_FILE), dtype=np.float64, mode="r", shape=(n_ts,))
+    return {"frames": n, "first_ts": float(ts[0]), "last_ts": float(ts[n - 1])}
+
+
+def sheet_version(session: str, day: str, root: str = PRODUCT_ROOT) -> Optional[str]:
+    """Stand eines Kontaktbogens (None = fehlt): die Zahl geschriebener Felder ändert sich mit
+    jedem Bild; die mtime unterscheidet nur neu angelegte Bögen (rebuild)."""
+    path = sheet_path(product_dir(session, root), day)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    try:
+        tiles = os.path.getsize(path + SHEET_SLOTS_SUFFIX) // 2
+    except OSError:
+        tiles = 0
+    return f"{mtime}-{tiles}"
+
+
+def list_days(session: str, root: str = PRODUCT_ROOT) -> List[str]:
+    try:
+        names = os.listdir(product_dir(session, root))
+    except OSError:
+        return []
+    return sorted(n[len("contact_"):-len(".rgb")] for n in names if n.startswith("contact_") and n.endswith(".rgb"))
+
+
+def _encode(arr: np.ndarray, quality: int = JPEG_QUALITY) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def keogram_jpeg(session: str, root: str = PRODUCT_ROOT, max_width: Optional[int] = None) -> Optional[bytes]:
+    """Keogramm als JPEG (Zeit von links nach rechts); optional auf max_width Spalten ausgedünnt."""
+    n = keogram_info(session, root)["frames"]
+    if not n:
+        return None
+    cols = np.memmap(os.path.join(product_dir(session, root), KEO_FILE), dtype=np.uint8, mode="r",
+                     shape=(n, KEO_HEIGHT, 3))
+    if max_width and n > max_width:
+        cols = cols[np.linspace(0, n - 1, max_width).astype(np.intp)]
+    return _encode(np.ascontiguousarray(np.swapaxes(cols, 0, 1)))
+
+
+def contact_sheet_jpeg(session: str, day: str, root: str = PRODUCT_ROOT) -> Optional[bytes]:
+    sheet = open_sheet(product_dir(session, root), day)
+    if sheet is None:
+        return None
+    return _encode(np.asarray(sheet))
+
+
+# ------------------------------ CLI ------------------------------
+
+def rebuild(session: str, image_root: str = IMAGE_ROOT, root: str = PRODUCT_ROOT) -> int:
+    """Produkte einer vorhandenen Session aus den JPEGs neu aufbauen (Draft-Dekodierung)."""
+    from frame_index import frame_time
+    src = os.path.join(image_root, session)
+    names = sorted(n for n in os.listdir(src) if n.lower().endswith(".jpg"))
+    d = product_dir(session, root)
+    sheets = [os.path.basename(sheet_path(d, day)) for day in list_days(session, root)]
+    for name in [KEO_FILE, KEO_TS_FILE] + sheets + [n + SHEET_SLOTS_SUFFIX for n in sheets]:
+        try:
+            os.remove(os.path.join(d, name))
+        except FileNotFoundError:
+            pass
+    prod = SessionProducts(session, root)
+    frames = [(frame_time(n, os.path.getmtime(os.path.join(src, n))), n) for n in names]
+    for ts, name in sorted(frames):
+        try:
+            prod.add_jpeg(os.path.join(src, name), ts)
+        except Exception as e:
+            logger.warning(f"{name} übersprungen: {e}")
+    prod.close()
+    return len(frames)
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Keogramm/Kontaktbogen einer Session")
+    ap.add_argument("command", choices=["rebuild"])
+    ap.add_argument("session", help="Session-Ordner relativ zum Bilder-Ordner, z. B. lux/2025-08-17")
+    ap.add_argument("--images", default=IMAGE_ROOT)
+    ap.add_argument("--root", default=PRODUCT_ROOT)
+    args = ap.parse_args()
+    t0 = time.monotonic()
+    n = rebuild(args.session, args.images, args.root)
+    logger.info(f"{n} Bilder in {time.monotonic() - t0:.1f}s verarbeitet → {product_dir(args.session, args.root)}")
+
+
+if __name__ == "__main__":
+    main()
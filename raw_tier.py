@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+raw_tier.py — Hintergrund-Komprimierung gealterter RAW-Dateien
+- 10-Bit-Bayer-Daten in 16-Bit-Containern (.raw/.npy aus main.py) werden
+  verlustfrei auf 10 Bit gepackt (4 Werte → 5 Bytes), DNGs nur komprimiert
+- Schnelle verlustfreie Kompression: zstd, sonst lz4, sonst zlib (Standardbibliothek)
+- Container <datei>.rawz mit Originalgröße und SHA-256; vor dem Löschen des
+  Originals wird die Rekonstruktion Byte für Byte geprüft
+- Transparenter Leser (read_raw_bytes / load_raw_array) für Web-Download und Analyse
+- Parallel über einen Prozess-Pool, mit Bericht über den frei gewordenen Platz
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import io
+import os
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+from loguru import logger
+
+if TYPE_CHECKING:
+    import numpy as np   # sonst erst bei Bedarf: die Web-App braucht nur resolve()/read_raw_bytes()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+# --- Pfade & Defaults ---
+RAW_ROOT = "/mnt/hdd/timelapse/raw"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "raw_tier.log"
+
+RAW_EXTS = (".raw", ".npy", ".dng")
+SUFFIX = ".rawz"
+MIN_AGE_DAYS = 7
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+MAGIC = b"RAWZ"
+VERSION = 1
+CODEC_ZLIB, CODEC_ZSTD, CODEC_LZ4 = 0, 1, 2
+CODEC_NAMES = {CODEC_ZLIB: "zlib", CODEC_ZSTD: "zstd", CODEC_LZ4: "lz4"}
+PACK_NONE, PACK_10BIT = 0, 1
+# magic, version, codec, packing, reserved, orig_size, prefix_len, n_values, sha256
+_HEADER = struct.Struct("<4sBBBBQIQ32s")
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def best_codec() -> int:
+    if zstandard is not None:
+        return CODEC_ZSTD
+    if lz4frame is not None:
+        return CODEC_LZ4
+    return CODEC_ZLIB
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == CODEC_LZ4:
+        return lz4frame.compress(data)
+    return zlib.compress(data, 1)
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard fehlt – pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODEC_LZ4:
+        if lz4frame is None:
+            raise RuntimeError("lz4 fehlt – pip install lz4")
+        return lz4frame.decompress(data)
+    return zlib.decompress(data)
+
+
+# ------------------------------ 10-Bit-Packing ------------------------------
+
+def pack10(values: np.ndarray) -> bytes:
+    """uint16-Werte < 1024 → je 4 Werte in 5 Bytes (4 × Low-Byte + 1 Byte mit den oberen 2 Bits)."""
+    import numpy as np
+    v = values.astype(np.uint16, copy=False).ravel()
+    pad = -v.size % 4
+    if pad:
+        v = np.concatenate([v, np.zeros(pad, np.uint16)])
+    v = v.reshape(-1, 4)
+    out = np.empty((v.shape[0], 5), np.uint8)
+    out[:, :4] = v & 0xFF
+    hi = (v >> 8).astype(np.uint8)
+    out[:, 4] = hi[:, 0] | (hi[:, 1] << 2) | (hi[:, 2] << 4) | (hi[:, 3] << 6)
+    return out.tobytes()
+
+
+def unpack10(data: bytes, n_values: int) -> np.ndarray:
+    import numpy as np
+    p = np.frombuffer(data, np.uint8).reshape(-1, 5)
+    v = p[:, :4].astype(np.uint16)
+    hi = p[:, 4:5].astype(np.uint16)
+    v |= ((hi >> np.array([0, 2, 4, 6], np.uint16)) & 0x3) << 8
+    return v.ravel()[:n_values]
+
+
+def _split_payload(path: str, data: bytes) -> Tuple[int, Optional[np.ndarray]]:
+    """(Länge des unverändert übernommenen Präfixes, 16-Bit-Werte zum Packen oder None)."""
+    import numpy as np
+    ext = os.path.splitext(path)[1].lower()
+    offset = 0
+    if ext == ".npy":
+        f = io.BytesIO(data)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        elif version == (2, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        else:
+            return 0, None
+        offset = f.tell()
+        # picamera2 liefert den Raw-Puffer als uint8 (2 Bytes pro Pixel) oder uint16
+        if dtype not in (np.dtype("<u2"), np.dtype("u1")):
+            return offset, None
+    elif ext != ".raw":
+        return 0, None  # DNG u. a.: nur komprimieren
+    body = data[offset:]
+    if len(body) % 2:
+        return offset, None
+    values = np.frombuffer(body, "<u2")
+    if values.size == 0 or values.max() >= 1024:
+        return offset, None
+    return offset, values
+
+
+# ------------------------------ Container ------------------------------
+
+def encode(path: str, data: bytes, codec: Optional[int] = None) -> bytes:
+    codec = best_codec() if codec is None else codec
+    prefix_len, values = _split_payload(path, data)
+    if values is not None:
+        payload = data[:prefix_len] + pack10(values)
+        packing, n_values = PACK_10BIT, values.size
+    else:
+        payload, packing, n_values, prefix_len = data, PACK_NONE, 0, 0
+    header = _HEADER.pack(MAGIC, VERSION, codec, packing, 0, len(data), prefix_len, n_values,
+                          hashlib.sha256(data).digest())
+    return header + _compress(payload, codec)
+
+
+def decode(blob: bytes, verify: bool = True) -> bytes:
+    magic, version, codec, packing, _r, size, prefix_len, n_values, digest = _HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Kein RAWZ-Container")
+    payload = _decompress(blob[_HEADER.size:], codec)
+    if packing == PACK_10BIT:
+        data = payload[:prefix_len] + unpack10(payload[prefix_len:], n_values).astype("<u2").tobytes()
+    else:
+        data = payload
+    if len(data) != size or (verify and hashlib.sha256(data).digest() != digest):
+        raise ValueError("RAWZ-Prüfsumme stimmt nicht")
+    return data
+
+
+# ------------------------------ Transparenter Leser ------------------------------
+
+def resolve(path: str) -> Optional[str]:
+    """Vorhandene Datei zu einem Original-Pfad: das Original selbst oder <pfad>.rawz."""
+    if os.path.exists(path):
+        return path
+    if os.path.exists(path + SUFFIX):
+        return path + SUFFIX
+    return None
+
+
+def read_raw_bytes(path: str) -> bytes:
+    """Originalbytes einer RAW-Datei, egal ob (noch) unkomprimiert oder schon im .rawz-Container."""
+    real = resolve(path[:-len(SUFFIX)] if path.endswith(SUFFIX) else path)
+    if real is None:
+        raise FileNotFoundError(path)
+    with open(real, "rb") as f:
+        blob = f.read()
+    return decode(blob) if real.endswith(SUFFIX) else blob
+
+
+def load_raw_array(path: str, shape: Optional[Tuple[int, ...]] = None, dtype="u1") -> np.ndarray:
+    """.npy → gespeichertes Array; .raw → flaches Array (mit shape/dtype wie beim tofile())."""
+    import numpy as np
+    data = read_raw_bytes(path)
+    if path.replace(SUFFIX, "").lower().endswith(".npy"):
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    arr = np.frombuffer(data, dtype)
+    return arr.reshape(shape) if shape else arr
+
+
+# ------------------------------ Tiering-Job ------------------------------
+
+def compress_file(path: str, codec: Optional[int] = None) -> Tuple[str, int, int, Optional[str]]:
+    """Komprimiert, prüft und ersetzt eine Datei: (Pfad, Bytes vorher, Bytes nachher, Fehler)."""
+    dst = path + SUFFIX
+    tmp = dst + ".tmp"
+    try:
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        blob = encode(path, data, codec)
+        if decode(blob) != data:
+            raise ValueError("Verifikation fehlgeschlagen")
+        if len(blob) >= len(data):
+            return path, len(data), len(data), None  # lohnt nicht – Original bleibt
+        with open(tmp, "wb") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        # Vom Datenträger zurücklesen und erneut prüfen, erst dann das Original entfernen
+        with open(tmp, "rb") as f:
+            if decode(f.read()) != data:
+                raise ValueError("Verifikation nach dem Schreiben fehlgeschlagen")
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dst)
+        os.remove(path)
+        return path, len(data), len(blob), None
+    except Exception as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return path, 0, 0, str(e)
+
+
+def iter_candidates(root: str, min_age_s: float) -> Iterator[str]:
+    cutoff = time.time() - min_age_s
+    for dirpath, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in RAW_EXTS:
+                full = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(full) < cutoff:
+                        yield full
+                except OSError:
+                    continue
+
+
+def tier(root: str = RAW_ROOT, min_age_days: float = MIN_AGE_DAYS, workers: int = DEFAULT_WORKERS,
+         codec: Optional[int] = None, limit: Optional[int] = None) -> dict:
+    t0 = time.monotonic()
+    codec = best_codec() if codec is None else codec
+    files = list(iter_candidates(root, min_age_days * 86400))
+    if limit:
+        files = files[:limit]
+    stats = {"files": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0, "codec": CODEC_NAMES[codec]}
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for path, before, after, err in pool.map(compress_file, files, [codec] * len(files), chunksize=4):
+            if err:
+                stats["failed"] += 1
+                logger.warning(f"{path}: {err}")
+                continue
+            stats["files"] += 1
+            stats["bytes_before"] += before
+            stats["bytes_after"] += after
+    secs = time.monotonic() - t0
+    stats["reclaimed_mb"] = round((stats["bytes_before"] - stats["bytes_after"]) / 1024 ** 2, 1)
+    stats["ratio"] = round(stats["bytes_before"] / stats["bytes_after"], 2) if stats["bytes_after"] else None
+    stats["seconds"] = round(secs, 1)
+    stats["mb_per_s"] = round(stats["bytes_before"] / 1024 ** 2 / secs, 1) if secs > 0 else None
+    return stats
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="RAW-Dateien altern lassen: packen, komprimieren, prüfen")
+    sub = ap.add_subparsers(dest="command", required=True)
+    t = sub.add_parser("tier", help="alte RAWs komprimieren")
+    t.add_argument("--root", default=RAW_ROOT)
+    t.add_argument("--days", type=float, default=MIN_AGE_DAYS, help="Mindestalter in Tagen")
+    t.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    t.add_argument("--codec", choices=["zstd", "lz4", "zlib"], default=None)
+    t.add_argument("--limit", type=int, default=None, help="höchstens so viele Dateien pro Lauf")
+    x = sub.add_parser("extract", help="Original aus .rawz wiederherstellen")
+    x.add_argument("files", nargs="+")
+    args = ap.parse_args()
+
+    if args.command == "tier":
+        codec = {v: k for k, v in CODEC_NAMES.items()}.get(args.codec) if args.codec else None
+        s = tier(args.root, args.days, args.workers, codec, args.limit)
+        logger.info(f"{s['files']} Dateien komprimiert ({s['codec']}, Faktor {s['ratio']}), "
+                    f"{s['reclaimed_mb']} MB frei geworden, {s['failed']} Fehler, {s['mb_per_s']} MB/s")
+    else:
+        for p in args.files:
+            out = p[:-len(SUFFIX)] if p.endswith(SUFFIX) else p
+            data = read_raw_bytes(p)
+            with open(out, "wb") as f:
+                f.write(data)
+            logger.info(f"{out} wiederhergestellt ({len(data)} Bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+render_jobs.py — Persistente Warteschlange für Video-Renderjobs
+- Jobs liegen in SQLite und überleben Neustarts (laufende Jobs werden neu eingereiht)
+- Worker-Pool mit globaler Maximalzahl gleichzeitiger Renderings (auch über mehrere Prozesse)
+- ffmpeg läuft mit nice/ionice, damit die Aufnahme immer Vorrang hat
+- Fortschritt (Frames) wird laufend in die Datenbank geschrieben, Abbruch jederzeit möglich
+- Videos werden standardmäßig inkrementell aus gecachten Segmenten zusammengesetzt
+- Als Bibliothek (Web-App) oder eigenständig nutzbar: python3 render_jobs.py worker
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+from loguru import logger
+
+from video_render import (DEFAULT_WORKERS, RenderCancelled, SEGMENT_FRAMES, list_frames, render_video,
+                          render_video_incremental)
+
+# --- Pfade & Defaults ---
+IMAGE_ROOT = "/mnt/hdd/timelapse/Bilder"
+VIDEO_ROOT = "/mnt/hdd/timelapse/videos"
+SEGMENT_ROOT = os.path.join(VIDEO_ROOT, ".segments")
+DB_PATH = "/mnt/hdd/timelapse/render_jobs.sqlite"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "render_jobs.log"
+
+MAX_CONCURRENCY = 1
+NICE = 19
+IONICE_CLASS = 3
+PROGRESS_WRITE_INTERVAL_S = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    params       TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    frames_done  INTEGER NOT NULL DEFAULT 0,
+    frames_total INTEGER NOT NULL DEFAULT 0,
+    created      REAL NOT NULL,
+    started      REAL,
+    finished     REAL,
+    result       TEXT,
+    error        TEXT,
+    cancel       INTEGER NOT NULL DEFAULT 0,
+    owner        INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created);
+"""
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def video_output_path(params: dict) -> str:
+    folder = params["folder"]
+    return os.path.join(VIDEO_ROOT, f"{folder.replace('/', '_')}_{int(params.get('fps', 24))}fps.mp4")
+
+
+class JobQueue:
+    def __init__(self, db_path: str = DB_PATH, max_concurrency: int = MAX_CONCURRENCY,
+                 nice: int = NICE, ionice_class: int = IONICE_CLASS):
+        self.db_path = db_path
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self._wakeup = threading.Condition()
+        self._cancel: Dict[str, threading.Event] = {}
+        self._threads: List[threading.Thread] = []
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.connect() as con:
+            con.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    # ------------------------------ API ------------------------------
+
+    def submit(self, kind: str, params: dict) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        con = self.connect()
+        try:
+            con.execute("INSERT INTO jobs(id, kind, params, status, created) VALUES (?,?,?,?,?)",
+                        (job_id, kind, json.dumps(params), "queued", time.time()))
+        finally:
+            con.close()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        logger.info(f"Job {job_id} eingereiht ({kind}: {params})")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        con = self.connect()
+        try:
+            row = con.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        finally:
+            con.close()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50, status: Optional[str] = None) -> List[dict]:
+        sql, args = "SELECT * FROM jobs", []
+        if status:
+            sql += " WHERE status=?"
+            args.append(status)
+        sql += " ORDER BY created DESC LIMIT ?"
+        args.append(int(limit))
+        con = self.connect()
+        try:
+            return [self._to_dict(r) for r in con.execute(sql, args)]
+        finally:
+            con.close()
+
+    def cancel(self, job_id: str) -> bool:
+        con = self.connect()
+        try:
+            cur = con.execute(
+                "UPDATE jobs SET status='cancelled', finished=? WHERE id=? AND status='queued'",
+                (time.time(), job_id))
+            if cur.rowcount:
+                return True
+            cur = con.execute("UPDATE jobs SET cancel=1 WHERE id=? AND status='running'", (job_id,))
+            found = bool(cur.rowcount)
+        finally:
+            con.close()
+        ev = self._cancel.get(job_id)
+        if ev:
+            ev.set()
+        return found
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        d = dict(row)
+        d["params"] = json.loads(d["params"])
+        d["result"] = json.loads(d["result"]) if d["result"] else None
+        d["progress"] = round(d["frames_done"] / d["frames_total"], 4) if d["frames_total"] else 0.0
+        d.pop("cancel", None)
+        d.pop("owner", None)
+        return d
+
+    # ---------------------------- Worker -----------------------------
+
+    def start_workers(self, n: Optional[int] = None):
+        """Worker-Threads starten; laufende Jobs eines abgestürzten Prozesses neu einreihen."""
+        if self._threads:
+            return
+        con = self.connect()
+        try:
+            for r in con.execute("SELECT id, owner FROM jobs WHERE status='running'").fetchall():
+                if not _pid_alive(r["owner"]):
+                    logger.warning(f"Job {r['id']} war verwaist – wird neu eingereiht.")
+                    con.execute("UPDATE jobs SET status='queued', frames_done=0 WHERE id=?", (r["id"],))
+        finally:
+            con.close()
+        for i in range(n or self.max_concurrency):
+            t = threading.Thread(target=self._worker, name=f"render-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Nächsten Job atomar übernehmen, sofern das globale Limit noch frei ist."""
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            running = con.execute("SELECT COUNT(*) FROM jobs WHERE status='running'").fetchone()[0]
+            row = None
+            if running < self.max_concurrency:
+                row = con.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY created LIMIT 1").fetchone()
+                if row:
+                    con.execute("UPDATE jobs SET status='running', started=?, cancel=0, owner=? WHERE id=?",
+                                (time.time(), os.getpid(), row["id"]))
+            con.execute("COMMIT")
+            return row
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+
+    def _worker(self):
+        while True:
+            try:
+                row = self._claim()
+            except Exception as e:
+                logger.error(f"Job-Übernahme fehlgeschlagen: {e}")
+                row = None
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=10)
+                continue
+            self._run(row)
+
+    def _finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        con = self.connect()
+        try:
+            con.execute("UPDATE jobs SET status=?, finished=?, result=?, error=? WHERE id=?",
+                        (status, time.time(), json.dumps(result) if result else None, error, job_id))
+        finally:
+            con.close()
+
+    def _run(self, row: sqlite3.Row):
+        job_id = row["id"]
+        params = json.loads(row["params"])
+        cancel = self._cancel.setdefault(job_id, threading.Event())
+        last_write = [0.0]
+
+        def progress(done: int, total: int):
+            now = time.monotonic()
+            if now - last_write[0] < PROGRESS_WRITE_INTERVAL_S and done < total:
+                return
+            last_write[0] = now
+            con = self.connect()
+            try:
+                con.execute("UPDATE jobs SET frames_done=?, frames_total=? WHERE id=?", (done, total, job_id))
+                # Abbruch aus einem anderen Prozess (z. B. zweite Web-App-Instanz)
+                if con.execute("SELECT cancel FROM jobs WHERE id=?", (job_id,)).fetchone()[0]:
+                    cancel.set()
+            finally:
+                con.close()
+
+        logger.info(f"Job {job_id} startet ({row['kind']})")
+        t0 = time.monotonic()
+        try:
+            if row["kind"] != "video":
+                raise ValueError(f"Unbekannter Job-Typ: {row['kind']}")
+            result = self._run_video(params, progress, cancel)
+            result["seconds"] = round(time.monotonic() - t0, 1)
+            self._finish(job_id, "done", result=result)
+            logger.info(f"Job {job_id} fertig: {result}")
+        except RenderCancelled:
+            self._finish(job_id, "cancelled")
+            logger.info(f"Job {job_id} abgebrochen.")
+        except Exception as e:
+            self._finish(job_id, "failed", error=str(e))
+            logger.error(f"Job {job_id} fehlgeschlagen: {e}")
+        finally:
+            self._cancel.pop(job_id, None)
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _run_video(self, params: dict, progress, cancel: threading.Event) -> dict:
+        src_folder = os.path.join(IMAGE_ROOT, params["folder"])
+        frames = list_frames(src_folder)
+        progress(0, len(frames))
+        output = video_output_path(params)
+        opts = dict(
+            fps=int(params.get("fps", 24)),
+            resolution=params.get("resolution"),
+            codec=params.get("codec", "libx264"),
+            quality=int(params.get("quality", 18)),
+            progress=progress, cancel=cancel,
+            nice=self.nice, ionice_class=self.ionice_class,
+        )
+        result = {"video": os.path.basename(output), "frames": len(frames)}
+        if params.get("incremental", True):
+            segment_dir = os.path.join(SEGMENT_ROOT, os.path.splitext(os.path.basename(output))[0])
+            result.update(render_video_incremental(
+                frames, output, segment_dir,
+                segment_frames=int(params.get("segment_frames", SEGMENT_FRAMES)),
+                workers=int(params.get("workers", DEFAULT_WORKERS)), **opts))
+        else:
+            render_video(frames, output, **opts)
+        return result
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Render-Warteschlange für Timelapse-Videos")
+    ap.add_argument("command", choices=["worker", "list", "cancel"])
+    ap.add_argument("job_id", nargs="?")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    args = ap.parse_args()
+    q = JobQueue(args.db, args.max_concurrency)
+    if args.command == "worker":
+        logger.info(f"Render-Worker gestartet (max. {q.max_concurrency} gleichzeitig).")
+        q.start_workers()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "list":
+        for j in q.list():
+            print(f"{j['id']}\t{j['status']}\t{j['progress']:.0%}\t{j['params']}")
+    elif args.command == "cancel":
+        if not args.job_id:
+            ap.error("cancel braucht eine Job-ID")
+        sys.exit(0 if q.cancel(args.job_id) else 1)
+
+
+if __name__ == "__main__":
+    main()
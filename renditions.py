@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+renditions.py — Schnelle Thumbnail-/Vorschau-Erzeugung für Timelapse-Bilder
+- Dekodiert JPEGs per PIL-Draft-Modus direkt in reduzierter Auflösung
+  (DCT-Skalierung 1/2, 1/4 oder 1/8 statt volle 12–20 MP)
+- Einzelbild-API für die Web-App (make_rendition)
+- Batch-Verarbeitung über einen Prozess-Pool mit Durchsatz-Angabe (Bilder/s)
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from loguru import logger
+from PIL import Image
+
+# --- Pfade & Defaults ---
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "renditions.log"
+
+THUMB_SIZE = (160, 90)
+PREVIEW_SIZE = (1280, 720)
+THUMB_SUFFIX = ".thumb.jpg"
+JPEG_QUALITY = 85
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    w, h = value.lower().split("x")
+    return int(w), int(h)
+
+
+def make_rendition(src: str, dst: str, size: Tuple[int, int] = THUMB_SIZE, quality: int = JPEG_QUALITY) -> bool:
+    """Erzeugt eine verkleinerte Kopie von src unter dst.
+
+    draft() lässt libjpeg die DCT-Koeffizienten bereits beim Dekodieren
+    herunterskalieren – es wird nie das volle Bild im Speicher aufgebaut.
+    """
+    try:
+        with Image.open(src) as img:
+            img.draft("RGB", size)
+            img = img.convert("RGB")
+            img.thumbnail(size, Image.Resampling.BILINEAR)
+            tmp = dst + ".tmp"
+            img.save(tmp, "JPEG", quality=quality)
+        os.replace(tmp, dst)
+        return True
+    except Exception:
+        return False
+
+
+def rendition_path(src: str, out_dir: str, suffix: str = THUMB_SUFFIX) -> str:
+    return os.path.join(out_dir, os.path.basename(src) + suffix)
+
+
+def _render_one(job: Tuple[str, str, Tuple[int, int], int]) -> Tuple[str, bool]:
+    src, dst, size, quality = job
+    return src, make_rendition(src, dst, size, quality)
+
+
+def iter_jpegs(paths: Iterable[str]) -> Iterable[str]:
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, dirs, files in os.walk(p):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(".jpg"):
+                        yield os.path.join(dirpath, name)
+        elif p.lower().endswith(".jpg"):
+            yield p
+
+
+def generate_batch(sources: Iterable[str], out_dir: str, size: Tuple[int, int] = THUMB_SIZE,
+                   suffix: str = THUMB_SUFFIX, workers: Optional[int] = None,
+                   quality: int = JPEG_QUALITY, force: bool = False) -> dict:
+    """Erzeugt Renditions für viele Bilder parallel und liefert eine Statistik."""
+    os.makedirs(out_dir, exist_ok=True)
+    jobs: List[Tuple[str, str, Tuple[int, int], int]] = []
+    skipped = 0
+    for src in sources:
+        dst = rendition_path(src, out_dir, suffix)
+        if not force and os.path.exists(dst):
+            skipped += 1
+            continue
+        jobs.append((src, dst, size, quality))
+
+    workers = workers or os.cpu_count() or 1
+    done = failed = 0
+    t0 = time.monotonic()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for src, ok in pool.map(_render_one, jobs, chunksize=16):
+                if ok:
+                    done += 1
+                else:
+                    failed += 1
+                    logger.warning(f"Rendition fehlgeschlagen: {src}")
+    seconds = time.monotonic() - t0
+    return {
+        "total": len(jobs) + skipped,
+        "done": done,
+        "skipped": skipped,
+        "failed": failed,
+        "workers": workers,
+        "seconds": round(seconds, 3),
+        "images_per_s": round(done / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Thumbnails/Vorschauen per Draft-Dekodierung erzeugen")
+    ap.add_argument("paths", nargs="+", help="JPEG-Dateien oder Ordner (rekursiv)")
+    ap.add_argument("--out", required=True, help="Zielordner der Renditions")
+    ap.add_argument("--size", default="x".join(map(str, THUMB_SIZE)), help="Zielgröße BxH (z. B. 160x90)")
+    ap.add_argument("--preview", action="store_true", help=f"Vorschau statt Thumbnail ({PREVIEW_SIZE[0]}x{PREVIEW_SIZE[1]})")
+    ap.add_argument("--suffix", default=None, help=f"Dateiendung der Renditions (Standard: {THUMB_SUFFIX})")
+    ap.add_argument("--workers", type=int, default=None, help="Anzahl Prozesse (Standard: alle Kerne)")
+    ap.add_argument("--quality", type=int, default=JPEG_QUALITY)
+    ap.add_argument("--force", action="store_true", help="Vorhandene Renditions überschreiben")
+    args = ap.parse_args()
+
+    size = PREVIEW_SIZE if args.preview else parse_size(args.size)
+    suffix = args.suffix or (".preview.jpg" if args.preview else THUMB_SUFFIX)
+    logger.info(f"Erzeuge Renditions {size[0]}x{size[1]} nach {args.out}")
+    stats = generate_batch(iter_jpegs(args.paths), args.out, size=size, suffix=suffix,
+                           workers=args.workers, quality=args.quality, force=args.force)
+    logger.info(
+        f"Fertig: {stats['done']} erzeugt, {stats['skipped']} übersprungen, {stats['failed']} Fehler "
+        f"in {stats['seconds']:.1f}s mit {stats['workers']} Prozessen → {stats['images_per_s']} Bilder/s"
+    )
+    sys.exit(1 if stats["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+retention.py — Speicherplatz-Verwaltung für Bilder, RAWs und Videos
+- Richtlinien aus retention.json (Vorlage: retention.json.example)
+- Reihenfolge: Renditions/Caches → alte RAWs → alte Bilder → alte Videos;
+  unter der Mindest-Freigrenze zusätzlich die ältesten RAWs, dann Bilder
+- Kandidaten kommen aus dem Bild-Index (frame_index.py) statt aus Verzeichnis-Scans
+- Geschützt: die letzten min_age_hours, Sessions mit .keep (alles) bzw. .keep_raw (RAWs)
+- Löschen in kleinen Schüben mit Ratenbegrenzung, niedriger CPU-/IO-Priorität
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from loguru import logger
+from frame_index import FrameIndex, DB_PATH as FRAME_INDEX_DB, IMAGE_ROOT, encode_cursor
+
+# --- Pfade & Defaults ---
+RAW_ROOT = "/mnt/hdd/timelapse/raw"
+VIDEO_ROOT = "/mnt/hdd/timelapse/videos"
+SEGMENT_ROOT = os.path.join(VIDEO_ROOT, ".segments")
+FRAME_THUMB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web", "thumbs", "frames")
+POLICY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retention.json")
+STATE_PATH = "/mnt/hdd/timelapse/retention_state.json"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "retention.log"
+
+RAW_EXTS = (".raw", ".npy", ".dng")
+RAWZ_SUFFIX = ".rawz"  # komprimiert durch raw_tier.py
+KEEP_MARKER = ".keep"
+KEEP_RAW_MARKER = ".keep_raw"
+
+DEFAULT_POLICY = {
+    "enabled": True,
+    "keep_master_days": None,      # None = Bilder nur bei Platzmangel löschen
+    "keep_raw_days": 14,
+    "raw_keep_sessions": [],       # Session-Präfixe, deren RAWs immer bleiben
+    "keep_video_days": None,
+    "rendition_max_age_days": 7,   # Frame-Thumbnails/Segment-Cache ohne Zugriff
+    "min_free_gb": 20,
+    "min_age_hours": 24,           # jüngere Dateien werden nie angefasst (laufende Session)
+    "max_deletes_per_s": 20,
+    "batch_size": 200,
+}
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def load_policy(path: str = POLICY_PATH) -> dict:
+    policy = dict(DEFAULT_POLICY)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            policy.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    return policy
+
+
+def lower_priority(nice: int = 19):
+    """Eigenen Prozess auf niedrigste CPU- und IO-Priorität setzen (Aufnahme hat Vorrang)."""
+    try:
+        os.nice(nice)
+    except OSError:
+        pass
+    if shutil.which("ionice"):
+        subprocess.run(["ionice", "-c", "3", "-p", str(os.getpid())], check=False,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class RetentionManager:
+    def __init__(self, policy: dict, index: FrameIndex, image_root: str = IMAGE_ROOT,
+                 raw_root: str = RAW_ROOT, video_root: str = VIDEO_ROOT, dry_run: bool = False):
+        self.policy = policy
+        self.index = index
+        self.image_root = image_root
+        self.raw_root = raw_root
+        self.video_root = video_root
+        self.dry_run = dry_run
+        self.min_interval = 1.0 / max(float(policy.get("max_deletes_per_s") or 1), 0.1)
+        self._last_delete = 0.0
+        self.stats = {}
+        self._keep_cache = {}
+
+    # ------------------------------ Hilfen ------------------------------
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.image_root).free
+
+    def floor_bytes(self) -> int:
+        return int(float(self.policy.get("min_free_gb") or 0) * 1024 ** 3)
+
+    def below_floor(self) -> bool:
+        return self.free_bytes() < self.floor_bytes()
+
+    def _count(self, category: str, size: int):
+        s = self.stats.setdefault(category, {"files": 0, "bytes": 0})
+        s["files"] += 1
+        s["bytes"] += size
+
+    def _delete(self, path: str, category: str) -> int:
+        """Eine Datei löschen – höchstens max_deletes_per_s pro Sekunde."""
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return 0
+        wait = self._last_delete + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        if not self.dry_run:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Konnte {path} nicht löschen: {e}")
+                return 0
+        self._last_delete = time.monotonic()
+        self._count(category, size)
+        return size
+
+    def _session_flags(self, session: str) -> Tuple[bool, bool]:
+        """(alles behalten, RAWs behalten) – über Marker-Dateien oder raw_keep_sessions."""
+        if session not in self._keep_cache:
+            d = os.path.join(self.image_root, session)
+            keep_all = os.path.exists(os.path.join(d, KEEP_MARKER))
+            keep_raw = keep_all or os.path.exists(os.path.join(d, KEEP_RAW_MARKER)) or any(
+                session == p or session.startswith(p.rstrip("/") + "/") for p in self.policy.get("raw_keep_sessions") or [])
+            self._keep_cache[session] = (keep_all, keep_raw)
+        return self._keep_cache[session]
+
+    def _raw_paths(self, rel: str) -> List[str]:
+        stem = os.path.splitext(rel)[0]
+        paths = []
+        for ext in RAW_EXTS:
+            base = os.path.join(self.raw_root, stem + ext)
+            paths += [p for p in (base, base + RAWZ_SUFFIX) if os.path.exists(p)]
+        return paths
+
+    def _frames(self, t_to: float, t_from: Optional[float] = None) -> Iterator[Tuple[str, str, float, int]]:
+        """Alle Bilder aus [t_from, t_to), älteste zuerst, seitenweise aus dem Index."""
+        cursor = None
+        batch = int(self.policy.get("batch_size") or 200)
+        while True:
+            rows = list(self.index.iter_frames(t_from=t_from, t_to=t_to, limit=batch, cursor=cursor, order="asc"))
+            if not rows:
+                return
+            yield from rows
+            if len(rows) < batch:
+                return
+            cursor = encode_cursor(rows[-1][2], rows[-1][0], "asc")
+
+    def _prune_empty_dirs(self, root: str, rel_dir: str):
+        d = os.path.join(root, rel_dir)
+        while not self.dry_run and rel_dir and os.path.isdir(d):
+            try:
+                os.rmdir(d)  # nur wenn leer
+            except OSError:
+                return
+            rel_dir = os.path.dirname(rel_dir)
+            d = os.path.join(root, rel_dir)
+
+    # ------------------------------ Schritte ------------------------------
+
+    def prune_renditions(self, max_age_s: Optional[float]):
+        """Frame-Thumbnails und Video-Segmente: alle (Platzmangel) oder nur unbenutzte alte."""
+        now = time.time()
+        for d, category in ((FRAME_THUMB_DIR, "renditions"), (SEGMENT_ROOT, "segments")):
+            try:
+                entries = sorted(os.scandir(d), key=lambda e: e.stat().st_atime)
+            except OSError:
+                continue
+            for e in entries:
+                st = e.stat()
+                if not e.is_file() or now - st.st_mtime < 3600:  # evtl. gerade in Benutzung
+                    continue
+                if max_age_s is not None and now - max(st.st_atime, st.st_mtime) < max_age_s:
+                    continue
+                self._delete(e.path, category)
+                if max_age_s is None and not self.below_floor():
+                    return
+
+    def prune_raws(self, t_to: float, until_floor: bool = False, t_from: Optional[float] = None) -> float:
+        """RAWs älter als t_to löschen; liefert die erreichte Zeitmarke (Startpunkt für den nächsten Lauf)."""
+        for rel, session, ts, size in self._frames(t_to, t_from):
+            if until_floor and not self.below_floor():
+                return ts
+            if self._session_flags(session)[1]:
+                continue
+            for p in self._raw_paths(rel):
+                self._delete(p, "raw")
+        return t_to
+
+    def prune_masters(self, t_to: float, until_floor: bool = False):
+        removed: List[str] = []
+        dirs = set()
+        try:
+            for rel, session, ts, size in self._frames(t_to):
+                if until_floor and not self.below_floor():
+                    break
+                if self._session_flags(session)[0]:
+                    continue
+                stem = os.path.splitext(rel)[0]
+                if not self._session_flags(session)[1]:
+                    for p in self._raw_paths(rel):
+                        self._delete(p, "raw")
+                self._delete(os.path.join(self.image_root, stem + ".json"), "sidecar")
+                self._delete(os.path.join(FRAME_THUMB_DIR, rel.replace("/", "_") + ".thumb.jpg"), "renditions")
+                self._delete(os.path.join(self.image_root, rel), "masters")
+                removed.append(rel)
+                dirs.add(session)
+                if len(removed) >= int(self.policy.get("batch_size") or 200):
+                    if not self.dry_run:
+                        self.index.remove_frames(removed)
+                    removed = []
+        finally:
+            if removed and not self.dry_run:
+                self.index.remove_frames(removed)
+        for session in dirs:
+            self._prune_empty_dirs(self.image_root, session)
+            self._prune_empty_dirs(self.raw_root, session)
+
+    def prune_videos(self, max_age_s: float):
+        now = time.time()
+        try:
+            entries = list(os.scandir(self.video_root))
+        except OSError:
+            return
+        for e in entries:
+            if e.is_file() and e.name.endswith(".mp4") and now - e.stat().st_mtime > max_age_s:
+                self._delete(e.path, "videos")
+
+    def run(self, raw_watermark: Optional[float] = None) -> dict:
+        """Ein Durchlauf; raw_watermark = bis hierhin wurden RAWs nach Alter bereits geprüft."""
+        t0 = time.monotonic()
+        p = self.policy
+        self.stats = {}
+        self._keep_cache = {}
+        free_before = self.free_bytes()
+        now = time.time()
+        guard = now - float(p.get("min_age_hours") or 0) * 3600
+        day = 86400.0
+
+        self.index.sync()
+        if p.get("rendition_max_age_days") is not None:
+            self.prune_renditions(float(p["rendition_max_age_days"]) * day)
+        if p.get("keep_raw_days") is not None:
+            raw_watermark = self.prune_raws(min(guard, now - float(p["keep_raw_days"]) * day), t_from=raw_watermark)
+        if p.get("keep_master_days") is not None:
+            self.prune_masters(min(guard, now - float(p["keep_master_days"]) * day))
+        if p.get("keep_video_days") is not None:
+            self.prune_videos(float(p["keep_video_days"]) * day)
+
+        # Mindest-Freigrenze: erst Caches, dann älteste RAWs, dann älteste Bilder
+        floor_hit = self.below_floor()
+        if floor_hit:
+            logger.warning(f"Freier Platz {free_before / 1024 ** 3:.1f} GB unter {p.get('min_free_gb')} GB – räume auf")
+            self.prune_renditions(None)
+        if self.below_floor():
+            self.prune_raws(guard, until_floor=True)
+        if self.below_floor():
+            self.prune_masters(guard, until_floor=True)
+        if self.below_floor():
+            logger.error("Mindest-Freigrenze nicht erreichbar (nur geschützte/junge Dateien übrig)")
+
+        report = {
+            "time": now,
+            "dry_run": self.dry_run,
+            "free_before_gb": round(free_before / 1024 ** 3, 2),
+            "free_after_gb": round(self.free_bytes() / 1024 ** 3, 2),
+            "floor_hit": floor_hit,
+            "deleted": self.stats,
+            "freed_mb": round(sum(s["bytes"] for s in self.stats.values()) / 1024 ** 2, 1),
+            "seconds": round(time.monotonic() - t0, 1),
+            "raw_watermark": raw_watermark,
+        }
+        return report
+
+
+def save_state(report: dict, path: str = STATE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+
+
+def load_state(path: str = STATE_PATH) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Speicherplatz-Verwaltung (Aufbewahrungsrichtlinien)")
+    ap.add_argument("command", choices=["run", "daemon"])
+    ap.add_argument("--policy", default=POLICY_PATH)
+    ap.add_argument("--db", default=FRAME_INDEX_DB)
+    ap.add_argument("--interval", type=int, default=900, help="Sekunden zwischen Läufen (daemon)")
+    ap.add_argument("--dry-run", action="store_true", help="nur anzeigen, nichts löschen")
+    args = ap.parse_args()
+
+    lower_priority()
+    while True:
+        policy = load_policy(args.policy)
+        if policy.get("enabled", True):
+            mgr = RetentionManager(policy, FrameIndex(args.db, IMAGE_ROOT), dry_run=args.dry_run)
+            report = mgr.run((load_state() or {}).get("raw_watermark"))
+            logger.info(f"Aufräumen: {report['freed_mb']} MB frei gemacht, jetzt {report['free_after_gb']} GB frei "
+                        f"({report['deleted']})")
+            if not args.dry_run:
+                save_state(report)
+        if args.command == "run":
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
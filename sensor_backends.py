@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+sensor_backends.py — Austauschbare Sensor-Anbindung für sensor_logger.py
+- "hardware": VEML7700 & TCS34725 über board/adafruit (wie bisher)
+- "sim": simulierte Sensoren mit derselben Schnittstelle wie die Adafruit-Treiber
+  · Lichtverlauf synthetisch (Sonnenbogen, Dämmerung, Wolken) oder aus einer
+    aufgezeichneten Sensor-CSV bzw. einem Verzeichnis mit Tagesdateien
+  · Rohwerte hängen von Gain und Integrationszeit ab, inkl. Sättigung bei 65535
+  · Lesen dauert die Integrationszeit (abschaltbar), zufällige I2C-Fehler (OSError 121)
+  · Ungültige TCS-Gains werden wie im Treiber abgelehnt (ValueError)
+  · Zeitraffer: speed > 1 lässt den simulierten Tag schneller ablaufen
+- Auswahl über "backend" in sensor_config.json oder SENSOR_BACKEND
+"""
+from __future__ import annotations
+import bisect
+import csv
+import math
+import os
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from loguru import logger
+
+DEFAULT_SIM = {
+    "source": "synthetic",      # "synthetic" oder Pfad zu CSV/Verzeichnis mit Tagesdateien
+    "column": "veml_lux",       # Lux-Spalte der Aufzeichnung
+    "ct_column": "tcs_ctK",
+    "sunrise_h": 6.0,
+    "sunset_h": 20.5,
+    "max_elevation_deg": 60.0,
+    "peak_lux": 60000.0,
+    "night_lux": 0.002,
+    "clouds": 0.3,              # 0 = klar, 1 = stark wechselnd bewölkt
+    "noise": 0.01,              # relatives Messrauschen
+    "error_rate": 0.002,        # Anteil fehlgeschlagener Lesezugriffe
+    "delays": True,             # Lesen wartet die Integrationszeit ab
+    "speed": 1.0,               # Zeitraffer-Faktor der Simulation
+    "start": None,              # ISO-Zeit, bei der die Simulation beginnt (Default: jetzt)
+    "seed": None,
+}
+
+SATURATION = 65535
+
+
+def _i2c_error():
+    return OSError(121, "Remote I/O error")
+
+
+# ------------------------------ Lichtverlauf ------------------------------
+
+class SimClock:
+    """Simulierte Uhr: startet bei `start` und läuft speed-mal so schnell wie die echte."""
+
+    def __init__(self, start: Optional[str] = None, speed: float = 1.0):
+        self.t0_real = time.time()
+        self.t0_sim = datetime.fromisoformat(start).timestamp() if start else self.t0_real
+        self.speed = float(speed)
+
+    def now(self) -> float:
+        return self.t0_sim + (time.time() - self.t0_real) * self.speed
+
+
+class SyntheticDay:
+    """Grober Sonnenbogen mit Dämmerung und langsam wechselnder Bewölkung."""
+
+    def __init__(self, cfg: dict, rng: random.Random):
+        self.cfg = cfg
+        self.rng = rng
+        self.cloud = 0.0
+        self.cloud_t: Optional[float] = None
+
+    def elevation(self, ts: float) -> float:
+        dt = datetime.fromtimestamp(ts)
+        h = dt.hour + dt.minute / 60.0 + dt.second / 3600.0
+        rise, sset, top = self.cfg["sunrise_h"], self.cfg["sunset_h"], self.cfg["max_elevation_deg"]
+        day = sset - rise
+        if rise <= h <= sset:
+            return top * math.sin(math.pi * (h - rise) / day)
+        night = 24.0 - day
+        since = (h - sset) % 24.0
+        return -min(top, 40.0) * math.sin(math.pi * since / night)
+
+    def _clouds(self, ts: float) -> float:
+        # Zufallsweg mit Rückstellkraft (Ornstein-Uhlenbeck), Zeitschritt in simulierten Minuten
+        if self.cloud_t is None:
+            self.cloud_t = ts
+        dt = min(60.0, max(0.0, ts - self.cloud_t) / 60.0)
+        self.cloud_t = ts
+        self.cloud += self.rng.gauss(0.0, 0.08 * math.sqrt(dt)) - 0.05 * dt * self.cloud
+        self.cloud = max(-1.0, min(1.0, self.cloud))
+        return 1.0 - self.cfg["clouds"] * 0.5 * (1.0 + self.cloud)
+
+    def lux(self, ts: float) -> float:
+        e = self.elevation(ts)
+        if e > 0:
+            lux = self.cfg["peak_lux"] * math.sin(math.radians(e)) ** 1.2 + 400.0
+        else:
+            lux = 400.0 * 10 ** (0.45 * e)   # -6° ≈ 0.8 lx, -12° ≈ 0.002 lx
+        return max(self.cfg["night_lux"], lux * self._clouds(ts))
+
+    def color_temperature(self, ts: float) -> float:
+        e = self.elevation(ts)
+        if e >= 10:
+            return 5600.0
+        if e >= 0:
+            return 3200.0 + 240.0 * e       # goldene Stunde
+        return min(12000.0, 5600.0 - 600.0 * e)  # blaue Stunde / Nacht
+
+
+class RecordedDay:
+    """Lux/Farbtemperatur nach Tageszeit aus einer Aufzeichnung (linear interpoliert)."""
+
+    def __init__(self, source: str, column: str, ct_column: str):
+        from sensor_reader import parse_ts
+        path = Path(source)
+        if path.is_dir():
+            from sensor_partitions import partitions_for, open_partition
+            files = [open_partition(p) for p in partitions_for(path)]
+        else:
+            files = [open(path, newline="", encoding="utf-8", errors="replace")]
+        pts: List[Tuple[float, float, float]] = []
+        for f in files:
+            with f:
+                for row in csv.DictReader(f):
+                    try:
+                        ts = parse_ts(row["timestamp"])
+                        lux = float(row[column])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    if math.isnan(ts) or math.isnan(lux):
+                        continue
+                    try:
+                        ct = float(row.get(ct_column) or "nan")
+                    except ValueError:
+                        ct = math.nan
+                    dt = datetime.fromtimestamp(ts)
+                    pts.append((dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6, lux, ct))
+        if not pts:
+            raise ValueError(f"Keine Lux-Werte in {source} ({column})")
+        pts.sort()
+        self.tod = [p[0] for p in pts]
+        self.lux_v = [p[1] for p in pts]
+        self.ct_v = [p[2] for p in pts]
+        logger.info(f"Aufgezeichneter Tagesverlauf: {len(pts)} Punkte aus {source}")
+
+    def _interp(self, ts: float, values: List[float]) -> float:
+        dt = datetime.fromtimestamp(ts)
+        x = dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+        i = bisect.bisect_left(self.tod, x)
+        if i <= 0 or i >= len(self.tod):
+            return values[0] if i <= 0 else values[-1]
+        x0, x1 = self.tod[i - 1], self.tod[i]
+        f = (x - x0) / (x1 - x0) if x1 > x0 else 0.0
+        return values[i - 1] + f * (values[i] - values[i - 1])
+
+    def lux(self, ts: float) -> float:
+        return max(0.0, self._interp(ts, self.lux_v))
+
+    def color_temperature(self, ts: float) -> float:
+        ct = self._interp(ts, self.ct_v)
+        return 5600.0 if math.isnan(ct) else ct
+
+
+class LightSource:
+    def __init__(self, cfg: dict):
+        self.cfg = cfg
+        self.rng = random.Random(cfg.get("seed"))
+        self.clock = SimClock(cfg.get("start"), cfg.get("speed", 1.0))
+        src = cfg.get("source", "synthetic")
+        self.model = SyntheticDay(cfg, self.rng) if src == "synthetic" else \
+            RecordedDay(src, cfg.get("column", "veml_lux"), cfg.get("ct_column", "tcs_ctK"))
+
+    def sample(self) -> Tuple[float, float]:
+        ts = self.clock.now()
+        noise = 1.0 + self.rng.gauss(0.0, self.cfg.get("noise", 0.0))
+        return max(0.0, self.model.lux(ts) * noise), self.model.color_temperature(ts)
+
+    def integrate(self, ms: float):
+        """Wartezeit für eine Messung (echte Zeit, unabhängig vom Zeitraffer)."""
+        if self.cfg.get("delays", True):
+            time.sleep(ms / 1000.0)
+
+    def maybe_fail(self):
+        if self.rng.random() < self.cfg.get("error_rate", 0.0):
+            raise _i2c_error()
+
+
+# ------------------------------ Simulierte Sensoren ------------------------------
+
+def _veml_correct(lux: float) -> float:
+    """Nichtlinearitätskorrektur des Treibers für hohe Werte."""
+    if lux > 1000:
+        lux = 6.0135e-13 * lux ** 4 - 9.3924e-9 * lux ** 3 + 8.1488e-5 * lux ** 2 + 1.0023 * lux
+    return lux
+
+
+def _veml_uncorrect(lux: float) -> float:
+    """Umkehrung von _veml_correct (Bisektion): was der Sensor bei echter Helligkeit lux liefert."""
+    if lux <= 1000:
+        return lux
+    lo, hi = 1000.0, lux
+    for _ in range(40):
+        mid = (lo + hi) / 2
+        if _veml_correct(mid) < lux:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+class SimVEML7700:
+    """Schnittstelle wie adafruit_veml7700.VEML7700 (lux, autolux, white, light, Gain/IT)."""
+    ALS_GAIN_1 = 0x0
+    ALS_GAIN_2 = 0x1
+    ALS_GAIN_1_8 = 0x2
+    ALS_GAIN_1_4 = 0x3
+    ALS_25MS = 0xC
+    ALS_50MS = 0x8
+    ALS_100MS = 0x0
+    ALS_200MS = 0x1
+    ALS_400MS = 0x2
+    ALS_800MS = 0x3
+    GAINS = {ALS_GAIN_2: 2.0, ALS_GAIN_1: 1.0, ALS_GAIN_1_4: 0.25, ALS_GAIN_1_8: 0.125}
+    ITS = {ALS_25MS: 25, ALS_50MS: 50, ALS_100MS: 100, ALS_200MS: 200, ALS_400MS: 400, ALS_800MS: 800}
+
+    def __init__(self, light: LightSource):
+        self._light = light
+        self.light_gain = self.ALS_GAIN_1
+        self.light_integration_time = self.ALS_100MS
+        self._conv: Optional[Tuple[float, Tuple[int, int], Tuple[int, int]]] = None  # (Zeit, Einstellung, Werte)
+
+    def resolution(self) -> float:
+        # Datenblatt: 0.0036 lx/Count bei Gain 2 und 800 ms
+        return 0.0036 * (2.0 / self.GAINS[self.light_gain]) * (800.0 / self.ITS[self.light_integration_time])
+
+    def _read(self) -> Tuple[int, int]:
+        """Ergebnisregister wie beim echten Sensor: er misst fortlaufend, gelesen wird die letzte
+        fertige Messung. Neu gemessen wird erst nach einer Integrationszeit; gewartet wird nur,
+        wenn Gain/IT gerade geändert wurden (dann ist noch keine Messung mit ihnen fertig)."""
+        self._light.maybe_fail()
+        setting = (self.light_gain, self.light_integration_time)
+        it_s = self.ITS[self.light_integration_time] / 1000.0
+        now = time.monotonic()
+        if self._conv is not None and self._conv[1] == setting and now - self._conv[0] < it_s:
+            return self._conv[2]
+        if self._conv is None or self._conv[1] != setting:
+            self._light.integrate(it_s * 1000.0)
+            now = time.monotonic()
+        lux, _ = self._light.sample()
+        lux = _veml_uncorrect(lux)  # der Sensor liest bei viel Licht zu wenig
+        res = self.resolution()
+        als = min(SATURATION, int(lux / res))
+        white = min(SATURATION, int(lux * 1.2 / res))
+        self._conv = (now, setting, (als, white))
+        return als, white
+
+    @property
+    def light(self) -> int:
+        return self._read()[0]
+
+    @property
+    def white(self) -> int:
+        return self._read()[1]
+
+    @property
+    def lux(self) -> float:
+        return self._read()[0] * self.resolution()
+
+    @property
+    def autolux(self) -> float:
+        """Wie im Treiber: Gain/IT schrittweise anpassen, bis die Rohwerte im guten Bereich liegen."""
+        order = sorted(((g, it) for g in self.GAINS for it in self.ITS),
+                       key=lambda s: self.GAINS[s[0]] * self.ITS[s[1]])
+        cur = (self.light_gain, self.light_integration_time)
+        idx = order.index(cur) if cur in order else len(order) // 2
+        while True:
+            self.light_gain, self.light_integration_time = order[idx]
+            als = self._read()[0]
+            if als < 100 and idx < len(order) - 1:
+                idx += 1
+            elif als > 10000 and idx > 0:
+                idx -= 1
+            else:
+                break
+        return _veml_correct(als * self.resolution())
+
+
+class SimTCS34725:
+    """Schnittstelle wie adafruit_tcs34725.TCS34725 (color_raw, lux, color_temperature, gain, integration_time)."""
+    VALID_GAINS = (1, 4, 16, 60)
+    COUNTS_PER_LUX_MS = 0.0033   # Clear-Counts je Lux und ms bei Gain 1 (grob aus Aufzeichnungen)
+
+    def __init__(self, light: LightSource):
+        self._light = light
+        self._gain = 4
+        self._it_ms = 154.0
+
+    @property
+    def gain(self) -> int:
+        return self._gain
+
+    @gain.setter
+    def gain(self, val):
+        if val not in self.VALID_GAINS:
+            raise ValueError(f"Gain must be one of {self.VALID_GAINS}")
+        self._light.maybe_fail()
+        self._gain = int(val)
+
+    @property
+    def integration_time(self) -> float:
+        return self._it_ms
+
+    @integration_time.setter
+    def integration_time(self, val):
+        if not 2.4 <= float(val) <= 614.4:
+            raise ValueError("Integration time must be between 2.4 and 614.4 ms")
+        self._light.maybe_fail()
+        self._it_ms = float(val)
+
+    def _max_count(self) -> int:
+        return min(SATURATION, int(1024 * round(self._it_ms / 2.4)))
+
+    @property
+    def color_raw(self) -> Tuple[int, int, int, int]:
+        self._light.maybe_fail()
+        self._light.integrate(self._it_ms)
+        lux, ct = self._light.sample()
+        k = self.COUNTS_PER_LUX_MS * self._gain * self._it_ms
+        # Kanalverhältnisse grob über die Farbtemperatur (warm → rot, kalt → blau)
+        m = 1e6 / max(1000.0, ct)
+        r_rel = 1.0 + (m - 180.0) / 300.0
+        b_rel = 1.0 - (m - 180.0) / 300.0
+        top = self._max_count()
+        c = min(top, int(lux * k))
+        g = min(top, int(lux * k * 0.35))
+        r = min(top, max(0, int(lux * k * 0.35 * r_rel)))
+        b = min(top, max(0, int(lux * k * 0.35 * b_rel)))
+        self._last = (r, g, b, c)
+        return r, g, b, c
+
+    @property
+    def lux(self) -> Optional[float]:
+        r, g, b, c = getattr(self, "_last", None) or self.color_raw
+        k = self.COUNTS_PER_LUX_MS * self._gain * self._it_ms
+        return c / k if k > 0 else None
+
+    @property
+    def color_temperature(self) -> Optional[float]:
+        r, g, b, c = getattr(self, "_last", None) or self.color_raw
+        if r == 0 or b == 0 or c >= self._max_count():
+            return None
+        # Umkehrung der Kanalverhältnisse aus color_raw
+        m = 180.0 + 150.0 * (r - b) / max(1, g)
+        return 1e6 / max(50.0, m)
+
+
+# ------------------------------ Auswahl ------------------------------
+
+def open_hardware(config: dict):
+    import board
+    import adafruit_veml7700
+    import adafruit_tcs34725
+    i2c = board.I2C()
+    return adafruit_veml7700.VEML7700(i2c), adafruit_tcs34725.TCS34725(i2c)
+
+
+def open_sim(config: dict):
+    cfg = dict(DEFAULT_SIM, **(config.get("sim") or {}))
+    light = LightSource(cfg)
+    logger.info(f"Simulierte Sensoren: Quelle={cfg['source']}, Zeitraffer={cfg['speed']}x, "
+                f"Fehlerrate={cfg['error_rate']}")
+    return SimVEML7700(light), SimTCS34725(light)
+
+
+BACKENDS = {"hardware": open_hardware, "sim": open_sim}
+
+
+def open_sensors(config: dict):
+    """(veml, tcs) des gewählten Backends; bei Fehlern (None, None) wie bisher."""
+    name = os.environ.get("SENSOR_BACKEND") or config.get("backend", "hardware")
+    opener = BACKENDS.get(name)
+    if opener is None:
+        logger.error(f"Unbekanntes Sensor-Backend: {name} (verfügbar: {', '.join(BACKENDS)})")
+        return None, None
+    try:
+        return opener(config)
+    except Exception as e:
+        logger.warning(f"Sensor-Init fehlgeschlagen ({name}): {e}")
+        return None, None
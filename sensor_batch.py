@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+sensor_batch.py — Gebündeltes Schreiben der Sensorwerte
+- Messungen werden im Speicher gesammelt und nach flush_rows Zeilen oder flush_s Sekunden
+  gemeinsam in die CSV (ein flush) und den Zeitreihen-Speicher (eine Transaktion) geschrieben
+- Optional fsync nach jedem Schub (Haltbarkeit gegen Stromausfall, kostet Schreibzugriffe)
+- Regler bekommen neue Werte nur über den Sensor-Bus (sensor_bus.py) sofort: er sendet
+  jede Messung vor dem Puffern. Wer die CSV liest (SensorFeed ohne Bus, /api/sensors aus
+  den Tagesdateien), sieht neue Werte erst nach dem nächsten Schub, also bis zu flush_s später
+- Zählt eingesparte Schreibaufrufe und rechnet sie auf einen Tag hoch
+"""
+from __future__ import annotations
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+
+DEFAULT_FLUSH_ROWS = 30      # bei 2 s Intervall etwa jede Minute
+DEFAULT_FLUSH_S = 60.0
+REPORT_EVERY_S = 3600
+
+
+class BatchedWriter:
+    def __init__(self, out, store=None, flush_rows: int = DEFAULT_FLUSH_ROWS, flush_s: float = DEFAULT_FLUSH_S,
+                 fsync: bool = False):
+        self.out = out
+        self.store = store
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_s = max(0.0, float(flush_s))
+        self.fsync = fsync
+        self.pending: List[Tuple[float, Sequence, Dict[str, float]]] = []
+        self.oldest_pending: Optional[float] = None
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.samples = 0
+        self.flushes = 0
+        self.fsyncs = 0
+        self.last_report = time.monotonic()
+
+    def add(self, ts: float, row: Sequence, values: Dict[str, float]):
+        """Messung puffern; schreibt, sobald Anzahl oder Alter des Puffers erreicht ist."""
+        self.pending.append((ts, row, values))
+        self.samples += 1
+        self.first_ts = ts if self.first_ts is None else self.first_ts
+        self.last_ts = ts
+        now = time.monotonic()
+        if self.oldest_pending is None:
+            self.oldest_pending = now
+        if len(self.pending) >= self.flush_rows or now - self.oldest_pending >= self.flush_s:
+            self.flush()
+        if now - self.last_report >= REPORT_EVERY_S:
+            self.report()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending, self.oldest_pending = self.pending, [], None
+        try:
+            for ts, row, _ in batch:
+                self.out.write(row, ts)
+            self.out.flush()
+            if self.fsync:
+                os.fsync(self.out.fileno())
+                self.fsyncs += 1
+        except Exception:
+            logger.exception("Fehler beim Schreiben der Sensor-CSV.")
+        if self.store is not None:
+            try:
+                self.store.append_many([(ts, values) for ts, _, values in batch])
+            except Exception:
+                logger.exception("Fehler beim Schreiben in den Zeitreihen-Speicher.")
+        self.flushes += 1
+
+    def stats(self) -> dict:
+        saved = self.samples - self.flushes
+        # Hochrechnung über die Messrate: Messungen pro Tag × Anteil gesparter Aufrufe
+        span = (self.last_ts - self.first_ts) if self.samples > 1 else 0.0
+        per_day = (self.samples - 1) / span * 86400 if span > 0 else 0.0
+        return {
+            "samples": self.samples,
+            "flushes": self.flushes,
+            "fsyncs": self.fsyncs,
+            "pending": len(self.pending),
+            "write_calls_saved": saved,
+            "saved_per_day": int(per_day * saved / self.samples) if self.samples else 0,
+        }
+
+    def report(self):
+        st = self.stats()
+        self.last_report = time.monotonic()
+        logger.info(f"Schreib-Bündelung: {st['samples']} Messungen in {st['flushes']} Schüben, "
+                    f"{st['write_calls_saved']} Schreibaufrufe gespart (≈{st['saved_per_day']}/Tag)")
+
+    def close(self):
+        self.flush()
+        self.report()
+        self.out.close()
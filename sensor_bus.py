@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+sensor_bus.py — Sensorwerte per Unix-Socket verteilen (Publish/Subscribe)
+- sensor_logger.py veröffentlicht jede Messung als JSON-Zeile auf einem lokalen Socket
+- Ringpuffer der letzten Messungen: Nachzügler bekommen ihn beim Verbinden sofort
+- Langsame/tote Abonnenten werden getrennt, der Logger blockiert nie
+- SensorFeed für die Regler: wartet auf die nächste Messung statt fest zu schlafen,
+  fällt ohne Logger (Socket fehlt) auf die CSV-Dateien zurück (sensor_reader.py)
+"""
+from __future__ import annotations
+import json
+import math
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+from sensor_reader import get_tail, weighted_mean
+
+SOCKET_PATH = os.environ.get("SENSOR_BUS_SOCKET") or "/dev/shm/timelapse_sensors.sock"
+RING_SIZE = 300                    # bei 2 s Intervall 10 Minuten
+MAX_CLIENT_BUFFER = 256 * 1024     # mehr Rückstand → Abonnent wird getrennt
+RECONNECT_S = 2.0
+STOP_POLL_S = 1.0                  # SensorFeed.wait(): so oft wird ein Stopp-Wunsch geprüft
+
+# Eine Messung: (Unix-Zeit, {Spalte: Wert})
+Sample = Tuple[float, Dict[str, float]]
+
+
+class _Client:
+    __slots__ = ("sock", "buf")
+
+    def __init__(self, sock: socket.socket, buf: bytes):
+        self.sock = sock
+        self.buf = bytearray(buf)
+
+
+class Publisher:
+    def __init__(self, path: str = SOCKET_PATH, ring_size: int = RING_SIZE):
+        self.path = path
+        self.ring: deque = deque(maxlen=ring_size)
+        self.stream = int(time.time() * 1000)  # unterscheidet Neustarts des Loggers
+        self.seq = 0
+        self.clients: List[_Client] = []
+        self.lock = threading.Lock()
+        self.sock: Optional[socket.socket] = None
+        self.running = False
+
+    def start(self):
+        try:
+            os.unlink(self.path)  # verwaister Socket eines früheren Laufs
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o666)
+        self.sock.listen(16)
+        self.sock.settimeout(1.0)
+        self.running = True
+        threading.Thread(target=self._accept_loop, name="sensor-bus", daemon=True).start()
+        logger.info(f"Sensor-Bus aktiv: {self.path}")
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.setblocking(False)
+            with self.lock:
+                client = _Client(conn, b"".join(self.ring))
+                if self._flush(client):
+                    self.clients.append(client)
+
+    @staticmethod
+    def _flush(client: _Client) -> bool:
+        """Puffer so weit wie möglich senden; False = Abonnent weg oder zu langsam."""
+        try:
+            while client.buf:
+                n = client.sock.send(client.buf)
+                del client.buf[:n]
+        except BlockingIOError:
+            pass
+        except OSError:
+            client.sock.close()
+            return False
+        if len(client.buf) > MAX_CLIENT_BUFFER:
+            client.sock.close()
+            return False
+        return True
+
+    def publish(self, ts: float, values: Dict[str, float]):
+        self.seq += 1
+        msg = (json.dumps({"stream": self.stream, "seq": self.seq, "ts": ts, "values": values},
+                          separators=(",", ":")) + "\n").encode("utf-8")
+        with self.lock:
+            self.ring.append(msg)
+            alive = []
+            for c in self.clients:
+                c.buf += msg
+                if self._flush(c):
+                    alive.append(c)
+            self.clients = alive
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            for c in self.clients:
+                c.sock.close()
+            self.clients = []
+        if self.sock:
+            self.sock.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class Subscriber:
+    """Empfängt Messungen und hält die letzten ring_size im Speicher."""
+
+    def __init__(self, path: str = SOCKET_PATH, ring_size: int = RING_SIZE):
+        self.path = path
+        self.rows: deque = deque(maxlen=ring_size)
+        self.sock: Optional[socket.socket] = None
+        self.buf = b""
+        self.stream = None
+        self.seq = 0
+        self.next_try = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def connect(self) -> bool:
+        if self.sock is not None:
+            return True
+        now = time.monotonic()
+        if now < self.next_try:
+            return False
+        self.next_try = now + RECONNECT_S
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(self.path)
+        except OSError:
+            s.close()
+            return False
+        s.setblocking(False)
+        self.sock, self.buf = s, b""
+        logger.info(f"Mit Sensor-Bus verbunden: {self.path}")
+        return True
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            logger.warning("Sensor-Bus getrennt – nutze CSV bis zur Wiederverbindung")
+
+    def _receive(self) -> int:
+        n = 0
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self._disconnect()
+                break
+            self.buf += data
+        *lines, self.buf = self.buf.split(b"\n")
+        for line in lines:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if msg.get("stream") == self.stream and msg.get("seq", 0) <= self.seq:
+                continue  # Ring-Wiederholung nach Wiederverbindung
+            self.stream, self.seq = msg.get("stream"), msg.get("seq", 0)
+            ts = float(msg["ts"])
+            if self.rows and ts <= self.rows[-1][0]:
+                continue
+            self.rows.append((ts, {k: (math.nan if v is None else float(v)) for k, v in msg["values"].items()}))
+            n += 1
+        return n
+
+    def poll(self, timeout: float) -> int:
+        """Bis zu timeout Sekunden auf neue Messungen warten; liefert deren Anzahl."""
+        if not self.connect():
+            return 0
+        n = self._receive() if self.sock else 0
+        if n or self.sock is None:
+            return n
+        try:
+            ready, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+        except (OSError, ValueError):
+            self._disconnect()
+            return 0
+        return self._receive() if ready else 0
+
+    # ------------------------------ Abfragen (wie SensorTail) ------------------------------
+
+    def has_column(self, column: str) -> bool:
+        return bool(self.rows) and column in self.rows[-1][1]
+
+    def window(self, n: Optional[int] = None, seconds: Optional[float] = None) -> List[Sample]:
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            return [r for r in self.rows if r[0] >= cutoff]
+        n = max(0, min(n or 1, len(self.rows)))
+        return list(self.rows)[len(self.rows) - n:]
+
+    def covers(self, n: Optional[int] = None, seconds: Optional[float] = None) -> bool:
+        """Reicht der Ring für das gewünschte Fenster? Ein voller Ring, der kürzer ist als
+        seconds, reicht nicht – dann liest SensorFeed das CSV-Ende."""
+        if not self.rows:
+            return False
+        if seconds is not None:
+            return self.rows[0][0] <= time.time() - seconds
+        return len(self.rows) >= (n or 1)
+
+    def values(self, column: str, n: Optional[int] = None, seconds: Optional[float] = None) -> List[float]:
+        vals = (r[1].get(column, math.nan) for r in self.window(n, seconds))
+        return [v for v in vals if not math.isnan(v)]
+
+    def mean(self, column: str, n: Optional[int] = None, seconds: Optional[float] = None) -> Optional[float]:
+        return weighted_mean((r[0], r[1].get(column, math.nan)) for r in self.window(n, seconds))
+
+    def latest(self, columns: Sequence[str]) -> Optional[Tuple[float, ...]]:
+        if not self.rows or any(c not in self.rows[-1][1] for c in columns):
+            return None
+        return tuple(self.rows[-1][1][c] for c in columns)
+
+
+class SensorFeed:
+    """Datenquelle der Regler: Bus, solange verbunden und ausreichend gefüllt, sonst CSV-Ende.
+
+    Das CSV-Ende hinkt um bis zu flush_s des Loggers hinterher (gebündeltes Schreiben,
+    sensor_batch.py); geringe Latenz gibt es nur über den Bus.
+    """
+
+    def __init__(self, csv_path, socket_path: Optional[str] = SOCKET_PATH, use_bus: bool = True):
+        self.csv_path = csv_path
+        self.sub = Subscriber(socket_path) if use_bus and socket_path else None
+        self.last_return = 0.0
+        self.last_count = 0
+
+    @property
+    def tail(self):
+        return get_tail(self.csv_path)
+
+    def wait(self, interval: float, stop: Optional[Callable[[], bool]] = None) -> bool:
+        """Frühestens interval Sekunden nach dem letzten Aufruf zurückkehren – mit Bus genau dann,
+        wenn danach die nächste Messung eintrifft (Reaktion in Millisekunden statt bis zu einem
+        ganzen Abfrage-Intervall Verzögerung). Ohne Bus: einfach schlafen.
+
+        sleep/select laufen nach einem Signal weiter; deshalb wird in Schritten von höchstens
+        STOP_POLL_S gewartet und dazwischen stop() geprüft (False = vorzeitig beendet).
+        """
+        deadline = self.last_return + interval
+        while True:
+            if stop is not None and stop():
+                return False
+            now = time.monotonic()
+            if self.sub is None or not self.sub.connect():
+                if now >= deadline:
+                    break
+                time.sleep(min(STOP_POLL_S, deadline - now))
+                continue
+            if now < deadline:
+                self.sub.poll(min(STOP_POLL_S, deadline - now))  # bis zur Frist nur einsammeln
+                continue
+            # Frist erreicht: auf die nächste Messung warten (höchstens ein weiteres Intervall)
+            end = deadline + interval
+            if self.sub.poll(min(STOP_POLL_S, max(0.0, end - now))) or time.monotonic() >= end:
+                break
+        self.last_return = time.monotonic()
+        return True
+
+    def _source(self, n: Optional[int] = None, seconds: Optional[float] = None):
+        if self.sub is not None and self.sub.connected and self.sub.covers(n, seconds):
+            return self.sub
+        return self.tail
+
+    def has_column(self, column: str) -> bool:
+        src = self._source()
+        if src is self.tail:
+            src.refresh()
+        return src.has_column(column)
+
+    def mean(self, column: str, n: Optional[int] = None, seconds: Optional[float] = None) -> Optional[float]:
+        return self._source(n, seconds).mean(column, n=n, seconds=seconds)
+
+    def latest(self, columns: Sequence[str]) -> Optional[Tuple[float, ...]]:
+        return self._source().latest(columns)
+
+    @property
+    def header(self) -> List[str]:
+        src = self._source()
+        if src is self.sub:
+            return ["timestamp", *self.sub.rows[-1][1]]
+        return src.header
@@ -2,19 +2,33 @@
 # -*- coding: utf-8 -*-
 """
 sensor_logger.py – Loggt Sensorwerte mit Loguru
-- Liest VEML7700 und TCS34725
-- Loggt Daten in eine CSV-Datei
+- Liest VEML7700 und TCS34725 – echte Hardware oder simuliert (sensor_backends.py,
+  "backend": "sim" bzw. SENSOR_BACKEND=sim für Tests ohne Raspberry Pi)
+- Loggt Daten in eine Einzeldatei (Standard) oder tagesweise CSV-Dateien (sensor_partitions.py,
+  "log_layout": "daily" – erst nach "sensor_partitions.py split" und dem Umstellen der
+  CSV-Pfade in lux_control.json/lux_exposured.json/awb_adjuster.json)
 - Passt die Empfindlichkeit des TCS34725 dynamisch an
+- Schreibt zusätzlich in den Zeitreihen-Speicher (sensor_store.py, Rollups 1 min/1 h)
+- Veröffentlicht jede Messung sofort auf dem Sensor-Bus (sensor_bus.py) für die Regler
+- Schreibt CSV und Speicher gebündelt (sensor_batch.py: flush_rows/flush_s, optional fsync)
+- Adaptives Messintervall (sensor_schedule.py): dicht in der Dämmerung und nahe den
+  Regler-Schwellen, selten bei stabilem Licht; Zeitstempel mit Millisekunden
 - Nutzt Loguru für robustes Logging
 """
 import os, csv, time, math, signal, sys, json
 from datetime import datetime
 from loguru import logger
 from pathlib import Path
+from sensor_store import SensorStore, DB_PATH as SENSOR_DB_PATH
+from sensor_partitions import PartitionWriter, PARTITION_DIR, COMPRESS_AFTER_DAYS
+from sensor_bus import Publisher, SOCKET_PATH as BUS_SOCKET
+from sensor_batch import BatchedWriter, DEFAULT_FLUSH_ROWS, DEFAULT_FLUSH_S
+from sensor_schedule import AdaptiveScheduler
+from sensor_backends import open_sensors
 
 # --- Pfade festlegen: Standard = Verzeichnis dieser Datei
 SCRIPT_DIR = Path(__file__).resolve().parent
-CSV_PATH = Path(os.environ.get("SENSOR_LOG_PATH") or SCRIPT_DIR / "sensor_log.csv")
+CSV_PATH = Path(os.environ.get("SENSOR_LOG_PATH") or SCRIPT_DIR / "sensor_log.csv")  # nur log_layout "single"
 CONFIG_PATH = Path(os.environ.get("SENSOR_CONFIG_PATH") or SCRIPT_DIR / "sensor_config.json")
 LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
 LOG_PATH = LOG_ROOT / "sensor_logger.log"
@@ -26,8 +40,9 @@ def handle_sig(sig, frame):
 signal.signal(signal.SIGINT, handle_sig)
 signal.signal(signal.SIGTERM, handle_sig)
 
-def iso_local_now():
-    return datetime.now().astimezone().replace(microsecond=0).isoformat()
+def iso_local(ts=None):
+    dt = datetime.now() if ts is None else datetime.fromtimestamp(ts)
+    return dt.astimezone().isoformat(timespec="milliseconds")
 
 def ensure_header(path, header):
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -39,6 +54,23 @@ def ensure_header(path, header):
         f.flush()
     return f, writer
 
+class SingleFileWriter:
+    """Bisheriges Verhalten: eine fortlaufende CSV-Datei (log_layout "single")."""
+    def __init__(self, path, header):
+        self.f, self.writer = ensure_header(path, header)
+
+    def write(self, row, ts=None):
+        self.writer.writerow([iso_local(ts), *row])
+
+    def flush(self):
+        self.f.flush()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
 def load_json(path):
     try:
         return json.loads(path.read_text(encoding="utf-8"))
@@ -55,8 +87,6 @@ def main():
     logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
     logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
 
-    logger.info(f"Starte… schreibe nach: {CSV_PATH}")
-
     config = load_json(CONFIG_PATH)
     INTERVAL_S = float(config.get("interval_s", 2.0))
     header = [
@@ -66,28 +96,62 @@ def main():
         "tcs_lux","tcs_ctK","tcs_r","tcs_g","tcs_b","tcs_clear",
         "tcs_gain","tcs_integration_ms"
     ]
-    f, writer = ensure_header(CSV_PATH, header)
+    # Standard bleibt die Einzeldatei: die Regler lesen sie ohne Bus als Rückfallquelle
+    if config.get("log_layout", "single") == "single":
+        logger.info(f"Starte… schreibe nach: {CSV_PATH}")
+        out = SingleFileWriter(CSV_PATH, header)
+    else:
+        log_dir = Path(config.get("log_dir") or PARTITION_DIR)
+        logger.info(f"Starte… schreibe Tagesdateien nach: {log_dir}")
+        out = PartitionWriter(log_dir, header, config.get("compress_after_days", COMPRESS_AFTER_DAYS))
 
-    veml = None
-    tcs = None
-    try:
-        import board
-        import adafruit_veml7700
-        import adafruit_tcs34725
-        i2c = board.I2C()
-        veml = adafruit_veml7700.VEML7700(i2c)
-        tcs = adafruit_tcs34725.TCS34725(i2c)
-        veml.light_gain = veml.ALS_GAIN_1
-        veml.light_integration_time = veml.ALS_100MS
-        tcs.gain = config.get("tcs_default_gain", 4)
-        tcs.integration_time = config.get("tcs_default_integration_time_ms", 154)
-        logger.info("Sensor-Init OK (VEML7700 & TCS34725).")
-    except Exception as e:
-        logger.warning(f"Sensor-Init fehlgeschlagen: {e}")
+    store = None
+    if config.get("store_enabled", True):
+        try:
+            store = SensorStore(config.get("store_db") or SENSOR_DB_PATH,
+                                config.get("store_retention_days"), INTERVAL_S)
+            logger.info(f"Zeitreihen-Speicher: {store.db_path}")
+        except Exception as e:
+            logger.warning(f"Zeitreihen-Speicher nicht verfügbar: {e}")
+
+    batch = BatchedWriter(out, store,
+                          flush_rows=config.get("flush_rows", DEFAULT_FLUSH_ROWS),
+                          flush_s=config.get("flush_s", DEFAULT_FLUSH_S),
+                          fsync=bool(config.get("fsync", False)))
+
+    bus = None
+    if config.get("bus_enabled", True):
+        try:
+            bus = Publisher(config.get("bus_socket") or BUS_SOCKET)
+            bus.start()
+        except Exception as e:
+            logger.warning(f"Sensor-Bus nicht verfügbar: {e}")
+            bus = None
+
+    adaptive_cfg = config.get("adaptive") or {"enabled": False}
+    if not isinstance(adaptive_cfg, dict):
+        adaptive_cfg = {"enabled": bool(adaptive_cfg)}
+    scheduler = AdaptiveScheduler(adaptive_cfg, INTERVAL_S)
+    adaptive_column = adaptive_cfg.get("column", "veml_autolux")
+    if scheduler.enabled:
+        logger.info(f"Adaptives Messintervall {scheduler.min_s:g}–{scheduler.max_s:g} s, Schwellen (Lux): {scheduler.thresholds_lux}")
+    last_reason = None
+
+    veml, tcs = open_sensors(config)
+    if veml is not None and tcs is not None:
+        try:
+            veml.light_gain = veml.ALS_GAIN_1
+            veml.light_integration_time = veml.ALS_100MS
+            tcs.gain = config.get("tcs_default_gain", 4)
+            tcs.integration_time = config.get("tcs_default_integration_time_ms", 154)
+            logger.info("Sensor-Init OK (VEML7700 & TCS34725).")
+        except Exception as e:
+            logger.warning(f"Sensor-Init fehlgeschlagen: {e}")
 
     last_tcs_gain = tcs.gain if tcs else None
     last_tcs_it_ms = tcs.integration_time if tcs else None
 
+    next_due = time.monotonic()
     try:
         while running:
             veml_lux = veml_autolux = veml_white = veml_light = math.nan
@@ -109,16 +173,23 @@ def main():
                 new_gain = config.get("tcs_default_gain", 4)
                 new_it_ms = config.get("tcs_default_integration_time_ms", 154)
                 if veml_autolux < config.get("tcs_low_light_threshold_lux", 0.1):
-                    new_gain = config.get("tcs_low_light_gain", 64)
+                    new_gain = config.get("tcs_low_light_gain", 60)
                     new_it_ms = config.get("tcs_low_light_integration_time_ms", 614)
                 
+                # Fehler nur einmal je Zielwert melden, nicht bei jeder Messung erneut
                 if new_gain != last_tcs_gain:
-                    tcs.gain = new_gain
-                    logger.info(f"TCS Gain auf {new_gain} gesetzt.")
+                    try:
+                        tcs.gain = new_gain
+                        logger.info(f"TCS Gain auf {new_gain} gesetzt.")
+                    except Exception as e:
+                        logger.error(f"TCS Gain {new_gain} nicht gesetzt: {e}")
                     last_tcs_gain = new_gain
                 if new_it_ms != last_tcs_it_ms:
-                    tcs.integration_time = new_it_ms
-                    logger.info(f"TCS Integration Time auf {new_it_ms}ms gesetzt.")
+                    try:
+                        tcs.integration_time = new_it_ms
+                        logger.info(f"TCS Integration Time auf {new_it_ms}ms gesetzt.")
+                    except Exception as e:
+                        logger.error(f"TCS Integration Time {new_it_ms}ms nicht gesetzt: {e}")
                     last_tcs_it_ms = new_it_ms
             
             r = g = b = c = 0
@@ -134,20 +205,33 @@ def main():
                 except Exception:
                     logger.exception("Fehler beim Lesen des TCS34725-Sensors.")
 
-            writer.writerow([
-                iso_local_now(),
+            row = [
                 veml_lux, veml_autolux, veml_white, veml_light,
                 veml_gain, veml_it_ms,
                 tcs_lux, tcs_ct, r, g, b, c,
                 tcs_gain, tcs_it_ms
-            ])
-            f.flush()
-            time.sleep(INTERVAL_S)
+            ]
+            now = time.time()
+            values = dict(zip(header[1:], row))
+            if bus is not None:
+                bus.publish(now, values)
+            batch.add(now, row, values)
+            interval = scheduler.update(now, values.get(adaptive_column, math.nan))
+            if scheduler.reason != last_reason:
+                logger.info(f"Messintervall {interval:.1f} s ({scheduler.reason}, Steigung {scheduler.slope:.3f} Dek./min)")
+                last_reason = scheduler.reason
+            # Abstand vom Messbeginn aus, damit die Sensor-Integrationszeit das Intervall nicht verlängert
+            next_due = max(next_due + interval, time.monotonic())
+            time.sleep(max(0.0, next_due - time.monotonic()))
     finally:
         try:
-            f.close()
+            batch.close()
         except Exception:
-            pass
+            logger.exception("Fehler beim Schließen der Sensor-CSV.")
+        if store is not None:
+            store.close()
+        if bus is not None:
+            bus.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
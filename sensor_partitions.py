@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sensor_partitions.py — Tagesweise Sensor-CSV-Dateien mit Manifest
+- Eine Datei pro (lokalem) Tag: sensor_YYYY-MM-DD.csv, jede mit eigenem Header
+- current.csv zeigt als Symlink auf die laufende Datei
+- Abgeschlossene Tage werden optional zu .csv.gz komprimiert (geprüft, atomar ersetzt)
+- manifest.json: Datei, Zeilen, erste/letzte Zeit und Größe je Tag
+- Leser öffnen nur die Tage, die ihr Zeitfenster abdecken
+- Eine beim Absturz abgeschnittene letzte Zeile bleibt auf ihren Tag beschränkt
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from loguru import logger
+
+# --- Pfade & Defaults ---
+SCRIPT_DIR = Path(__file__).resolve().parent
+PARTITION_DIR = Path(os.environ.get("SENSOR_LOG_DIR") or SCRIPT_DIR / "sensor_log")
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "sensor_partitions.log"
+
+MANIFEST = "manifest.json"
+CURRENT_LINK = "current.csv"
+PREFIX = "sensor_"
+COMPRESS_AFTER_DAYS = 2   # gestern bleibt unkomprimiert (Controller lesen darüber hinweg)
+NAME_RE = re.compile(r"^sensor_(\d{4}-\d{2}-\d{2})\.csv(\.gz)?$")
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def partition_name(day: date, compressed: bool = False) -> str:
+    return f"{PREFIX}{day.isoformat()}.csv" + (".gz" if compressed else "")
+
+
+def _parse_ts(value: str) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+# ------------------------------ Manifest ------------------------------
+
+def load_manifest(directory) -> Dict[str, dict]:
+    try:
+        data = json.loads((Path(directory) / MANIFEST).read_text(encoding="utf-8"))
+        return dict(data.get("partitions") or {})
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Manifest in {directory} unlesbar ({e}) – nutze Dateiliste")
+        return {}
+
+
+def save_manifest(directory, partitions: Dict[str, dict]):
+    path = Path(directory) / MANIFEST
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps({"version": 1, "partitions": dict(sorted(partitions.items()))}, indent=1),
+                   encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def update_manifest(directory, day: str, **fields):
+    parts = load_manifest(directory)
+    parts.setdefault(day, {}).update(fields)
+    save_manifest(directory, parts)
+
+
+def scan(directory) -> Dict[str, str]:
+    """Tag → Dateiname laut Verzeichnis; liegt ein Tag doppelt vor, gewinnt die unkomprimierte Datei."""
+    found: Dict[str, str] = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return {}
+    for name in sorted(names):
+        m = NAME_RE.match(name)
+        if m and (m.group(1) not in found or not m.group(2)):
+            found[m.group(1)] = name
+    return found
+
+
+def _stats(path: Path) -> dict:
+    """Zeilen und Zeitbereich einer Datei (liest sie einmal vollständig)."""
+    rows, first, last = 0, None, None
+    with open_partition(path) as f:
+        next(f, None)
+        for line in f:
+            ts = _parse_ts(line.split(",", 1)[0])
+            if ts is None:
+                continue
+            rows += 1
+            first = ts if first is None else first
+            last = ts
+    return {"file": path.name, "rows": rows, "first_ts": first, "last_ts": last, "bytes": path.stat().st_size}
+
+
+def rebuild_manifest(directory) -> Dict[str, dict]:
+    directory = Path(directory)
+    today = date.today().isoformat()
+    parts = {}
+    for day, name in scan(directory).items():
+        parts[day] = dict(_stats(directory / name), closed=day < today)
+    save_manifest(directory, parts)
+    return parts
+
+
+# ------------------------------ Lesen ------------------------------
+
+def open_partition(path) -> io.TextIOBase:
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def current_partition(directory) -> Optional[str]:
+    """Pfad der jüngsten unkomprimierten Tagesdatei (die der Logger gerade beschreibt)."""
+    days = [d for d, name in scan(directory).items() if not name.endswith(".gz")]
+    return os.path.join(str(directory), partition_name(date.fromisoformat(max(days)))) if days else None
+
+
+def previous_partition(directory, path: str) -> Optional[str]:
+    """Die Tagesdatei vor `path` (komprimiert oder nicht)."""
+    m = NAME_RE.match(os.path.basename(path))
+    if not m:
+        return None
+    older = [(d, n) for d, n in scan(directory).items() if d < m.group(1)]
+    return os.path.join(str(directory), max(older)[1]) if older else None
+
+
+def partitions_for(directory, t_from: Optional[float] = None, t_to: Optional[float] = None) -> List[str]:
+    """Pfade der Tagesdateien, die [t_from, t_to) berühren, älteste zuerst."""
+    directory = Path(directory)
+    files = scan(directory)
+    manifest = load_manifest(directory)
+    d_from = date.fromtimestamp(t_from).isoformat() if t_from is not None else None
+    d_to = date.fromtimestamp(t_to).isoformat() if t_to is not None else None
+    out = []
+    for day, name in sorted(files.items()):
+        if (d_from and day < d_from) or (d_to and day > d_to):
+            continue
+        meta = manifest.get(day) or {}
+        # Manifest kennt den tatsächlichen Zeitbereich abgeschlossener Tage
+        if meta.get("closed") and meta.get("last_ts") is not None and t_from is not None and meta["last_ts"] < t_from:
+            continue
+        out.append(str(directory / name))
+    return out
+
+
+def iter_rows(directory, t_from: Optional[float] = None, t_to: Optional[float] = None,
+              columns: Optional[Sequence[str]] = None) -> Iterator[Tuple[float, Dict[str, str]]]:
+    """(Unix-Zeit, {Spalte: Text}) für alle Zeilen im Fenster; defekte Zeilen werden übersprungen."""
+    for path in partitions_for(directory, t_from, t_to):
+        try:
+            with open_partition(path) as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if not header:
+                    continue
+                wanted = [c for c in (columns or header) if c in header]
+                idx = [header.index(c) for c in wanted]
+                for parts in reader:
+                    if len(parts) != len(header):
+                        continue
+                    ts = _parse_ts(parts[0])
+                    if ts is None or (t_from is not None and ts < t_from) or (t_to is not None and ts >= t_to):
+                        continue
+                    yield ts, {c: parts[i] for c, i in zip(wanted, idx)}
+        except (OSError, EOFError) as e:
+            logger.warning(f"Tagesdatei {path} nicht lesbar: {e}")
+
+
+# ------------------------------ Schreiben ------------------------------
+
+class PartitionWriter:
+    """Schreibt Zeilen in die Datei des aktuellen lokalen Tages und rotiert um Mitternacht."""
+
+    def __init__(self, directory, header: Sequence[str], compress_after_days: Optional[int] = COMPRESS_AFTER_DAYS):
+        self.directory = Path(directory)
+        self.header = list(header)
+        self.compress_after_days = compress_after_days
+        self.day: Optional[date] = None
+        self.f = None
+        self.writer = None
+        self.rows = 0
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def path(self) -> Optional[Path]:
+        return self.directory / partition_name(self.day) if self.day else None
+
+    def _open(self, day: date):
+        self.close()
+        self.day = day
+        path = self.path
+        existed = path.is_file() and path.stat().st_size > 0
+        if existed:
+            st = _stats(path)
+            self.rows, self.first_ts, self.last_ts = st["rows"], st["first_ts"], st["last_ts"]
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        else:
+            self.rows, self.first_ts, self.last_ts = 0, None, None
+            torn = False
+        self.f = open(path, "a", newline="", encoding="utf-8")
+        if torn:
+            self.f.write("\n")  # abgeschnittene Zeile nach Absturz abschließen
+        self.writer = csv.writer(self.f)
+        if not existed:
+            self.writer.writerow(self.header)
+        self.f.flush()
+        link = self.directory / CURRENT_LINK
+        tmp = self.directory / (CURRENT_LINK + ".tmp")
+        try:
+            if tmp.is_symlink() or tmp.exists():
+                tmp.unlink()
+            tmp.symlink_to(path.name)
+            os.replace(tmp, link)
+        except OSError as e:
+            logger.warning(f"current.csv konnte nicht gesetzt werden: {e}")
+        update_manifest(self.directory, day.isoformat(), file=path.name, closed=False)
+        logger.info(f"Schreibe Sensordaten nach {path}")
+        if self.compress_after_days is not None:
+            compress_closed(self.directory, self.compress_after_days, today=day)
+
+    def write(self, row: Sequence, ts: Optional[float] = None):
+        """row ohne Zeitstempel; der ISO-Zeitstempel (lokal, mit Zone, ms) wird vorangestellt."""
+        ts = time.time() if ts is None else ts
+        now = datetime.fromtimestamp(ts).astimezone()
+        if self.day != now.date():
+            self._open(now.date())
+        self.writer.writerow([now.isoformat(timespec="milliseconds"), *row])
+        self.rows += 1
+        self.first_ts = ts if self.first_ts is None else self.first_ts
+        self.last_ts = ts
+
+    def flush(self):
+        if self.f:
+            self.f.flush()
+
+    def fileno(self) -> int:
+        return self.f.fileno()
+
+    def close(self):
+        if self.f is None:
+            return
+        try:
+            self.f.close()
+        except Exception:
+            pass
+        self.f = None
+        update_manifest(self.directory, self.day.isoformat(), file=self.path.name, rows=self.rows,
+                        first_ts=self.first_ts, last_ts=self.last_ts, bytes=self.path.stat().st_size,
+                        closed=self.day < date.today())
+
+
+def compress_closed(directory, after_days: int = COMPRESS_AFTER_DAYS, today: Optional[date] = None) -> int:
+    """Tagesdateien, die mindestens after_days alt sind, zu .csv.gz komprimieren."""
+    directory = Path(directory)
+    today = today or date.today()
+    limit = (today - timedelta(days=after_days)).isoformat()
+    n = 0
+    for day, name in scan(directory).items():
+        if name.endswith(".gz") or day > limit:
+            continue
+        src = directory / name
+        dst = directory / (name + ".gz")
+        tmp = directory / (name + ".gz.tmp")
+        try:
+            data = src.read_bytes()
+            with open(tmp, "wb") as raw:
+                with gzip.GzipFile(filename=name, mode="wb", fileobj=raw, compresslevel=6, mtime=0) as gz:
+                    gz.write(data)
+                raw.flush()
+                os.fsync(raw.fileno())
+            if gzip.decompress(tmp.read_bytes()) != data:
+                raise IOError("Prüfung nach dem Komprimieren fehlgeschlagen")
+            os.replace(tmp, dst)
+            src.unlink()
+        except Exception as e:
+            logger.error(f"Komprimieren von {src} fehlgeschlagen: {e}")
+            tmp.unlink(missing_ok=True)
+            continue
+        update_manifest(directory, day, file=dst.name, bytes=dst.stat().st_size, closed=True)
+        logger.info(f"{name} komprimiert ({len(data) // 1024} KiB → {dst.stat().st_size // 1024} KiB)")
+        n += 1
+    return n
+
+
+def split_legacy(csv_path, directory) -> int:
+    """Alte Einzeldatei (sensor_log.csv) in Tagesdateien aufteilen; vorhandene Tage werden ergänzt."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    n = 0
+    out, out_day, writer = None, None, None
+    with open(csv_path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return 0
+        for parts in reader:
+            if len(parts) != len(header):
+                continue
+            ts = _parse_ts(parts[0])
+            if ts is None:
+                continue
+            day = date.fromtimestamp(ts).isoformat()
+            if day != out_day:
+                if out:
+                    out.close()
+                path = directory / partition_name(date.fromisoformat(day))
+                new = not path.exists()
+                out = open(path, "a", newline="", encoding="utf-8")
+                writer = csv.writer(out)
+                if new:
+                    writer.writerow(header)
+                out_day = day
+            writer.writerow(parts)
+            n += 1
+    if out:
+        out.close()
+    rebuild_manifest(directory)
+    return n
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Tagesweise Sensor-CSV-Dateien verwalten")
+    ap.add_argument("command", choices=["list", "compress", "manifest", "split"])
+    ap.add_argument("--dir", default=str(PARTITION_DIR))
+    ap.add_argument("--after-days", type=int, default=COMPRESS_AFTER_DAYS)
+    ap.add_argument("--legacy", default=str(SCRIPT_DIR / "sensor_log.csv"), help="Einzeldatei für split")
+    args = ap.parse_args()
+    if args.command == "list":
+        manifest = load_manifest(args.dir)
+        for day, name in scan(args.dir).items():
+            meta = manifest.get(day, {})
+            print(f"{day}\t{name}\t{meta.get('rows', '?')}\t{meta.get('bytes', '?')}")
+    elif args.command == "compress":
+        logger.info(f"{compress_closed(args.dir, args.after_days)} Tagesdateien komprimiert")
+    elif args.command == "manifest":
+        logger.info(f"Manifest neu aufgebaut: {len(rebuild_manifest(args.dir))} Tage")
+    elif args.command == "split":
+        logger.info(f"{split_legacy(args.legacy, args.dir)} Zeilen aus {args.legacy} übernommen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+sensor_reader.py — Gemeinsamer, inkrementeller Leser für Sensor-CSV-Dateien
+- Erster Aufruf: liest nur das Dateiende (blockweise rückwärts), nie die ganze Datei
+- Danach: merkt sich den Byte-Offset und parst nur neu angehängte Zeilen
+- Hält die letzten Zeilen geparst in einem Ringpuffer (deque)
+- Fenster nach Anzahl (last n) oder Zeit (letzte n Sekunden), Aufwand O(Fenster)
+- Erkennt Rotation/Kürzung (kleinere Datei oder neue Inode) und beginnt neu
+- Mittelwerte sind zeitgewichtet (adaptives Messintervall, sensor_schedule.py)
+- Verzeichnis mit Tagesdateien (sensor_partitions.py): folgt dem Tageswechsel ohne den
+  Ringpuffer zu verlieren und füllt ihn beim Start aus dem Vortag auf
+"""
+from __future__ import annotations
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import sensor_partitions
+
+BLOCK_SIZE = 64 * 1024
+DEFAULT_CAPACITY = 20000  # bei 2 s Intervall gut 11 Stunden
+MAX_GAP_S = 60.0          # Gewicht einer Messung höchstens so lang (Lücken, Neustarts)
+
+# Eine Zeile: (Unix-Zeit, Werte in Spaltenreihenfolge ohne timestamp)
+Row = Tuple[float, List[float]]
+
+
+def parse_ts(value: str) -> float:
+    """ISO-8601 (mit oder ohne Zone) → Unix-Zeit; ohne Zone gilt lokale Zeit."""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return math.nan
+
+
+def weighted_mean(points: Iterable[Tuple[float, float]], max_gap: Optional[float] = MAX_GAP_S) -> Optional[float]:
+    """Zeitgewichteter Mittelwert aus zeitlich sortierten (ts, Wert).
+
+    Jeder Wert steht für die Zeit seit der Messung davor (wie die Rollups in sensor_store.py),
+    der erste für den Abstand zur zweiten. Bei festem Intervall ist das genau der
+    arithmetische Mittelwert; bei adaptivem Intervall zählen dicht gemessene Phasen
+    nicht mehr als dünn gemessene.
+    """
+    pts = [(t, v) for t, v in points if not math.isnan(v)]
+    if len(pts) < 2:
+        return pts[0][1] if pts else None
+    total = wsum = 0.0
+    for i, (t, v) in enumerate(pts):
+        w = (t - pts[i - 1][0]) if i > 0 else (pts[1][0] - t)
+        if max_gap is not None:
+            w = min(w, max_gap)
+        total += w
+        wsum += w * v
+    return wsum / total if total > 0 else sum(v for _, v in pts) / len(pts)
+
+
+def _float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+class SensorTail:
+    def __init__(self, path, capacity: int = DEFAULT_CAPACITY, ts_column: str = "timestamp"):
+        # Verzeichnis = tagesweise Dateien; self.path ist dann die gerade gelesene Tagesdatei
+        self.partition_dir = str(path) if os.path.isdir(path) else None
+        self.path = None if self.partition_dir else str(path)
+        self.capacity = capacity
+        self.ts_column = ts_column
+        self.header: List[str] = []
+        self.columns: Dict[str, int] = {}
+        self.rows: deque = deque(maxlen=capacity)
+        self.offset = 0
+        self.inode = None
+        self.lock = threading.Lock()
+
+    # ------------------------------ Einlesen ------------------------------
+
+    def _parse_line(self, line: bytes) -> Optional[Row]:
+        parts = line.decode("utf-8", "replace").rstrip("\r\n").split(",")
+        if len(parts) != len(self.header):
+            return None  # unvollständige/defekte Zeile
+        ts_idx = self.columns.get(self.ts_column, 0)
+        ts = parse_ts(parts[ts_idx])
+        if math.isnan(ts):
+            return None
+        return ts, [_float(p) if i != ts_idx else ts for i, p in enumerate(parts)]
+
+    def _load_tail(self, f, size: int, keep: bool = False):
+        """Header lesen und die letzten `capacity` Zeilen rückwärts vom Dateiende holen.
+
+        keep=True (Tageswechsel): Ring behalten und nur jüngere Zeilen anhängen.
+        """
+        f.seek(0)
+        first = f.readline()
+        self.header = first.decode("utf-8", "replace").strip().split(",")
+        self.columns = {name: i for i, name in enumerate(self.header)}
+        header_end = len(first)
+        pos = size
+        data = b""
+        while pos > header_end and data.count(b"\n") <= self.capacity:
+            step = min(BLOCK_SIZE, pos - header_end)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+        end = data.rfind(b"\n") + 1  # nur vollständige Zeilen
+        lines = data[:end].split(b"\n")
+        if pos > header_end:
+            lines = lines[1:]  # erste Zeile ist angeschnitten
+        newest = self.rows[-1][0] if keep and self.rows else None
+        if not keep:
+            self.rows.clear()
+        for line in lines[-self.capacity:]:
+            if line:
+                row = self._parse_line(line)
+                if row and (newest is None or row[0] > newest):
+                    self.rows.append(row)
+        self.offset = pos + end
+
+    def _seed_previous(self):
+        """Ring beim Start aus der vorherigen Tagesdatei auffüllen (kurz nach Mitternacht)."""
+        need = self.capacity - len(self.rows)
+        prev = sensor_partitions.previous_partition(self.partition_dir, self.path) if need > 0 else None
+        if not prev:
+            return
+        older: deque = deque(maxlen=need)
+        try:
+            with sensor_partitions.open_partition(prev) as f:
+                if f.readline().strip().split(",") != self.header:
+                    return  # anderes Spaltenlayout → nicht mischen
+                first = self.rows[0][0] if self.rows else math.inf
+                for line in f:
+                    row = self._parse_line(line.encode("utf-8"))
+                    if row and row[0] < first:
+                        older.append(row)
+        except (OSError, EOFError):
+            return
+        self.rows = deque([*older, *self.rows], maxlen=self.capacity)
+
+    def _switch_partition(self) -> bool:
+        """Auf die aktuelle Tagesdatei wechseln; liefert True, wenn sich die Datei geändert hat."""
+        current = sensor_partitions.current_partition(self.partition_dir)
+        if current is None or current == self.path:
+            return False
+        if self.path is not None and self.header:
+            self._read_appended()  # Rest des alten Tages übernehmen
+        first = self.path is None
+        self.path = current
+        try:
+            with open(current, "rb") as f:
+                st = os.fstat(f.fileno())
+                self.inode = st.st_ino
+                self._load_tail(f, st.st_size, keep=not first)
+        except FileNotFoundError:
+            return False
+        if first:
+            self._seed_previous()
+        return True
+
+    def _read_appended(self) -> int:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= self.offset:
+                return 0
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        end = data.rfind(b"\n") + 1
+        n = 0
+        for line in data[:end].split(b"\n"):
+            if line:
+                row = self._parse_line(line)
+                if row:
+                    self.rows.append(row)
+                    n += 1
+        self.offset += end
+        return n
+
+    def refresh(self) -> int:
+        """Neue Zeilen seit dem letzten Aufruf übernehmen; liefert deren Anzahl."""
+        with self.lock:
+            if self.partition_dir and self._switch_partition():
+                return len(self.rows)
+            if self.path is None:
+                return 0
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                if self.partition_dir:
+                    return 0  # Tagesdatei wurde gerade komprimiert; nächster Aufruf wechselt
+                self.rows.clear()
+                self.offset, self.inode = 0, None
+                return 0
+            with f:
+                st = os.fstat(f.fileno())
+                if st.st_ino != self.inode or st.st_size < self.offset or not self.header:
+                    self.inode = st.st_ino
+                    self._load_tail(f, st.st_size)
+                    return len(self.rows)
+            return self._read_appended()
+
+    # ------------------------------ Abfragen ------------------------------
+
+    def has_column(self, column: str) -> bool:
+        return column in self.columns
+
+    def last(self, n: int) -> List[Row]:
+        """Die letzten n Zeilen (älteste zuerst)."""
+        self.refresh()
+        n = max(0, min(n, len(self.rows)))
+        return [self.rows[i] for i in range(len(self.rows) - n, len(self.rows))]
+
+    def since(self, seconds: float, now: Optional[float] = None) -> List[Row]:
+        """Alle Zeilen der letzten `seconds` Sekunden (bezogen auf now bzw. die Uhrzeit)."""
+        self.refresh()
+        cutoff = (time.time() if now is None else now) - seconds
+        # Zeilen sind zeitlich sortiert → Startindex per Bisektion über die deque
+        lo, hi = 0, len(self.rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.rows[mid][0] < cutoff:
+                lo = mid + 1
+            else:
+                hi = mid
+        return [self.rows[i] for i in range(lo, len(self.rows))]
+
+    def window(self, n: Optional[int] = None, seconds: Optional[float] = None) -> List[Row]:
+        return self.since(seconds) if seconds is not None else self.last(n or 1)
+
+    def values(self, column: str, n: Optional[int] = None, seconds: Optional[float] = None) -> List[float]:
+        """Gültige (nicht-NaN) Werte einer Spalte im Fenster."""
+        rows = self.window(n, seconds)  # liest bei Bedarf auch erst den Header
+        idx = self.columns.get(column)
+        if idx is None:
+            return []
+        return [r[1][idx] for r in rows if not math.isnan(r[1][idx])]
+
+    def points(self, column: str, n: Optional[int] = None, seconds: Optional[float] = None) -> List[Tuple[float, float]]:
+        """(ts, Wert) einer Spalte im Fenster."""
+        rows = self.window(n, seconds)
+        idx = self.columns.get(column)
+        if idx is None:
+            return []
+        return [(r[0], r[1][idx]) for r in rows]
+
+    def mean(self, column: str, n: Optional[int] = None, seconds: Optional[float] = None) -> Optional[float]:
+        return weighted_mean(self.points(column, n, seconds))
+
+    def latest(self, columns: Sequence[str]) -> Optional[Tuple[float, ...]]:
+        """Werte der jüngsten Zeile für die gegebenen Spalten."""
+        rows = self.last(1)
+        if not rows or any(c not in self.columns for c in columns):
+            return None
+        return tuple(rows[0][1][self.columns[c]] for c in columns)
+
+
+_tails: Dict[str, SensorTail] = {}
+_tails_lock = threading.Lock()
+
+
+def get_tail(path, capacity: int = DEFAULT_CAPACITY) -> SensorTail:
+    """Eine SensorTail-Instanz pro Datei und Prozess (Offset/Ring bleiben zwischen Aufrufen erhalten)."""
+    key = os.path.abspath(str(path))
+    with _tails_lock:
+        tail = _tails.get(key)
+        if tail is None or tail.capacity < capacity:
+            tail = _tails[key] = SensorTail(key, capacity)
+        return tail
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+sensor_schedule.py — Adaptives Messintervall für sensor_logger.py
+- Schnell, wenn sich log10(Lux) schnell ändert (Dämmerung) oder der Wert nahe einer
+  Preset-/Astro-Schwelle liegt; langsam, wenn das Licht stabil ist
+- Steigung als geglätteter Betrag von d(log10 Lux)/dt in Dekaden pro Minute
+- Kürzer werden sofort, länger werden nur schrittweise (Faktor GROW je Messung)
+- Schwellen aus der Konfiguration oder automatisch aus lux_control.json / lux_exposured.json
+"""
+from __future__ import annotations
+import json
+import math
+from pathlib import Path
+from typing import List, Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+DEFAULTS = {
+    "enabled": True,
+    "min_interval_s": 1.0,
+    "max_interval_s": 10.0,
+    "slope_fast": 0.3,       # Dekaden/min → kürzestes Intervall
+    "slope_slow": 0.01,      # Dekaden/min → längstes Intervall
+    "threshold_band": 0.1,   # Abstand in Dekaden, ab dem eine Schwelle als „nah“ gilt
+    "smoothing": 0.3,        # EMA-Gewicht der neuen Steigung
+    "thresholds_lux": None,  # None = aus den Regler-Konfigurationen lesen
+}
+GROW = 1.5
+LUX_NOISE = 0.01             # Sockel vor log10: Sensorrauschen nachts zählt nicht als „schnelle Änderung“
+
+
+def _load(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def controller_thresholds(script_dir: Path = SCRIPT_DIR) -> List[float]:
+    """Lux-Grenzen, an denen die Regler umschalten (Preset-Mappings, Astro-Modus)."""
+    out = []
+    for m in _load(script_dir / "lux_control.json").get("mappings", []) or []:
+        for k in ("min_lux", "max_lux"):
+            try:
+                out.append(float(m[k]))
+            except (KeyError, TypeError, ValueError):
+                pass
+    ctl = _load(script_dir / "lux_exposured.json")
+    for k in ("astro_enter_lux", "astro_exit_lux"):
+        if ctl.get(k) is not None:
+            out.append(float(ctl[k]))
+    return sorted({v for v in out if v > 0 and math.isfinite(v)})
+
+
+class AdaptiveScheduler:
+    def __init__(self, config: Optional[dict] = None, fallback_interval_s: float = 2.0):
+        cfg = dict(DEFAULTS, **(config or {}))
+        self.enabled = bool(cfg["enabled"])
+        self.fixed = float(fallback_interval_s)
+        self.min_s = float(cfg["min_interval_s"])
+        self.max_s = max(self.min_s, float(cfg["max_interval_s"]))
+        self.slope_fast = float(cfg["slope_fast"])
+        self.slope_slow = max(1e-6, min(float(cfg["slope_slow"]), self.slope_fast))
+        self.band = float(cfg["threshold_band"])
+        self.alpha = float(cfg["smoothing"])
+        th = cfg["thresholds_lux"]
+        self.thresholds_lux = sorted(float(t) for t in (th if th is not None else controller_thresholds()))
+        self.thresholds = [math.log10(t + LUX_NOISE) for t in self.thresholds_lux]
+        self.slope = 0.0
+        self.interval = self.fixed if not self.enabled else min(max(self.fixed, self.min_s), self.max_s)
+        self.last: Optional[tuple] = None
+        self.reason = "start"
+
+    def _near_threshold(self, log_lux: float) -> bool:
+        return any(abs(log_lux - t) <= self.band for t in self.thresholds)
+
+    def update(self, ts: float, lux: float) -> float:
+        """Neue Messung einrechnen; liefert das Intervall bis zur nächsten Messung."""
+        if not self.enabled:
+            return self.fixed
+        if lux is None or not math.isfinite(lux):
+            self.reason = "kein Lux"
+            return self.interval
+        y = math.log10(max(lux, 0.0) + LUX_NOISE)
+        if self.last is not None and ts > self.last[0]:
+            inst = abs(y - self.last[1]) / (ts - self.last[0]) * 60.0
+            self.slope = self.alpha * inst + (1.0 - self.alpha) * self.slope
+        self.last = (ts, y)
+        if self._near_threshold(y):
+            target, self.reason = self.min_s, "Schwelle"
+        elif self.slope >= self.slope_fast or self.slope_fast <= self.slope_slow:
+            target, self.reason = self.min_s, "Änderung"
+        elif self.slope <= self.slope_slow:
+            target, self.reason = self.max_s, "stabil"
+        else:
+            # log-lineare Interpolation zwischen langsam und schnell
+            f = (math.log(self.slope) - math.log(self.slope_slow)) / (math.log(self.slope_fast) - math.log(self.slope_slow))
+            target = math.exp(math.log(self.max_s) + f * (math.log(self.min_s) - math.log(self.max_s)))
+            self.reason = "Übergang"
+        self.interval = target if target < self.interval else min(target, self.interval * GROW)
+        return self.interval
+
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+sensor_store.py — Kompakter Zeitreihen-Speicher für Sensorwerte (SQLite)
+- Rohdaten: eine Zeile pro Messung, Werte als float32-Block fester Breite (kein CSV-Text)
+- Rollups 1 min und 1 h (Anzahl/Min/Summe/Max je Spalte) werden beim Schreiben nachgeführt
+- Rollup-Mittelwerte sind zeitgewichtet (adaptives Messintervall): jede Messung zählt
+  mit dem Abstand zur vorherigen (höchstens MAX_GAP_S)
+- Aufbewahrung je Stufe (z. B. Rohdaten 14 Tage, 1 min 180 Tage, 1 h unbegrenzt)
+- Abfragen wählen die feinste Stufe, die für den Zeitraum höchstens max_points Punkte liefert
+- Import bestehender sensor_log.csv-Dateien (gestreamt, in Transaktionen zu je 5000 Zeilen)
+- Nutzt Loguru für robustes Logging
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from loguru import logger
+
+# --- Pfade & Defaults ---
+DB_PATH = os.environ.get("SENSOR_DB_PATH") or "/mnt/hdd/timelapse/sensors.sqlite"
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "sensor_store.log"
+
+# Stufe → Bucket-Breite in Sekunden (raw = einzelne Messungen)
+TIERS = {"raw": None, "1m": 60, "1h": 3600}
+DEFAULT_RETENTION_DAYS = {"raw": 14, "1m": 180, "1h": None}  # None = unbegrenzt
+DEFAULT_INTERVAL_S = 2.0   # Messintervall für die Abschätzung der Punktzahl im Roh-Tier
+PRUNE_EVERY_S = 3600
+IMPORT_BATCH = 5000
+MAX_GAP_S = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id   INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS layouts (
+    id      INTEGER PRIMARY KEY,
+    columns TEXT UNIQUE NOT NULL          -- JSON-Liste der Series-IDs in Blockreihenfolge
+);
+CREATE TABLE IF NOT EXISTS raw (
+    ts_ms  INTEGER PRIMARY KEY,
+    layout INTEGER NOT NULL,
+    data   BLOB NOT NULL                  -- float32 little-endian, eine Zahl pro Spalte
+);
+CREATE TABLE IF NOT EXISTS rollup (
+    tier   INTEGER NOT NULL,              -- Bucket-Breite in Sekunden
+    bucket INTEGER NOT NULL,              -- Bucket-Beginn (Unix-Sekunden)
+    series INTEGER NOT NULL,
+    n      INTEGER NOT NULL,
+    vmin   REAL NOT NULL,
+    vmax   REAL NOT NULL,
+    vsum   REAL NOT NULL,
+    wsum   REAL NOT NULL DEFAULT 0,       -- Σ Gewicht·Wert (Gewicht = Sekunden seit der Messung davor)
+    wtime  REAL NOT NULL DEFAULT 0,       -- Σ Gewicht
+    PRIMARY KEY (tier, series, bucket)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO rollup(tier, bucket, series, n, vmin, vmax, vsum, wsum, wtime) VALUES (?,?,?,?,?,?,?,?,?)
+ON CONFLICT(tier, series, bucket) DO UPDATE SET
+    n = n + excluded.n,
+    vmin = min(vmin, excluded.vmin),
+    vmax = max(vmax, excluded.vmax),
+    vsum = vsum + excluded.vsum,
+    wsum = wsum + excluded.wsum,
+    wtime = wtime + excluded.wtime
+"""
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def _pack(values: Sequence[float]) -> bytes:
+    a = array("f", values)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a.tobytes()
+
+
+def _unpack(data: bytes) -> array:
+    a = array("f")
+    a.frombytes(data)
+    if sys.byteorder != "little":
+        a.byteswap()
+    return a
+
+
+class SensorStore:
+    def __init__(self, db_path: str = DB_PATH, retention_days: Optional[Dict[str, Optional[float]]] = None,
+                 interval_s: float = DEFAULT_INTERVAL_S):
+        self.db_path = db_path
+        self.retention_days = dict(DEFAULT_RETENTION_DAYS, **(retention_days or {}))
+        self.interval_s = interval_s
+        self.lock = threading.Lock()
+        self._series: Dict[str, int] = {}
+        self._layouts: Dict[Tuple[int, ...], int] = {}
+        self._layout_cols: Dict[int, List[int]] = {}
+        self._last_prune = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.con = self.connect()
+        self.con.executescript(SCHEMA)
+        cols = {r[1] for r in self.con.execute("PRAGMA table_info(rollup)")}
+        for col in ("wsum", "wtime"):
+            if col not in cols:  # Datenbank von vor der Zeitgewichtung
+                self.con.execute(f"ALTER TABLE rollup ADD COLUMN {col} REAL NOT NULL DEFAULT 0")
+        self._load_meta()
+        row = self.con.execute("SELECT MAX(ts_ms) FROM raw").fetchone()
+        self._prev_ts: Optional[float] = row[0] / 1000.0 if row and row[0] else None
+
+    def connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def close(self):
+        with self.lock:
+            self.con.close()
+
+    def _load_meta(self):
+        """Spalten und Layouts aus der Datenbank lesen – auch neu, wenn ein anderer Prozess
+        (sensor_logger.py) seit dem Öffnen welche angelegt hat."""
+        self._series = {name: i for i, name in self.con.execute("SELECT id, name FROM series")}
+        for lid, cols in self.con.execute("SELECT id, columns FROM layouts"):
+            ids = json.loads(cols)
+            self._layouts[tuple(ids)] = lid
+            self._layout_cols[lid] = ids
+
+    def _series_id(self, name: str) -> int:
+        sid = self._series.get(name)
+        if sid is None:
+            self.con.execute("INSERT OR IGNORE INTO series(name) VALUES (?)", (name,))
+            sid = self.con.execute("SELECT id FROM series WHERE name=?", (name,)).fetchone()[0]
+            self._series[name] = sid
+        return sid
+
+    def _layout_id(self, ids: Tuple[int, ...]) -> int:
+        lid = self._layouts.get(ids)
+        if lid is None:
+            key = json.dumps(list(ids))
+            self.con.execute("INSERT OR IGNORE INTO layouts(columns) VALUES (?)", (key,))
+            lid = self.con.execute("SELECT id FROM layouts WHERE columns=?", (key,)).fetchone()[0]
+            self._layouts[ids] = lid
+            self._layout_cols[lid] = list(ids)
+        return lid
+
+    # ------------------------------ Schreiben ------------------------------
+
+    def _insert(self, rows: Iterable[Tuple[float, Dict[str, float]]]) -> int:
+        """Zeilen (Unix-Zeit, {Spalte: Wert}) in der laufenden Transaktion ablegen."""
+        agg: Dict[Tuple[int, int, int], List[float]] = {}
+        n_new = 0
+        for ts, values in rows:
+            names = sorted(values)
+            ids = tuple(self._series_id(n) for n in names)
+            vals = [float(values[n]) for n in names]
+            cur = self.con.execute("INSERT OR IGNORE INTO raw(ts_ms, layout, data) VALUES (?,?,?)",
+                                   (int(round(ts * 1000)), self._layout_id(ids), _pack(vals)))
+            if cur.rowcount != 1:
+                continue  # Zeitstempel schon vorhanden (z. B. erneuter Import) → Rollups nicht doppelt zählen
+            n_new += 1
+            gap = ts - self._prev_ts if self._prev_ts is not None and ts > self._prev_ts else self.interval_s
+            weight = min(gap, MAX_GAP_S)
+            if self._prev_ts is None or ts > self._prev_ts:
+                self._prev_ts = ts
+            for sid, v in zip(ids, vals):
+                if math.isnan(v) or math.isinf(v):
+                    continue
+                for step in TIERS.values():
+                    if step is None:
+                        continue
+                    key = (step, int(ts // step) * step, sid)
+                    a = agg.get(key)
+                    if a is None:
+                        agg[key] = [1, v, v, v, weight * v, weight]
+                    else:
+                        a[0] += 1
+                        a[1] = min(a[1], v)
+                        a[2] = max(a[2], v)
+                        a[3] += v
+                        a[4] += weight * v
+                        a[5] += weight
+        self.con.executemany(UPSERT_ROLLUP, [(step, bucket, sid, *a) for (step, bucket, sid), a in agg.items()])
+        return n_new
+
+    def append(self, ts: float, values: Dict[str, float]) -> int:
+        return self.append_many([(ts, values)])
+
+    def append_many(self, rows: Sequence[Tuple[float, Dict[str, float]]]) -> int:
+        """Mehrere Messungen in einer Transaktion schreiben; liefert die Zahl neuer Zeilen."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self.lock:
+            with self.con:
+                n = self._insert(rows)
+        if time.time() - self._last_prune > PRUNE_EVERY_S:
+            self.prune()
+        return n
+
+    def prune(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Alles jenseits der Aufbewahrung je Stufe löschen."""
+        now = time.time() if now is None else now
+        stats = {}
+        with self.lock:
+            with self.con:
+                for tier, step in TIERS.items():
+                    days = self.retention_days.get(tier)
+                    if days is None:
+                        continue
+                    cutoff = now - float(days) * 86400
+                    if step is None:
+                        cur = self.con.execute("DELETE FROM raw WHERE ts_ms < ?", (int(cutoff * 1000),))
+                    else:
+                        cur = self.con.execute("DELETE FROM rollup WHERE tier=? AND bucket < ?", (step, cutoff))
+                    stats[tier] = cur.rowcount
+            self._last_prune = now
+        if any(stats.values()):
+            logger.info(f"Sensor-Speicher bereinigt: {stats}")
+        return stats
+
+    # ------------------------------ Lesen ------------------------------
+
+    def columns(self) -> List[str]:
+        return sorted(self._series)
+
+    def pick_tier(self, t_from: float, t_to: float, max_points: int = 2000, now: Optional[float] = None) -> str:
+        """Feinste Stufe, die den Zeitraum noch enthält und höchstens max_points Punkte liefert."""
+        now = time.time() if now is None else now
+        span = max(0.0, t_to - t_from)
+        for tier, step in TIERS.items():
+            days = self.retention_days.get(tier)
+            if days is not None and t_from < now - float(days) * 86400:
+                continue
+            if span / (step or self.interval_s) <= max_points:
+                return tier
+        return list(TIERS)[-1]
+
+    def query(self, columns: Sequence[str], t_from: float, t_to: float, tier: str = "auto",
+              max_points: int = 2000) -> dict:
+        """Zeitreihen für [t_from, t_to).
+
+        Ergebnis: {"tier", "step", "ts": [...], "series": {Spalte: {"mean", "min", "max"}}};
+        im Roh-Tier sind mean/min/max dieselbe Liste.
+        """
+        if tier == "auto":
+            tier = self.pick_tier(t_from, t_to, max_points)
+        if tier not in TIERS:
+            raise ValueError(f"Unbekannte Stufe: {tier}")
+        step = TIERS[tier]
+        if any(c not in self._series for c in columns):
+            with self.lock:
+                self._load_meta()
+        cols = [c for c in columns if c in self._series]
+        out = {"tier": tier, "step": step, "ts": [], "series": {}}
+        if step is None:
+            ts_list: List[float] = []
+            vals: Dict[str, List[float]] = {c: [] for c in cols}
+            with self.lock:
+                cur = self.con.execute("SELECT ts_ms, layout, data FROM raw WHERE ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms",
+                                       (int(t_from * 1000), int(t_to * 1000)))
+                pos_cache: Dict[int, List[Optional[int]]] = {}
+                for ts_ms, lid, data in cur:
+                    pos = pos_cache.get(lid)
+                    if pos is None:
+                        if lid not in self._layout_cols:
+                            self._load_meta()
+                        order = {sid: i for i, sid in enumerate(self._layout_cols[lid])}
+                        pos = pos_cache[lid] = [order.get(self._series[c]) for c in cols]
+                    a = _unpack(data)
+                    ts_list.append(ts_ms / 1000.0)
+                    for c, i in zip(cols, pos):
+                        vals[c].append(a[i] if i is not None else math.nan)
+            out["ts"] = ts_list
+            out["series"] = {c: {"mean": v, "min": v, "max": v} for c, v in vals.items()}
+            return out
+        lo, hi = int(t_from // step) * step, t_to
+        buckets: Dict[int, Dict[str, tuple]] = {}
+        with self.lock:
+            for c in cols:
+                for bucket, n, vmin, vmax, vsum, wsum, wtime in self.con.execute(
+                        "SELECT bucket, n, vmin, vmax, vsum, wsum, wtime FROM rollup "
+                        "WHERE tier=? AND series=? AND bucket >= ? AND bucket < ? ORDER BY bucket",
+                        (step, self._series[c], lo, hi)):
+                    mean = wsum / wtime if wtime > 0 else vsum / n
+                    buckets.setdefault(bucket, {})[c] = (mean, vmin, vmax)
+        keys = sorted(buckets)
+        out["ts"] = [float(b) for b in keys]
+        for c in cols:
+            rows = [buckets[b].get(c, (math.nan,) * 3) for b in keys]
+            out["series"][c] = {"mean": [r[0] for r in rows], "min": [r[1] for r in rows], "max": [r[2] for r in rows]}
+        return out
+
+    def mean(self, column: str, seconds: float, now: Optional[float] = None) -> Optional[float]:
+        """Zeitgewichteter Mittelwert der letzten `seconds` Sekunden aus den Rohdaten."""
+        from sensor_reader import weighted_mean
+        now = time.time() if now is None else now
+        res = self.query([column], now - seconds, now + 1, tier="raw")
+        return weighted_mean(zip(res["ts"], res["series"].get(column, {}).get("mean", [])), MAX_GAP_S)
+
+    def latest(self, columns: Sequence[str]) -> Optional[Tuple[float, Dict[str, float]]]:
+        with self.lock:
+            row = self.con.execute("SELECT ts_ms, layout, data FROM raw ORDER BY ts_ms DESC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        ts_ms, lid, data = row
+        if lid not in self._layout_cols or any(c not in self._series for c in columns):
+            with self.lock:
+                self._load_meta()
+        a = _unpack(data)
+        order = {sid: i for i, sid in enumerate(self._layout_cols[lid])}
+        res = {}
+        for c in columns:
+            i = order.get(self._series.get(c, -1))
+            res[c] = a[i] if i is not None else math.nan
+        return ts_ms / 1000.0, res
+
+    def stats(self) -> dict:
+        with self.lock:
+            raw_n, first, last = self.con.execute("SELECT COUNT(*), MIN(ts_ms), MAX(ts_ms) FROM raw").fetchone()
+            tiers = {f"{step // 60}m" if step < 3600 else f"{step // 3600}h": n
+                     for step, n in self.con.execute("SELECT tier, COUNT(*) FROM rollup GROUP BY tier")}
+        return {"raw": raw_n, "first_ts": first / 1000.0 if first else None,
+                "last_ts": last / 1000.0 if last else None, "rollups": tiers,
+                "bytes": os.path.getsize(self.db_path)}
+
+    # ------------------------------ Import ------------------------------
+
+    def import_csv(self, path) -> int:
+        """Bestehende Sensor-CSV übernehmen (Zeitstempel ISO-8601, übrige Spalten numerisch)."""
+        from sensor_reader import parse_ts
+        total = 0
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header:
+                return 0
+            ts_idx = header.index("timestamp") if "timestamp" in header else 0
+            batch = []
+            for parts in reader:
+                if len(parts) != len(header):
+                    continue
+                ts = parse_ts(parts[ts_idx])
+                if math.isnan(ts):
+                    continue
+                values = {}
+                for i, name in enumerate(header):
+                    if i == ts_idx:
+                        continue
+                    try:
+                        values[name] = float(parts[i])
+                    except ValueError:
+                        values[name] = math.nan
+                batch.append((ts, values))
+                if len(batch) >= IMPORT_BATCH:
+                    total += self.append_many(batch)
+                    batch = []
+            total += self.append_many(batch)
+        return total
+
+
+def load_retention(config_path) -> Dict[str, Optional[float]]:
+    """Aufbewahrung je Stufe aus sensor_config.json ("store_retention_days")."""
+    try:
+        cfg = json.loads(Path(config_path).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    return dict(cfg.get("store_retention_days") or {})
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Sensor-Zeitreihenspeicher (Rohdaten + Rollups)")
+    ap.add_argument("command", choices=["import", "prune", "stats", "query"])
+    ap.add_argument("paths", nargs="*", help="CSV-Dateien für import")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--config", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_config.json"))
+    ap.add_argument("--column", action="append", default=[], help="Spalte für query (mehrfach möglich)")
+    ap.add_argument("--hours", type=float, default=24.0, help="Zeitraum für query")
+    ap.add_argument("--tier", default="auto", choices=["auto", *TIERS])
+    args = ap.parse_args()
+    store = SensorStore(args.db, load_retention(args.config))
+    if args.command == "import":
+        for p in args.paths:
+            t0 = time.monotonic()
+            n = store.import_csv(p)
+            logger.info(f"{p}: {n} Zeilen übernommen ({time.monotonic() - t0:.1f} s)")
+    elif args.command == "prune":
+        store.prune()
+    elif args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.command == "query":
+        now = time.time()
+        res = store.query(args.column or store.columns(), now - args.hours * 3600, now, args.tier)
+        print(json.dumps({"tier": res["tier"], "points": len(res["ts"]),
+                          "series": {c: s["mean"][-5:] for c, s in res["series"].items()}}, indent=2))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+status_block.py — Status der Aufnahme als fester Block im Shared Memory
+- Ersetzt das ständige Neuschreiben von web/status.json (SD-Karte, halbe Dateien)
+- Feste Binärstruktur in einer mmap-Datei unter /dev/shm (RAM, kein Flash-Verschleiß)
+- Seqlock: Schreiber macht seq ungerade → schreibt → seq gerade; Leser wiederholt,
+  bis er zweimal dieselbe gerade seq gesehen hat → immer ein konsistenter Stand
+- Mehrere Schreiber (main.py, Web-App) werden per flock serialisiert, Leser sperren nie
+  und öffnen nur lesend; fehlt der Block oder das Leserecht, gibt es keinen Status (None)
+"""
+from __future__ import annotations
+import fcntl
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from typing import Optional
+
+STATUS_SHM = os.environ.get("TL_STATUS_SHM") or "/dev/shm/timelapse_status"
+
+MAGIC = b"TLST"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHQ")           # magic, version, reserved, seq
+_BODY = struct.Struct("<B16sqdddd256s512s")  # running, mode, current_shot, last_time, start_time,
+                                             # last_testshot, updated, error, last_file
+SIZE = _HEADER.size + _BODY.size
+_SEQ_OFFSET = 8
+_SEQ = struct.Struct("<Q")
+READ_RETRIES = 100
+
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+DEFAULT_STATUS = {"running": False, "mode": "timelapse", "current_shot": 0, "last_file": "", "last_time": "", "error": ""}
+
+
+def _to_epoch(value) -> float:
+    if not value:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.strptime(value, TIME_FMT).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _fmt_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime(TIME_FMT) if ts else ""
+
+
+def _enc(value, size: int) -> bytes:
+    return (str(value) if value else "").encode("utf-8", "replace")[:size]
+
+
+def _dec(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+class StatusBlock:
+    def __init__(self, path: str = STATUS_SHM):
+        self.path = path
+        self.fd = None
+        self.mm = None
+        self.writable = False
+
+    def _open(self, create: bool) -> bool:
+        """Leser öffnen nur lesend (der Block gehört evtl. einem anderen Benutzer);
+        Schreiber öffnen/legen an und mappen beschreibbar."""
+        if self.mm is not None and (self.writable or not create):
+            return True
+        self.close()
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT if create else os.O_RDONLY, 0o664)
+        except OSError:
+            if create:
+                raise
+            return False
+        try:
+            if os.fstat(fd).st_size < SIZE:
+                if not create:
+                    os.close(fd)
+                    return False
+                os.ftruncate(fd, SIZE)
+            self.mm = mmap.mmap(fd, SIZE, prot=mmap.PROT_READ | mmap.PROT_WRITE if create else mmap.PROT_READ)
+        except OSError:
+            os.close(fd)
+            if create:
+                raise
+            return False
+        self.fd = fd
+        self.writable = create
+        return True
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            os.close(self.fd)
+            self.mm = self.fd = None
+            self.writable = False
+
+    # ------------------------------ Lesen ------------------------------
+
+    def seq(self) -> int:
+        """Aktuelle Sequenznummer (0 = Block existiert noch nicht)."""
+        if not self._open(False):
+            return 0
+        return _SEQ.unpack_from(self.mm, _SEQ_OFFSET)[0]
+
+    def read(self) -> Optional[dict]:
+        """Konsistenter Schnappschuss oder None, wenn (noch) kein Status veröffentlicht wurde."""
+        if not self._open(False):
+            return None
+        for _ in range(READ_RETRIES):
+            magic, version, _r, s1 = _HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or version != VERSION:
+                return None
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            body = self.mm[_HEADER.size:SIZE]
+            if _SEQ.unpack_from(self.mm, _SEQ_OFFSET)[0] == s1:
+                break
+        else:
+            return None
+        running, mode, shot, last_t, start_t, test_t, updated, error, last_file = _BODY.unpack(body)
+        st = {
+            "running": bool(running),
+            "mode": _dec(mode),
+            "current_shot": shot,
+            "last_file": _dec(last_file),
+            "last_time": _fmt_time(last_t),
+            "error": _dec(error),
+            "updated": updated,
+        }
+        if start_t:
+            st["start_time"] = _fmt_time(start_t)
+        if test_t:
+            st["last_testshot"] = _fmt_time(test_t)
+        return st
+
+    # ------------------------------ Schreiben ------------------------------
+
+    def write(self, status: dict):
+        """Kompletten Status veröffentlichen (Felder wie in status.json)."""
+        self._open(True)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            self._write_locked(status)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def update(self, **fields) -> dict:
+        """Einzelne Felder ändern, den Rest übernehmen (atomar gegenüber anderen Schreibern)."""
+        self._open(True)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            st = self.read() or dict(DEFAULT_STATUS)
+            st.update(fields)
+            self._write_locked(st)
+            return st
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _write_locked(self, status: dict):
+        magic, version, _r, seq = _HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            seq = 0
+            _HEADER.pack_into(self.mm, 0, MAGIC, VERSION, 0, seq)
+        seq += 1 if seq % 2 == 0 else 0
+        _SEQ.pack_into(self.mm, _SEQ_OFFSET, seq)  # ungerade: Schreiben läuft
+        _BODY.pack_into(
+            self.mm, _HEADER.size,
+            1 if status.get("running") else 0,
+            _enc(status.get("mode", "timelapse"), 16),
+            int(status.get("current_shot") or 0),
+            _to_epoch(status.get("last_time")),
+            _to_epoch(status.get("start_time")),
+            _to_epoch(status.get("last_testshot")),
+            time.time(),
+            _enc(status.get("error"), 256),
+            _enc(status.get("last_file"), 512),
+        )
+        _SEQ.pack_into(self.mm, _SEQ_OFFSET, seq + 1)  # gerade: Stand ist konsistent
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+tl_config.py — Gemeinsamer Zugriff der Regler auf config_tl.json
+- cfg_lock(): prozessübergreifende Schreibsperre (/tmp/tlcfg.lock, flock)
+- ConfigView: liest eine JSON-Datei nur neu, wenn sich mtime/Größe geändert haben;
+  update()/replace() schreiben unter der Sperre atomar auf den frisch geladenen Stand
+  und halten die Sicht ohne erneutes Lesen aktuell
+- Eine Sicht kann von mehreren Reglern geteilt werden (controller_host.py)
+"""
+from __future__ import annotations
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+LOCK_PATH = "/tmp/tlcfg.lock"
+
+
+@contextmanager
+def cfg_lock():
+    fd = os.open(LOCK_PATH, os.O_CREAT | os.O_RDWR, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _stat_key(path: Path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class ConfigView:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self._key = None
+        self._data: Dict[str, Any] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Konnte {self.path} nicht lesen: {e}")
+            return dict(self._data)   # halb geschriebene Datei: letzten guten Stand behalten
+        self.reads += 1
+        return data if isinstance(data, dict) else {}
+
+    def get(self) -> Dict[str, Any]:
+        """Aktueller Inhalt (Kopie); liest die Datei nur, wenn sie sich geändert hat."""
+        with self.lock:
+            key = _stat_key(self.path)
+            if key != self._key:
+                self._data, self._key = self._load(), key
+            return dict(self._data)
+
+    def replace(self, fn: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> bool:
+        """fn bekommt den frisch gelesenen Stand und liefert den neuen (None = nichts schreiben)."""
+        with self.lock:
+            with cfg_lock():
+                self._key = _stat_key(self.path)
+                self._data = self._load()
+                new = fn(dict(self._data))
+                if new is None:
+                    return False
+                try:
+                    tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+                    tmp.write_text(json.dumps(new, indent=2, ensure_ascii=False), encoding="utf-8")
+                    tmp.replace(self.path)
+                except Exception:
+                    logger.exception(f"Konnte {self.path} nicht speichern")
+                    return False
+                self._data, self._key = new, _stat_key(self.path)
+                self.writes += 1
+                return True
+
+    def update(self, changes: Dict[str, Any]) -> bool:
+        """Einzelne Schlüssel setzen, der Rest der Datei bleibt wie er gerade ist."""
+        return self.replace(lambda cur: {**cur, **changes})
@@ -6,15 +6,19 @@ tlctl.py — Control-Script zum Starten/Stoppen von main2.py
 - Start: erzeugt einen Hintergrundprozess und schreibt PID-Datei
 - Stop: sendet SIGTERM an den Prozess
 - Status: zeigt an, ob der Prozess läuft
+- Als Bibliothek nutzbar (do_start/do_stop, ProcessMonitor für Status ohne Subprozess)
 """
 from __future__ import annotations
 import argparse
 import os
+import select
 import signal
 import subprocess
 import sys
+import threading
 import time
 from pathlib import Path
+from typing import Optional
 import json
 from loguru import logger
 
@@ -53,26 +57,124 @@ def read_pid(pidfile: Path) -> int | None:
         logger.warning(f"Konnte PID-Datei nicht lesen: {e}")
         return None
 
+def _reap(pid: int):
+    """Zombie einsammeln, falls main2.py ein Kind dieses Prozesses ist (z. B. der Web-App)."""
+    try:
+        os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        pass
+    except OSError:
+        pass
+
+def _proc_stat(pid: int) -> Optional[str]:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _is_main2(pid: int) -> bool:
+    """Schutz gegen wiederverwendete PIDs: Kommandozeile muss main2.py enthalten."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return MAIN.name.encode() in f.read()
+    except FileNotFoundError:
+        return False
+    except OSError:
+        return True  # kein /proc → nicht prüfbar
+
 def wait_for_exit(pid: int, timeout_s: float = 5.0) -> bool:
     end = time.time() + timeout_s
     while time.time() < end:
-        try:
-            os.kill(pid, 0)
-            time.sleep(0.05)
-        except ProcessLookupError:
+        if not is_running(pid):
             return True
-    try:
-        os.kill(pid, 0)
-        return False
-    except ProcessLookupError:
-        return True
+        time.sleep(0.05)
+    return not is_running(pid)
 
 def is_running(pid: int) -> bool:
+    _reap(pid)
     try:
         os.kill(pid, 0)
-        return True
     except ProcessLookupError:
         return False
+    except PermissionError:
+        pass
+    stat = _proc_stat(pid)
+    if stat is not None:
+        state = stat[stat.rfind(")") + 2:][:1]
+        if state in ("Z", "X"):
+            return False
+    return _is_main2(pid)
+
+class ProcessMonitor:
+    """Status von main2.py ohne tlctl-Subprozess.
+
+    Die PID-Datei wird nur neu gelesen, wenn sich ihr stat() ändert; die
+    Lebendigkeit wird über einen pidfd (Linux ≥ 5.3) oder /proc geprüft.
+    """
+
+    def __init__(self, config_path: Path):
+        self.config_path = Path(config_path)
+        self._lock = threading.Lock()
+        self._cfg_sig = None
+        self._pidfile: Optional[Path] = None
+        self._pf_sig = None
+        self._pid: Optional[int] = None
+        self._pidfd: Optional[int] = None
+        self._exited = False
+
+    def pidfile(self) -> Path:
+        try:
+            st = self.config_path.stat()
+            sig = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            sig = None
+        if self._pidfile is None or sig != self._cfg_sig:
+            self._pidfile = pidfile_from_config(self.config_path)
+            self._cfg_sig = sig
+        return self._pidfile
+
+    def _close_pidfd(self):
+        if self._pidfd is not None:
+            try:
+                os.close(self._pidfd)
+            except OSError:
+                pass
+            self._pidfd = None
+
+    def pid(self) -> Optional[int]:
+        pidfile = self.pidfile()
+        try:
+            st = pidfile.stat()
+            sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            sig = None
+        if sig != self._pf_sig:
+            self._pf_sig = sig
+            self._close_pidfd()
+            self._exited = False
+            self._pid = read_pid(pidfile) if sig else None
+            if self._pid and hasattr(os, "pidfd_open") and is_running(self._pid):
+                try:
+                    self._pidfd = os.pidfd_open(self._pid)
+                except OSError:
+                    self._pidfd = None
+        return self._pid
+
+    def running(self) -> bool:
+        with self._lock:
+            pid = self.pid()
+            if not pid or self._exited:
+                return False
+            if self._pidfd is not None:
+                readable, _, _ = select.select([self._pidfd], [], [], 0)
+                if not readable:
+                    return True
+                _reap(pid)
+                self._close_pidfd()
+                self._exited = True
+                return False
+            return is_running(pid)
 
 def do_start(config_path: Path, foreground: bool = False):
     pidfile = pidfile_from_config(config_path)
@@ -103,7 +205,7 @@ def do_start(config_path: Path, foreground: bool = False):
             cmd,
             stdout=out,
             stderr=err,
-            preexec_fn=os.setsid,
+            start_new_session=True,
             cwd=str(THIS_DIR),
         )
         logger.info(f"Hintergrundprozess gestartet: PID {proc.pid}. Logs: {stdout_log} / {stderr_log}")
@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+video_render.py — ffmpeg-Aufrufe für Timelapse-Videos
+- Bildliste statt Glob: ffmpeg bekommt eine concat-Liste der JPEGs
+- Fortschritt über '-progress pipe:1' (frame=…) per Callback
+- Abbruch über ein threading.Event (ffmpeg wird beendet)
+- Niedrige CPU-/IO-Priorität (nice/ionice), damit die Aufnahme immer Vorrang hat
+- Inkrementell: abgeschlossene Blöcke zu N Bildern werden einmal als Segment
+  kodiert, im Cache abgelegt und per Stream-Copy zum Gesamtvideo verbunden
+- Parallel: fehlende Segmente werden von mehreren ffmpeg-Prozessen gleichzeitig
+  kodiert (feste GOP-Grenzen, damit die Segmente sauber aneinanderpassen)
+- Benchmark gegen den Ein-Prozess-Durchlauf: python3 video_render.py bench <ordner>
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+from loguru import logger
+
+ProgressCallback = Callable[[int, int], None]
+
+SEGMENT_FRAMES = 500
+GOP_FRAMES = 50
+# Erhöhen, wenn sich encode_args() ändert – alte Segmente werden dann nicht mehr verwendet
+SEGMENT_FORMAT_VERSION = 2
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) - 1)  # ein Kern bleibt für die Aufnahme frei
+
+LOG_ROOT = Path(os.environ.get("LOG_ROOT") or "/mnt/hdd/timelapse/logs")
+LOG_PATH = LOG_ROOT / "video_render.log"
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderError(Exception):
+    pass
+
+
+class _AnyEvent:
+    """Gilt als gesetzt, sobald eines der Events gesetzt ist (externer Abbruch oder Fehler im Pool)."""
+
+    def __init__(self, *events):
+        self.events = [e for e in events if e is not None]
+
+    def is_set(self) -> bool:
+        return any(e.is_set() for e in self.events)
+
+
+def setup_logger():
+    """Konfiguriert den Loguru-Logger für dieses Skript."""
+    logger.remove()
+    logger.add(sys.stderr, format="<green>{time}</green> <level>{level}</level>: <level>{message}</level>")
+    LOG_ROOT.mkdir(parents=True, exist_ok=True)
+    logger.add(LOG_PATH, rotation="10 MB", compression="zip", retention="10 days")
+
+
+def list_frames(folder: str) -> List[str]:
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(".jpg")
+    )
+
+
+def priority_prefix(nice: int = 19, ionice_class: int = 3) -> List[str]:
+    """nice/ionice vor den Befehl stellen (Klasse 3 = idle: nur freie Disk-Zeit)."""
+    prefix: List[str] = []
+    if nice and shutil.which("nice"):
+        prefix += ["nice", "-n", str(nice)]
+    if ionice_class and shutil.which("ionice"):
+        prefix += ["ionice", "-c", str(ionice_class)]
+    return prefix
+
+
+def write_concat_list(frames: List[str], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("ffconcat version 1.0\n")
+        for p in frames:
+            f.write("file '" + p.replace("'", "'\\''") + "'\n")
+
+
+def encode_args(fps: int, resolution: Optional[str], codec: str, quality: int,
+                threads: Optional[int] = None) -> List[str]:
+    vf = [f"setpts=N/({int(fps)}*TB)"]
+    if resolution:
+        vf.append(f"scale={resolution.replace('x', ':')}")
+    args = [
+        "-vf", ",".join(vf),
+        "-r", str(int(fps)),
+        "-c:v", codec,
+        "-crf", str(int(quality)),
+        "-pix_fmt", "yuv420p",
+        # Feste GOP ohne Szenenwechsel-Keyframes: Segmentgrenzen fallen immer auf einen IDR-Frame
+        "-g", str(GOP_FRAMES),
+        "-keyint_min", str(GOP_FRAMES),
+    ]
+    if codec in ("libx264", "libx265"):
+        args += ["-sc_threshold", "0"]
+    if threads:
+        args += ["-threads", str(int(threads))]
+    return args
+
+
+def align_segment_frames(segment_frames: int) -> int:
+    """Segmentlänge auf ein Vielfaches der GOP-Länge runden."""
+    return max(GOP_FRAMES, (int(segment_frames) + GOP_FRAMES - 1) // GOP_FRAMES * GOP_FRAMES)
+
+
+def run_ffmpeg(cmd: List[str], total_frames: int, progress: Optional[ProgressCallback] = None,
+               cancel: Optional[threading.Event] = None, nice: int = 19, ionice_class: int = 3):
+    """ffmpeg ausführen, Fortschritt melden und auf Abbruch reagieren."""
+    full = priority_prefix(nice, ionice_class) + cmd[:1] + ["-nostats", "-progress", "pipe:1"] + cmd[1:]
+    with tempfile.TemporaryFile() as errlog:
+        proc = subprocess.Popen(full, stdout=subprocess.PIPE, stderr=errlog, stdin=subprocess.DEVNULL, text=True)
+        try:
+            # ffmpeg meldet ca. alle 0,5 s einen Progress-Block → dort auf Abbruch prüfen
+            for line in proc.stdout:
+                if cancel is not None and cancel.is_set():
+                    proc.terminate()
+                    break
+                key, _, value = line.strip().partition("=")
+                if key == "frame" and progress:
+                    try:
+                        progress(int(value), total_frames)
+                    except ValueError:
+                        pass
+            rc = proc.wait()
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        if cancel is not None and cancel.is_set():
+            raise RenderCancelled()
+        if rc != 0:
+            errlog.seek(0)
+            tail = errlog.read()[-4000:].decode("utf-8", "replace")
+            raise RenderError(tail or f"ffmpeg beendet mit Code {rc}")
+
+
+def render_video(frames: List[str], output: str, fps: int = 24, resolution: Optional[str] = "1920x1080",
+                 codec: str = "libx264", quality: int = 18, progress: Optional[ProgressCallback] = None,
+                 cancel: Optional[threading.Event] = None, nice: int = 19, ionice_class: int = 3,
+                 threads: Optional[int] = None):
+    """Rendert die Bildliste in ein Video (erst in eine .part-Datei, dann atomar umbenannt)."""
+    if not frames:
+        raise RenderError("Keine Bilder gefunden")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    list_path = output + ".ffconcat"
+    tmp_out = output + ".part.mp4"
+    write_concat_list(frames, list_path)
+    try:
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        cmd += encode_args(fps, resolution, codec, quality, threads) + [tmp_out]
+        run_ffmpeg(cmd, len(frames), progress, cancel, nice, ionice_class)
+        os.replace(tmp_out, output)
+    finally:
+        for p in (list_path, tmp_out):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+def segment_key(frames: List[str], fps: int, resolution: Optional[str], codec: str, quality: int) -> str:
+    """Cache-Schlüssel eines Segments: Bildbereich + Encoder-Einstellungen."""
+    h = hashlib.sha1()
+    h.update(json.dumps([SEGMENT_FORMAT_VERSION, int(fps), resolution, codec, int(quality)]).encode())
+    for p in frames:
+        h.update(p.encode("utf-8", "surrogateescape") + b"\n")
+    return f"{os.path.splitext(os.path.basename(frames[0]))[0]}_{len(frames):05d}_{h.hexdigest()[:16]}"
+
+
+def concat_segments(segments: List[str], output: str, cancel: Optional[threading.Event] = None,
+                    nice: int = 19, ionice_class: int = 3):
+    """Segmente verlustfrei (Stream-Copy) zu einem MP4 verbinden."""
+    list_path = output + ".segments.ffconcat"
+    write_concat_list(segments, list_path)
+    try:
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+               "-c", "copy", "-movflags", "+faststart", output]
+        run_ffmpeg(cmd, 0, None, cancel, nice, ionice_class)
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def render_video_incremental(frames: List[str], output: str, segment_dir: str,
+                             segment_frames: int = SEGMENT_FRAMES, fps: int = 24,
+                             resolution: Optional[str] = "1920x1080", codec: str = "libx264",
+                             quality: int = 18, progress: Optional[ProgressCallback] = None,
+                             cancel: Optional[threading.Event] = None, nice: int = 19,
+                             ionice_class: int = 3, workers: int = 1) -> dict:
+    """Wie render_video(), kodiert aber nur Blöcke, die noch nicht im Segment-Cache liegen.
+
+    Abgeschlossene Blöcke (genau segment_frames Bilder) bleiben gültig, solange
+    sich weder ihre Bildliste noch die Encoder-Einstellungen ändern; beim
+    Aktualisieren einer laufenden Session wird so nur der neue Block kodiert.
+    Fehlende Blöcke werden von bis zu `workers` ffmpeg-Prozessen parallel kodiert.
+    """
+    if not frames:
+        raise RenderError("Keine Bilder gefunden")
+    t_start = time.monotonic()
+    segment_frames = align_segment_frames(segment_frames)
+    workers = max(1, int(workers))
+    os.makedirs(segment_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    chunks = [frames[i:i + segment_frames] for i in range(0, len(frames), segment_frames)]
+    plan = [(c, os.path.join(segment_dir, segment_key(c, fps, resolution, codec, quality) + ".mp4")) for c in chunks]
+    todo = [(c, p) for c, p in plan if not os.path.exists(p)]
+    total = sum(len(c) for c, _ in todo)
+
+    # Fortschritt aller parallel laufenden Segmente aufsummieren
+    done_by_seg = [0] * len(todo)
+    lock = threading.Lock()
+    abort = threading.Event()
+    stop = _AnyEvent(cancel, abort)
+    if progress:
+        progress(0, total)
+
+    # Bei mehreren Prozessen bekommt jeder ffmpeg nur einen Teil der Kerne
+    threads = max(1, (os.cpu_count() or 1) // min(workers, max(1, len(todo)))) if workers > 1 else None
+
+    def encode(idx: int) -> dict:
+        chunk, seg_path = todo[idx]
+
+        def seg_progress(done, _n):
+            with lock:
+                done_by_seg[idx] = min(done, len(chunk))
+                s = sum(done_by_seg)
+            if progress:
+                progress(s, total)
+
+        t0 = time.monotonic()
+        try:
+            render_video(chunk, seg_path, fps, resolution, codec, quality, seg_progress, stop,
+                         nice, ionice_class, threads)
+        except Exception:
+            abort.set()
+            raise
+        return {"segment": os.path.basename(seg_path), "frames": len(chunk),
+                "seconds": round(time.monotonic() - t0, 2)}
+
+    t_enc = time.monotonic()
+    seg_times: List[dict] = []
+    if todo:
+        with ThreadPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = [pool.submit(encode, i) for i in range(len(todo))]
+            errors = []
+            for f in futures:
+                try:
+                    seg_times.append(f.result())
+                except Exception as e:
+                    errors.append(e)
+        if cancel is not None and cancel.is_set():
+            raise RenderCancelled()
+        real = [e for e in errors if not isinstance(e, RenderCancelled)]
+        if real or errors:
+            raise (real or errors)[0]
+    encode_s = time.monotonic() - t_enc
+
+    segments = [p for _, p in plan]
+    tmp_out = output + ".part.mp4"
+    t_cat = time.monotonic()
+    try:
+        concat_segments(segments, tmp_out, cancel, nice, ionice_class)
+        os.replace(tmp_out, output)
+    finally:
+        if os.path.exists(tmp_out):
+            os.remove(tmp_out)
+    concat_s = time.monotonic() - t_cat
+
+    # Nicht mehr referenzierte Segmente (z. B. der alte, offene letzte Block) entfernen
+    keep = {os.path.basename(p) for p in segments}
+    for name in os.listdir(segment_dir):
+        if name.endswith(".mp4") and name not in keep:
+            try:
+                os.remove(os.path.join(segment_dir, name))
+            except OSError:
+                pass
+    return {
+        "segments": len(segments),
+        "reused": len(segments) - len(todo),
+        "encoded_frames": total,
+        "workers": workers,
+        "segment_times": seg_times,
+        "encode_seconds": round(encode_s, 2),
+        "concat_seconds": round(concat_s, 2),
+        "total_seconds": round(time.monotonic() - t_start, 2),
+    }
+
+
+def benchmark(frames: List[str], workers: int = DEFAULT_WORKERS, segment_frames: int = SEGMENT_FRAMES,
+              **opts) -> dict:
+    """Ein-Prozess-Render gegen parallele Segmente (leerer Cache) vergleichen."""
+    with tempfile.TemporaryDirectory(prefix="tl_bench_") as tmp:
+        t0 = time.monotonic()
+        render_video(frames, os.path.join(tmp, "baseline.mp4"), **opts)
+        baseline_s = time.monotonic() - t0
+        par = render_video_incremental(frames, os.path.join(tmp, "parallel.mp4"), os.path.join(tmp, "segments"),
+                                       segment_frames=segment_frames, workers=workers, **opts)
+    return {
+        "frames": len(frames),
+        "baseline_seconds": round(baseline_s, 2),
+        "parallel": par,
+        "speedup": round(baseline_s / par["total_seconds"], 2) if par["total_seconds"] else None,
+    }
+
+
+def main():
+    setup_logger()
+    ap = argparse.ArgumentParser(description="Timelapse-Video rendern (parallel, segmentiert)")
+    ap.add_argument("command", choices=["render", "bench"])
+    ap.add_argument("folder", help="Ordner mit JPEGs")
+    ap.add_argument("--out", default=None, help="Ziel-MP4 (render)")
+    ap.add_argument("--segments", default=None, help="Segment-Cache-Ordner (render)")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--segment-frames", type=int, default=SEGMENT_FRAMES)
+    ap.add_argument("--fps", type=int, default=24)
+    ap.add_argument("--resolution", default="1920x1080")
+    ap.add_argument("--codec", default="libx264")
+    ap.add_argument("--quality", type=int, default=18)
+    args = ap.parse_args()
+
+    frames = list_frames(args.folder)
+    opts = dict(fps=args.fps, resolution=args.resolution, codec=args.codec, quality=args.quality)
+    if args.command == "bench":
+        logger.info(f"Benchmark: {len(frames)} Bilder, {args.workers} Prozesse …")
+        res = benchmark(frames, args.workers, args.segment_frames, **opts)
+        for seg in res["parallel"]["segment_times"]:
+            logger.info(f"  Segment {seg['segment']}: {seg['frames']} Bilder in {seg['seconds']:.1f}s")
+        logger.info(
+            f"Ein Prozess: {res['baseline_seconds']:.1f}s | parallel: {res['parallel']['total_seconds']:.1f}s "
+            f"(Kodieren {res['parallel']['encode_seconds']:.1f}s, Concat {res['parallel']['concat_seconds']:.1f}s) "
+            f"→ Faktor {res['speedup']}"
+        )
+    else:
+        out = args.out or os.path.join(args.folder, "timelapse.mp4")
+        seg_dir = args.segments or out + ".segments"
+        res = render_video_incremental(frames, out, seg_dir, segment_frames=args.segment_frames,
+                                       workers=args.workers, **opts)
+        logger.info(f"Fertig: {out} – {res}")
+
+
+if __name__ == "__main__":
+    main()
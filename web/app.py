@@ -1,14 +1,34 @@
 # web/app.py
 
 import os
+import sys
 import json
 import subprocess
 import shlex
+import threading
+import time
+import queue
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory, send_file, abort, url_for
+from flask import Flask, render_template, request, jsonify, send_file, abort, url_for, Response, stream_with_context
 from flask_httpauth import HTTPBasicAuth
+from werkzeug.utils import safe_join
 from uuid import uuid4
-from picamera2 import Picamera2
+import glob
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+from frame_index import FrameIndex, encode_cursor, decode_cursor, parse_time
+from logtail import tail_lines, read_after
+import tlctl as tlctl_lib
+import render_jobs
+from pathlib import Path
+from fswatch import make_watcher, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE, IN_MODIFY
+import export_stream
+from status_block import StatusBlock, DEFAULT_STATUS
+from collections import OrderedDict
+# products, chart_data, raw_tier, retention, sensor_store und renditions (numpy/PIL) werden
+# erst in den Routen geladen, die sie brauchen – wie picamera2
 
 app = Flask(__name__, static_folder='static')
 CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../config.json'))
@@ -18,11 +38,31 @@ TEST_ROOT = "/mnt/hdd/timelapse/tests"
 LOG_ROOT = "/mnt/hdd/timelapse/logs"
 PRESET_DIR = "/mnt/hdd/timelapse/presets"
 SCHEDULES_FILE = "/mnt/hdd/timelapse/schedules.json"
+FRAME_INDEX_DB = "/mnt/hdd/timelapse/frame_index.sqlite"
+VIDEO_ROOT = "/mnt/hdd/timelapse/videos"
+PRODUCT_ROOT = "/mnt/hdd/timelapse/products"
+KEOGRAM_MAX_WIDTH = 4000
+RENDER_JOBS_DB = "/mnt/hdd/timelapse/render_jobs.sqlite"
+RENDER_MAX_CONCURRENCY = int(os.environ.get("RENDER_MAX_CONCURRENCY", "1"))
 os.makedirs(PRESET_DIR, exist_ok=True)
-TLCTL = ["python3", os.path.abspath(os.path.join(os.path.dirname(__file__), "../tlctl.py"))]
 
 THUMB_DIR = os.path.join(os.path.dirname(__file__), "thumbs")
 os.makedirs(THUMB_DIR, exist_ok=True)
+FRAME_THUMB_DIR = os.path.join(THUMB_DIR, "frames")
+os.makedirs(FRAME_THUMB_DIR, exist_ok=True)
+INDEX_SYNC_INTERVAL_S = 5
+GALLERY_MAX_LIMIT = 100000
+EVENT_DEBOUNCE_S = 0.5
+EVENT_MAX_DELAY_S = 1.0   # spätestens dann senden, auch wenn weiter Änderungen eintreffen
+SSE_KEEPALIVE_S = 25
+STATUS_POLL_S = 1.0
+THUMB_MAX_AGE_S = 365 * 24 * 3600
+SENSOR_CACHE_SIZE = 64          # Antworten von /api/sensors im LRU-Cache
+SENSOR_MAX_POINTS = 10000
+SENSOR_SETTLE_S = 120           # jünger als das: Logger schreibt evtl. noch gebündelt nach
+RAWZ_CACHE_SIZE = 2             # entpackte .rawz-Dateien im Speicher (für Range-/Resume-Anfragen)
+# Hinter nginx/Apache: Datei per X-Sendfile vom Webserver ausliefern lassen
+app.config["USE_X_SENDFILE"] = os.environ.get("USE_X_SENDFILE") == "1"
 LUX_CONTROL_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../lux_control.json'))
 LUX_LOG_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../lux_log.json'))
 
@@ -151,28 +191,46 @@ FIELD_GROUPS = [
 
 app = Flask(__name__, static_folder='static')
 auth = HTTPBasicAuth()
-from picamera2 import Picamera2
 
-def tlctl(args):
-    """tlctl.py aufrufen (Start/Stop/Status von main2.py)"""
+# main2.py-Status im Prozess: PID-Datei nur bei Änderung lesen, Lebendigkeit per pidfd
+TL_MONITOR = tlctl_lib.ProcessMonitor(Path(CONFIG_PATH))
+
+def tlctl(action):
+    """Start/Stop von main2.py über die tlctl-Bibliothek (kein Subprozess für tlctl.py)"""
     try:
-        cmd = TLCTL + args + ["--config", CONFIG_PATH]
-        return subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(__file__))
+        if action == "start":
+            rc = tlctl_lib.do_start(Path(CONFIG_PATH))
+        elif action == "stop":
+            rc = tlctl_lib.do_stop(Path(CONFIG_PATH))
+        else:
+            raise ValueError(f"Unbekannte Aktion: {action}")
+        return rc, ""
     except Exception as e:
-        class _Res: pass
-        r = _Res(); r.returncode = 1; r.stdout = ""; r.stderr = str(e)
-        return r
+        return 1, str(e)
 
 def tl_status():
-    cp = tlctl(["status"])
-    return cp.returncode == 0
+    return TL_MONITOR.running()
+
+# Kameraliste: picamera2/libcamera erst bei Bedarf laden und das Ergebnis behalten,
+# bis sich die Menge der /dev/media*- bzw. /dev/video*-Geräte ändert (Hotplug, Treiber-Reload)
+_camera_cache = {"devices": None, "models": []}
+_camera_lock = threading.Lock()
+
+def _camera_devices():
+    return tuple(sorted(glob.glob("/dev/media*") + glob.glob("/dev/video*")))
 
 def get_available_camera_models():
-    try:
-        return [info.get("Model") for info in Picamera2.global_camera_info()]
-    except Exception as e:
-        print("Kameramodelle konnten nicht ermittelt werden:", e)
-        return []
+    devices = _camera_devices()
+    with _camera_lock:
+        if _camera_cache["devices"] != devices:
+            try:
+                from picamera2 import Picamera2
+                models = [info.get("Model") for info in Picamera2.global_camera_info()]
+            except Exception as e:
+                print("Kameramodelle konnten nicht ermittelt werden:", e)
+                return []
+            _camera_cache.update(devices=devices, models=models)
+        return list(_camera_cache["models"])
 
 
 def get_relative_image_path(full_path):
@@ -227,16 +285,30 @@ def save_config(cfg):
     print("Wirklich geschrieben wird nach:", CONFIG_PATH)
     print(">>> Config written:", CONFIG_PATH)
 
+STATUS = StatusBlock()
+
 def get_status():
-    if os.path.exists(STATUS_PATH):
+    st = STATUS.read()
+    if st is not None:
+        return st
+    # Fallback: alte status.json (z. B. von einer älteren main.py-Version)
+    try:
         with open(STATUS_PATH, "r") as f:
             return json.load(f)
-    else:
-        return {"running": False, "mode": "timelapse", "current_shot": 0, "last_file": "", "last_time": "", "error": ""}
+    except (OSError, ValueError):
+        return dict(DEFAULT_STATUS)
 
 def set_status(new_status):
-    with open(STATUS_PATH, "w") as f:
-        json.dump(new_status, f, indent=2)
+    try:
+        STATUS.update(**new_status)
+    except OSError as e:
+        # Block gehört dem Aufnahme-Benutzer (nur lesbar) → wie früher status.json schreiben
+        print("Status-Block nicht beschreibbar, schreibe status.json:", e)
+        try:
+            with open(STATUS_PATH, "w") as f:
+                json.dump({**get_status(), **new_status}, f, indent=2)
+        except OSError as e2:
+            print("status.json nicht beschreibbar:", e2)
 
 def find_latest_images(n=10):
     result = []
@@ -256,26 +328,168 @@ def get_thumb_path(image_path):
     os.makedirs(thumbdir, exist_ok=True)
     thumbfile = os.path.join(thumbdir, base + ".thumb.jpg")
     if not os.path.exists(thumbfile):
-        try:
-            from PIL import Image
-            img = Image.open(image_path)
-            img.thumbnail((160, 90))
-            img.save(thumbfile, "JPEG")
-        except Exception:
+        # Draft-Dekodierung (1/8) statt volles JPEG zu entpacken
+        from renditions import make_rendition, THUMB_SIZE
+        if not make_rendition(image_path, thumbfile, THUMB_SIZE):
             return None
     return thumbfile
 
+_frame_index = None
+_frame_index_lock = threading.Lock()
+_frame_index_synced = 0.0
+
+def get_frame_index():
+    """Bild-Index holen und höchstens alle INDEX_SYNC_INTERVAL_S abgleichen."""
+    global _frame_index, _frame_index_synced
+    with _frame_index_lock:
+        if _frame_index is None:
+            _frame_index = FrameIndex(FRAME_INDEX_DB, IMAGE_ROOT)
+        now = time.monotonic()
+        if now - _frame_index_synced >= INDEX_SYNC_INTERVAL_S:
+            _frame_index.sync()
+            _frame_index_synced = now
+        return _frame_index
+
+class EventHub:
+    """Verteilt Dateiänderungen (neues Bild, Status, Logs) an alle SSE-Clients.
+
+    Der Watcher-Thread blockiert in inotify und wacht nur bei echten
+    Änderungen auf; der Status aus dem Shared Memory wird einmal pro Sekunde
+    über die Sequenznummer geprüft (ein 8-Byte-Lesezugriff).
+    """
+
+    def __init__(self):
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=256)
+        with self.lock:
+            self.clients.add(q)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="event-hub", daemon=True)
+                self.thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.clients.discard(q)
+
+    def publish(self, name, data):
+        with self.lock:
+            clients = list(self.clients)
+        for q in clients:
+            try:
+                q.put_nowait((name, data))
+            except queue.Full:
+                pass
+
+    def _classify(self, path, mask):
+        name = os.path.basename(path)
+        if name in ("status.json", "timelapse.pid", "timelapse_origin.txt"):
+            return "status", {}
+        if name == os.path.basename(LUX_LOG_FILE) and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            return "lux_log", {}
+        if name.lower().endswith(".jpg") and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            for root in (IMAGE_ROOT, TEST_ROOT):
+                if path.startswith(root + os.sep):
+                    return "frame", {"path": os.path.relpath(path, root)}
+        if os.path.dirname(path) == LOG_ROOT and name.endswith(".log") and mask & (IN_MODIFY | IN_CREATE):
+            return "log", {"file": name}
+        return None
+
+    def _run(self):
+        status_seq = STATUS.seq()
+        watcher = make_watcher()
+        watcher.add(os.path.dirname(STATUS_PATH), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE)
+        watcher.add(os.path.dirname(LUX_LOG_FILE), IN_CLOSE_WRITE | IN_MOVED_TO)
+        watcher.add(LOG_ROOT, IN_MODIFY | IN_CREATE | IN_DELETE)
+        for root in (IMAGE_ROOT, TEST_ROOT):
+            watcher.add(root, IN_CLOSE_WRITE | IN_MOVED_TO, recursive=True)
+        pending = {}
+        pending_since = None
+        while True:
+            if pending:
+                timeout = max(0.0, min(EVENT_DEBOUNCE_S, pending_since + EVENT_MAX_DELAY_S - time.monotonic()))
+            else:
+                timeout = STATUS_POLL_S
+            try:
+                events = watcher.read(timeout)
+            except Exception as e:
+                print("Fehler im Datei-Watcher:", e)
+                time.sleep(5)
+                continue
+            # Schreiben in die mmap löst kein inotify aus → Sequenznummer vergleichen
+            seq = STATUS.seq()
+            if seq != status_seq:
+                status_seq = seq
+                pending["status"] = {}
+            for path, mask in events:
+                ev = self._classify(path, mask)
+                if ev:
+                    pending[ev[0]] = ev[1]
+            if not pending:
+                pending_since = None
+                continue
+            if pending_since is None:
+                pending_since = time.monotonic()
+            # Ruhe (Entprellung) oder Höchstwartezeit erreicht; laufend geschriebene Logs
+            # dürfen Bild- und Statusmeldungen nicht beliebig lange zurückhalten
+            if not events or time.monotonic() - pending_since >= EVENT_MAX_DELAY_S:
+                for name, data in pending.items():
+                    self.publish(name, data)
+                pending = {}
+                pending_since = None
+
+event_hub = EventHub()
+
+def find_raw_rel(rel_img):
+    """Passende RAW-Datei (.raw/.npy/.dng) zum Bild suchen, relativ zu RAW_ROOT.
+
+    Bereits komprimierte Dateien (<name>.rawz) werden unter dem Originalnamen geliefert.
+    """
+    import raw_tier
+    stem = os.path.splitext(rel_img)[0]
+    for ext in raw_tier.RAW_EXTS:
+        if raw_tier.resolve(os.path.join(RAW_ROOT, stem + ext)):
+            return stem + ext
+    return None
+
+# Logs unter LOG_ROOT: None = Tagesdatei <name>_<datum>.log (main.py), sonst fester Dateiname
+LOG_FILES = {
+    "timelapse": None,
+    "main2": "main2.log",
+    "tlctl": "tlctl.log",
+    "lux_controller": "lux_controller.log",
+    "lux_exposured": "lux_exposured.log",
+    "sensor_logger": "sensor_logger.log",
+    "make_charts": "make_charts.log",
+    "renditions": "renditions.log",
+    "frame_index": "frame_index.log",
+    "controller_host": "controller_host.log",
+    "render_jobs": "render_jobs.log",
+    "video_render": "video_render.log",
+    "retention": "retention.log",
+    "raw_tier": "raw_tier.log",
+    "products": "products.log",
+    "sensor_store": "sensor_store.log",
+    "sensor_partitions": "sensor_partitions.log",
+}
+
 def latest_logfile(pattern="timelapse"):
-    today = datetime.now().strftime("%Y-%m-%d")
-    fname = f"{pattern}_{today}.log"
+    if pattern not in LOG_FILES:
+        return None
+    fname = LOG_FILES[pattern]
+    if fname is None:
+        today = datetime.now().strftime("%Y-%m-%d")
+        fname = f"{pattern}_{today}.log"
     path = os.path.join(LOG_ROOT, fname)
     return path if os.path.exists(path) else None
 
 def get_last_lines(logfile, n=20):
     try:
-        with open(logfile, "r") as f:
-            lines = f.readlines()[-n:]
-        return lines
+        return tail_lines(logfile, n)[0]
     except Exception:
         return []
 
@@ -296,13 +510,7 @@ def verify_password(username, password):
 
 @app.route('/api/cameras')
 def api_cameras():
-    from picamera2 import Picamera2
-    try:
-        models = [info.get("Model") for info in Picamera2.global_camera_info()]
-    except Exception as e:
-        print("Fehler bei Kameraliste:", e)
-        models = []
-    return jsonify(models)
+    return jsonify(get_available_camera_models())
 def load_lux_config():
     if os.path.exists(LUX_CONTROL_FILE):
         with open(LUX_CONTROL_FILE, "r") as f:
@@ -343,9 +551,9 @@ def api_session_tlctl():
     status = get_status()
 
     if action == "start":
-        cp = tlctl(["start"])
-        if cp.returncode != 0:
-            return jsonify({"error": cp.stderr or cp.stdout or "Start fehlgeschlagen"}), 400
+        rc, err = tlctl("start")
+        if rc != 0:
+            return jsonify({"error": err or "Start fehlgeschlagen"}), 400
         # Ownership-Info wie in der Legacy-Route
         with open(os.path.join(os.path.dirname(__file__), "timelapse_origin.txt"), "w", encoding="utf-8") as f:
             f.write("web")
@@ -353,9 +561,9 @@ def api_session_tlctl():
         status["start_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     elif action == "stop":
-        cp = tlctl(["stop"])
-        if cp.returncode != 0:
-            return jsonify({"error": cp.stderr or cp.stdout or "Stop fehlgeschlagen"}), 400
+        rc, err = tlctl("stop")
+        if rc != 0:
+            return jsonify({"error": err or "Stop fehlgeschlagen"}), 400
         status["running"] = False
         origin_file = os.path.join(os.path.dirname(__file__), "timelapse_origin.txt")
         if os.path.exists(origin_file):
@@ -427,43 +635,107 @@ def api_video_folders():
     result.sort()
     return jsonify(result)
 
+# --- Render-Jobs: ffmpeg läuft im Hintergrund (nice/ionice), nicht im Request ---
+render_jobs.IMAGE_ROOT = IMAGE_ROOT
+render_jobs.VIDEO_ROOT = VIDEO_ROOT
+render_jobs.SEGMENT_ROOT = os.path.join(VIDEO_ROOT, ".segments")
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = render_jobs.JobQueue(RENDER_JOBS_DB, RENDER_MAX_CONCURRENCY)
+            _job_queue.start_workers()
+        return _job_queue
+
+def video_params(data):
+    folder = (data.get("folder") or "").strip("/")
+    if not folder or not safe_join(IMAGE_ROOT, folder) or not os.path.isdir(os.path.join(IMAGE_ROOT, folder)):
+        raise ValueError("Ordner nicht gefunden")
+    return {
+        "folder": folder,
+        "fps": int(data.get("fps", 24)),
+        "resolution": data.get("resolution", "1920x1080"),
+        "codec": data.get("codec", "libx264"),
+        "quality": int(data.get("quality", 18)),
+        "incremental": str(data.get("incremental", True)).lower() in ("true", "1", "yes", "on"),
+        "segment_frames": int(data.get("segment_frames", render_jobs.SEGMENT_FRAMES)),
+        "workers": max(1, min(int(data.get("workers", render_jobs.DEFAULT_WORKERS)), os.cpu_count() or 1)),
+    }
+
 @app.route('/api/create_video', methods=['POST'])
 def api_create_video():
-    data = request.json
-    folder = data.get("folder")
-    fps = int(data.get("fps", 24))
-    resolution = data.get("resolution", "1920x1080")
-    codec = data.get("codec", "libx264")
-    quality = int(data.get("quality", 18))
-    # Zielordner für Videos
-    VIDEO_ROOT = "/mnt/hdd/timelapse/videos"
-    os.makedirs(VIDEO_ROOT, exist_ok=True)
-    src_folder = os.path.join(IMAGE_ROOT, folder)
-    output_file = os.path.join(VIDEO_ROOT, f"{folder.replace('/','_')}_{fps}fps.mp4")
-    pattern = os.path.join(src_folder, "*.jpg")
-    # FFMPEG-Aufruf bauen
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-framerate", str(fps),
-        "-pattern_type", "glob",
-        "-i", pattern,
-        "-vf", f"scale={resolution}",
-        "-c:v", codec,
-        "-crf", str(quality),
-        "-pix_fmt", "yuv420p",
-        output_file
-    ]
+    data = request.get_json(silent=True) or {}
     try:
-        subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-        return jsonify({"success": True, "video": os.path.basename(output_file)})
-    except subprocess.CalledProcessError as e:
-        return jsonify({"success": False, "error": e.output.decode()}), 500
+        params = video_params(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    job_id = get_job_queue().submit("video", params)
+    return jsonify({
+        "success": True,
+        "job": job_id,
+        "video": os.path.basename(render_jobs.video_output_path(params)),
+    }), 202
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    q = get_job_queue()
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        kind = data.get("kind", "video")
+        if kind != "video":
+            return jsonify({"error": f"Unbekannter Job-Typ: {kind}"}), 400
+        try:
+            params = video_params(data)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        job_id = q.submit(kind, params)
+        return jsonify(q.get(job_id)), 202
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    return jsonify(q.list(limit, request.args.get("status")))
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def api_job(job_id):
+    q = get_job_queue()
+    if request.method == 'DELETE':
+        if not q.cancel(job_id):
+            return jsonify({"error": "Job nicht gefunden oder bereits beendet"}), 404
+    job = q.get(job_id)
+    if not job:
+        return jsonify({"error": "Job nicht gefunden"}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_job_cancel(job_id):
+    q = get_job_queue()
+    if not q.cancel(job_id):
+        return jsonify({"error": "Job nicht gefunden oder bereits beendet"}), 404
+    return jsonify(q.get(job_id))
 
 @app.route('/download/video/<filename>')
 def download_video(filename):
-    VIDEO_ROOT = "/mnt/hdd/timelapse/videos"
-    return send_from_directory(VIDEO_ROOT, filename, as_attachment=True)
+    return send_download(safe_join(VIDEO_ROOT, filename))
+
+
+def send_download(path, as_attachment=True, immutable=False):
+    """Datei mit ETag/Last-Modified und HTTP-Range ausliefern.
+
+    Große Dateien werden nicht in den Speicher gelesen: unter gunicorn per
+    wsgi.file_wrapper (sendfile), mit USE_X_SENDFILE=1 vom vorgeschalteten Webserver.
+    """
+    if not path or not os.path.isfile(path):
+        abort(404)
+    resp = send_file(path, as_attachment=as_attachment, conditional=True, etag=True,
+                     max_age=THUMB_MAX_AGE_S if immutable else 0)
+    if immutable:
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+    else:
+        # Darf zwischengespeichert werden, aber nur nach Revalidierung per ETag
+        resp.cache_control.no_cache = True
+    return resp
 
 
 @app.route('/api/session', methods=['POST'])
@@ -560,10 +832,7 @@ def api_lastimage():
     path = imgs[0]
     thumbfile = get_thumb_path(path)
     rel_img = get_relative_image_path(path)
-    dirname = os.path.relpath(os.path.dirname(path), IMAGE_ROOT)
-    rawname = os.path.splitext(os.path.basename(path))[0] + ".raw"
-    raw_path = os.path.join(RAW_ROOT, dirname, rawname)
-    raw_rel = os.path.relpath(raw_path, RAW_ROOT) if os.path.exists(raw_path) else None
+    raw_rel = find_raw_rel(rel_img)
 
     meta = {}
     json_path = os.path.splitext(path)[0] + ".json"
@@ -591,7 +860,7 @@ def api_lastimage():
 
     return jsonify({
         "full": url_for('download_image', img=rel_img),
-        "thumb": url_for('thumb', filename=os.path.basename(thumbfile)),
+        "thumb": url_for('thumb', filename=os.path.basename(thumbfile), v=int(os.path.getmtime(path))),
         "mtime": os.path.getmtime(path),
         "filename": os.path.basename(path),
         "raw": url_for('download_raw', img=raw_rel) if raw_rel else None,
@@ -600,8 +869,8 @@ def api_lastimage():
 
 @app.route('/thumbs/<filename>')
 def thumb(filename):
-    thumbdir = os.path.join(os.path.dirname(__file__), "thumbs")
-    return send_from_directory(thumbdir, filename)
+    # Name enthält den Zeitstempel des Bildes (+ ?v=mtime) → Inhalt ändert sich nie
+    return send_download(safe_join(THUMB_DIR, filename), as_attachment=False, immutable=True)
 
 @app.route('/api/gallery')
 def api_gallery():
@@ -625,51 +894,285 @@ def api_gallery():
     for f in files:
         thumbfile = get_thumb_path(f)
         rel_img = os.path.relpath(f, IMAGE_ROOT)
-        dirname = os.path.relpath(os.path.dirname(f), IMAGE_ROOT)
-        rawname = os.path.splitext(os.path.basename(f))[0] + ".raw"
-        raw_path = os.path.join(RAW_ROOT, dirname, rawname)
-        raw_rel = os.path.relpath(raw_path, RAW_ROOT) if os.path.exists(raw_path) else None
+        raw_rel = find_raw_rel(rel_img)
 
         thumb_filename = os.path.basename(thumbfile) if thumbfile else None
         
         result.append({
             "full": url_for('download_image', img=rel_img),
-            "thumb": url_for('thumb', filename=thumb_filename) if thumb_filename else None,
+            "thumb": url_for('thumb', filename=thumb_filename, v=int(os.path.getmtime(f))) if thumb_filename else None,
             "filename": os.path.basename(f),
             "mtime": datetime.fromtimestamp(os.path.getmtime(f)).strftime("%Y-%m-%d %H:%M:%S"),
             "raw": url_for('download_raw', img=raw_rel) if raw_rel else None
         })
     return jsonify(result)
 
+@app.route('/api/gallery/sessions')
+def api_gallery_sessions():
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
+    return jsonify([
+        {"session": s["session"], "frames": s["frames"], "first": fmt(s["first_ts"]), "last": fmt(s["last_ts"])}
+        for s in get_frame_index().sessions()
+    ])
+
+@app.route('/api/gallery/frames')
+def api_gallery_frames():
+    """Seitenweise Bildliste: ?session=&from=&to=&limit=&cursor=&order=asc|desc"""
+    session = request.args.get("session")
+    order = request.args.get("order", "desc")
+    cursor = request.args.get("cursor") or None
+    try:
+        t_from = parse_time(request.args.get("from"))
+        t_to = parse_time(request.args.get("to"))
+        limit = max(1, min(int(request.args.get("limit", 100)), GALLERY_MAX_LIMIT))
+        if cursor and decode_cursor(cursor)[2] != ("asc" if order == "asc" else "desc"):
+            raise ValueError("Cursor passt nicht zur Sortierung")
+    except Exception as e:
+        return jsonify({"error": f"Ungültige Parameter: {e}"}), 400
+
+    rows = get_frame_index().iter_frames(session, t_from, t_to, limit, cursor, order)
+
+    def generate():
+        yield '{"items":['
+        n, last = 0, None
+        for rel, sess, ts, size in rows:
+            raw_rel = find_raw_rel(rel)
+            item = {
+                "path": rel,
+                "session": sess,
+                "filename": os.path.basename(rel),
+                "time": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+                "ts": ts,
+                "size": size,
+                "full": url_for('download_image', img=rel),
+                "thumb": url_for('frame_thumb', img=rel, v=size),
+                "raw": url_for('download_raw', img=raw_rel) if raw_rel else None,
+            }
+            yield ("," if n else "") + json.dumps(item)
+            n, last = n + 1, (ts, rel)
+        next_cursor = encode_cursor(last[0], last[1], order) if n == limit and last else None
+        yield '],"count":%d,"next_cursor":%s}' % (n, json.dumps(next_cursor))
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+@app.route('/api/export')
+def api_export():
+    """Archiv streamen: ?session=&from=&to=&format=tar|zip&raw=1&meta=1 (TAR unterstützt Range)"""
+    session = request.args.get("session") or None
+    fmt = request.args.get("format", "tar")
+    try:
+        t_from = parse_time(request.args.get("from"))
+        t_to = parse_time(request.args.get("to"))
+        if fmt not in ("tar", "zip"):
+            raise ValueError(f"Unbekanntes Format: {fmt}")
+    except Exception as e:
+        return jsonify({"error": f"Ungültige Parameter: {e}"}), 400
+    if session is None and t_from is None and t_to is None:
+        return jsonify({"error": "session oder from/to angeben"}), 400
+
+    rows = get_frame_index().iter_frames(session, t_from, t_to, -1, None, "asc")
+    entries = export_stream.collect(rows, IMAGE_ROOT, RAW_ROOT,
+                                    include_raw=request.args.get("raw") == "1",
+                                    include_meta=request.args.get("meta") == "1")
+    if not entries:
+        return jsonify({"error": "Keine Bilder im gewählten Bereich"}), 404
+    name = (session or "export").replace("/", "_")
+    if t_from is not None or t_to is not None:
+        name += "_" + "-".join(datetime.fromtimestamp(t).strftime("%Y%m%d%H%M") for t in (t_from, t_to) if t is not None)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+
+    if fmt == "zip":
+        return Response(stream_with_context(export_stream.iter_zip(entries)),
+                        mimetype="application/zip", headers=headers)
+
+    tar = export_stream.TarExport(entries)
+    etag = tar.etag
+    headers.update({"ETag": f'"{etag}"', "Accept-Ranges": "bytes"})
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    start, stop, status = 0, tar.size, 200
+    # Range nur, wenn sich der Inhalt seit dem ersten Teil nicht geändert hat (If-Range)
+    if request.range and (not request.if_range or request.if_range.etag == etag):
+        r = request.range.range_for_length(tar.size)
+        if r is None:
+            headers["Content-Range"] = f"bytes */{tar.size}"
+            return Response(status=416, headers=headers)
+        start, stop, status = r[0], r[1], 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{tar.size}"
+    headers["Content-Length"] = str(stop - start)
+    return Response(stream_with_context(tar.iter_range(start, stop)), status=status,
+                    mimetype="application/x-tar", headers=headers, direct_passthrough=True)
+
+@app.route('/api/products/<path:session>')
+def api_products(session):
+    """Keogramm und Kontaktbögen einer Session (werden von main.py/main2.py fortgeschrieben)"""
+    import products as products_lib
+    if not safe_join(PRODUCT_ROOT, session):
+        abort(404)
+    keo = products_lib.keogram_info(session, PRODUCT_ROOT)
+    fmt = lambda ts: datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
+    return jsonify({
+        "session": session,
+        "frames": keo["frames"],
+        "first": fmt(keo["first_ts"]),
+        "last": fmt(keo["last_ts"]),
+        "keogram": url_for('product_keogram', session=session, v=keo["frames"]) if keo["frames"] else None,
+        "contact_sheets": [
+            {"day": day, "url": url_for('product_contact_sheet', session=session, day=day)}
+            for day in products_lib.list_days(session, PRODUCT_ROOT)
+        ],
+    })
+
+def _product_response(etag, render):
+    # Kodieren nur, wenn der Client den Stand noch nicht hat
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        data = render()
+        if data is None:
+            abort(404)
+        resp = Response(data, mimetype="image/jpeg")
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True
+    return resp
+
+@app.route('/products/<path:session>/keogram.jpg')
+def product_keogram(session):
+    import products as products_lib
+    if not safe_join(PRODUCT_ROOT, session):
+        abort(404)
+    frames = products_lib.keogram_info(session, PRODUCT_ROOT)["frames"]
+    return _product_response(f"keo-{frames}", lambda: products_lib.keogram_jpeg(session, PRODUCT_ROOT, KEOGRAM_MAX_WIDTH))
+
+@app.route('/products/<path:session>/contact/<day>.jpg')
+def product_contact_sheet(session, day):
+    import products as products_lib
+    if not safe_join(PRODUCT_ROOT, session, f"contact_{day}.rgb"):
+        abort(404)
+    # Stand aus dem Feldzähler des Schreibers, nicht aus der mtime (memmap aktualisiert sie nicht zuverlässig)
+    version = products_lib.sheet_version(session, day, PRODUCT_ROOT)
+    if version is None:
+        abort(404)
+    return _product_response(f"sheet-{version}",
+                             lambda: products_lib.contact_sheet_jpeg(session, day, PRODUCT_ROOT))
+
+@app.route('/thumbs/frame/<path:img>')
+def frame_thumb(img):
+    src = safe_join(IMAGE_ROOT, img)
+    if not src or not os.path.exists(src):
+        abort(404)
+    name = img.replace("/", "_") + ".thumb.jpg"
+    if not os.path.exists(os.path.join(FRAME_THUMB_DIR, name)):
+        from renditions import make_rendition, THUMB_SIZE
+        if not make_rendition(src, os.path.join(FRAME_THUMB_DIR, name), THUMB_SIZE):
+            abort(500)
+    return send_download(os.path.join(FRAME_THUMB_DIR, name), as_attachment=False, immutable=True)
+
+@app.route('/api/events')
+def api_events():
+    """Server-Sent Events: status | frame | log | lux_log"""
+    q = event_hub.subscribe()
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    name, data = q.get(timeout=SSE_KEEPALIVE_S)
+                    yield f"event: {name}\ndata: {json.dumps(data)}\n\n"
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            event_hub.unsubscribe(q)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/api/logs')
+def api_logs():
+    result = []
+    for name in LOG_FILES:
+        path = latest_logfile(name)
+        if path:
+            result.append({"name": name, "file": os.path.basename(path), "size": os.path.getsize(path)})
+    return jsonify(result)
+
 @app.route('/api/log', methods=['GET'])
 def api_log():
-    log = latest_logfile("timelapse")
-    lines = get_last_lines(log) if log else []
-    return jsonify({"lines": lines})
+    """?which=<log>&n=<zeilen> oder ?which=<log>&after=<offset>&file=<datei> (nur neue Zeilen)"""
+    which = request.args.get("which", "timelapse")
+    if which not in LOG_FILES:
+        return jsonify({"error": f"Unbekanntes Log: {which}"}), 400
+    log = latest_logfile(which)
+    if not log:
+        return jsonify({"lines": [], "offset": 0, "file": None, "reset": True})
+    fname = os.path.basename(log)
+    after = request.args.get("after", type=int)
+    try:
+        # Neuer Tag/neue Datei → Offset des Clients gilt nicht mehr
+        if after is not None and request.args.get("file", fname) == fname:
+            text, offset, reset = read_after(log, after)
+            if not reset:
+                return jsonify({"lines": text.splitlines(keepends=True), "offset": offset, "file": fname, "reset": False})
+        n = max(1, min(request.args.get("n", 20, type=int), 2000))
+        lines, offset = tail_lines(log, n)
+    except OSError as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"lines": lines, "offset": offset, "file": fname, "reset": True})
 
 @app.route('/download/log/<which>')
 def download_log(which):
     log = latest_logfile(which)
     if log:
-        return send_file(log, as_attachment=True)
+        return send_download(log)
     abort(404)
 
 @app.route('/download/image/<path:img>')
 def download_image(img):
-    img_path = os.path.join(IMAGE_ROOT, img)
-    if os.path.exists(img_path):
-        return send_file(img_path, as_attachment=True)
-    abort(404)
+    return send_download(safe_join(IMAGE_ROOT, img))
+
+# Entpackte .rawz-Container: Ein Download mit Range-Anfragen (Fortsetzen, Download-Manager)
+# soll nicht je Stück die ganze Datei entpacken und prüfen
+_rawz_cache = OrderedDict()
+_rawz_lock = threading.Lock()
+
+def read_rawz_cached(path, etag):
+    import raw_tier
+    with _rawz_lock:
+        hit = _rawz_cache.get(path)
+        if hit and hit[0] == etag:
+            _rawz_cache.move_to_end(path)
+            return hit[1]
+    data = raw_tier.read_raw_bytes(path)
+    with _rawz_lock:
+        _rawz_cache[path] = (etag, data)
+        _rawz_cache.move_to_end(path)
+        while len(_rawz_cache) > RAWZ_CACHE_SIZE:
+            _rawz_cache.popitem(last=False)
+    return data
 
 @app.route('/download/raw/<path:img>')
 def download_raw(img):
-    raw_path = os.path.join(RAW_ROOT, img)
-    if os.path.exists(raw_path):
-        return send_file(raw_path, as_attachment=True)
-    abort(404)
+    import raw_tier
+    path = safe_join(RAW_ROOT, img)
+    if path and not os.path.exists(path) and os.path.exists(path + raw_tier.SUFFIX):
+        # Komprimiertes RAW: Originalbytes rekonstruieren (ETag vom Container)
+        st = os.stat(path + raw_tier.SUFFIX)
+        etag = f"rawz-{st.st_mtime_ns}-{st.st_size}"
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            return resp
+        data = read_rawz_cached(path, etag)
+        resp = Response(data, mimetype="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{os.path.basename(path)}"'})
+        resp.set_etag(etag)
+        return resp.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    return send_download(path)
 
 @app.route('/api/sysinfo')
 def api_sysinfo():
+    import retention
     freemem = get_free_disk_space(IMAGE_ROOT)
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     return jsonify({
@@ -677,7 +1180,11 @@ def api_sysinfo():
         "time": now,
         "disk_mb": freemem,
         "python": os.sys.version,
-        "project": "Timelapse Pi"
+        "project": "Timelapse Pi",
+        "rss_mb": get_rss_mb(),
+        "startup_s": STARTUP_S,
+        "picamera2_loaded": "picamera2" in sys.modules,
+        "retention": retention.load_state(),
     })
 @app.route('/api/lux_config', methods=['GET', 'POST'])
 def api_lux_config():
@@ -690,5 +1197,93 @@ def api_lux_config():
 @app.route('/api/lux_log')
 def api_lux_log():
     return jsonify(load_lux_log())
+
+# Sensor-Zeitreihen: Antworten nach (Zeitraum, Auflösung) im LRU-Cache. Zeitgrenzen werden auf
+# die Schrittweite span/points gerundet, damit Zoom/Polling mit fast gleichem Fenster trifft;
+# Fenster bis in die Gegenwart verfallen nach einem Schritt, abgeschlossene nie.
+_sensor_cache = OrderedDict()
+_sensor_lock = threading.Lock()
+_sensor_store = None
+
+def get_sensor_store():
+    """Zeitreihen-Speicher nur öffnen, wenn der Logger ihn angelegt hat."""
+    global _sensor_store
+    from sensor_store import DB_PATH, SensorStore
+    with _sensor_lock:
+        if _sensor_store is None and os.path.exists(DB_PATH):
+            _sensor_store = SensorStore(DB_PATH)
+        return _sensor_store
+
+@app.route('/api/sensors')
+def api_sensors():
+    """Zeitreihen für Diagramme: ?from=&to=&cols=a,b&points=&method=lttb|minmax"""
+    import chart_data
+    from downsample import METHODS as DOWNSAMPLE_METHODS
+    try:
+        now = time.time()
+        t_to = parse_time(request.args.get("to")) or now
+        t_from = parse_time(request.args.get("from")) or t_to - 86400
+        if t_from >= t_to:
+            raise ValueError("from muss vor to liegen")
+        points = max(10, min(int(request.args.get("points", chart_data.DEFAULT_POINTS)), SENSOR_MAX_POINTS))
+        method = request.args.get("method", "lttb")
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f"Unbekannte Methode: {method}")
+        cols = tuple(c for c in (request.args.get("cols") or "").split(",") if c) or None
+    except Exception as e:
+        return jsonify({"error": f"Ungültige Parameter: {e}"}), 400
+
+    step = max(1.0, (t_to - t_from) / points)
+    q_from, q_to = (t_from // step) * step, -(-t_to // step) * step
+    key = (q_from, q_to, cols, points, method)
+    with _sensor_lock:
+        hit = _sensor_cache.get(key)
+        if hit and (hit[0] is None or hit[0] > now):
+            _sensor_cache.move_to_end(key)
+        else:
+            hit = None
+    if hit is None:
+        try:
+            payload = chart_data.window_payload(q_from, q_to, cols, points, method, store=get_sensor_store())
+        except Exception as e:
+            return jsonify({"error": f"Sensordaten nicht lesbar: {e}"}), 500
+        body = json.dumps(payload, separators=(",", ":"), allow_nan=False)
+        expires = None if q_to < now - SENSOR_SETTLE_S else now + step
+        hit = (expires, body, uuid4().hex)
+        with _sensor_lock:
+            _sensor_cache[key] = hit
+            _sensor_cache.move_to_end(key)
+            while len(_sensor_cache) > SENSOR_CACHE_SIZE:
+                _sensor_cache.popitem(last=False)
+    resp = Response(hit[1], mimetype="application/json")
+    resp.set_etag(hit[2])
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+def process_age_s():
+    """Sekunden seit Prozessstart (inkl. Interpreter-Start und Imports)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def get_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+# Kaltstartzeit bis die App importiert ist (vorher/nachher vergleichbar über /api/sysinfo)
+STARTUP_S = process_age_s()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    # Entwicklungsserver; im Betrieb gunicorn verwenden (siehe deploy/systemd)
+    app.run(host='0.0.0.0', port=8000, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
\ No newline at end of file